@@ -0,0 +1,309 @@
+"""שרת HTTP (ASGI) לצ'אטבוט, לשילוב העוזר במוצרים אחרים בלי Streamlit.
+
+הרצה:
+    uvicorn api_server:app --host 0.0.0.0 --port 8000
+
+נקודות קצה:
+    POST /v1/ask   - שאלה, עם תשובה מלאה ב-JSON או בהזרמה (SSE) כש-"stream" הוא true
+    GET  /healthz  - מצב השירות (503 כשאין קטלוג או שכל המודלים חסומים)
+    GET  /metrics  - מונים של השרת, הנתב, המטמון וגודל הבקשות
+
+גוף הבקשה ל-/v1/ask:
+    {"question": "...", "tools": ["Canva"], "history": [{"role": "user", "content": "..."}], "stream": true}
+בלי "tools" זו שיחה כללית, וכלים מהקטלוג שמוזכרים בשאלה מזוהים אוטומטית.
+
+לבדיקות עומס בלי ה-API האמיתי מגדירים GROQ_BASE_URL לכתובת של שרת מדומה תואם OpenAI.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from groq_client import (
+    stream_about_tool_async,
+    stream_about_multiple_tools_async,
+    model_router,
+    FAILURE_MESSAGE,
+)
+from tools_catalog import tools_catalog
+from catalog_refresher import catalog_refresher
+from response_cache import response_cache, fingerprint, normalize_question
+from prompt_builder import prompt_stats
+from tool_matcher import tool_matcher
+from tracing import tracer, get_logger, log_event
+from rate_limiter import rate_limiter
+from warm_up import warm_up_in_background, warm_up_event_loop
+
+# מספר הבקשות הפתוחות המקסימלי לכל לקוח (לפי הכותרת X-Client-Id או כתובת ה-IP)
+API_MAX_CONCURRENT_PER_CLIENT = int(os.getenv("API_MAX_CONCURRENT_PER_CLIENT", 4))
+# אורך השאלה המקסימלי בתווים
+API_MAX_QUESTION_CHARS = int(os.getenv("API_MAX_QUESTION_CHARS", 4000))
+# מספר הודעות ההיסטוריה המקסימלי שמתקבל בבקשה
+API_MAX_HISTORY_MESSAGES = int(os.getenv("API_MAX_HISTORY_MESSAGES", 100))
+
+GENERAL_CHAT_TOOL = "AI Tools"
+
+logger = get_logger("api_server")
+
+
+class _SharedAnswer:
+    """תשובה אחת שמוזרמת מהמודל לכמה בקשות זהות במקביל. הקטעים נשמרים, כך שבקשה שמצטרפת
+    באמצע מקבלת קודם את מה שכבר הגיע ואז ממשיכה עם ההזרמה"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def _append(self, chunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def _finish(self):
+        self.done = True
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def produce(self, stream):
+        """צריכת מחולל ההזרמה (האסינכרוני) על לולאת האירועים של השרת, בלי תהליכון לכל תשובה"""
+        try:
+            async for chunk in stream:
+                self._append(chunk)
+        except Exception as e:
+            log_event(logger, logging.ERROR, "שגיאה בהזרמת התשובה", error=str(e))
+            self._append(FAILURE_MESSAGE)
+        finally:
+            self._finish()
+
+    async def __aiter__(self):
+        index = 0
+        while True:
+            if index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            elif self.done:
+                return
+            else:
+                await self._changed.wait()
+
+
+class ApiState:
+    """המצב המשותף של השרת: בקשות פתוחות לכל לקוח, תשובות בהזרמה ומונים"""
+
+    def __init__(self, max_per_client=API_MAX_CONCURRENT_PER_CLIENT):
+        self.max_per_client = max_per_client
+        self._lock = threading.Lock()
+        self._client_requests = {}
+        self._in_flight = {}
+        self.started_at = time.time()
+        self.counters = {"requests": 0, "coalesced": 0, "rejected": 0, "errors": 0}
+
+    def acquire(self, client_id):
+        """תפיסת מקום לבקשה של הלקוח. False אם הלקוח הגיע למגבלת הבקשות הפתוחות"""
+        with self._lock:
+            self.counters["requests"] += 1
+            open_requests = self._client_requests.get(client_id, 0)
+            if open_requests >= self.max_per_client:
+                self.counters["rejected"] += 1
+                return False
+            self._client_requests[client_id] = open_requests + 1
+            return True
+
+    def release(self, client_id):
+        with self._lock:
+            open_requests = self._client_requests.get(client_id, 1) - 1
+            if open_requests > 0:
+                self._client_requests[client_id] = open_requests
+            else:
+                self._client_requests.pop(client_id, None)
+
+    def record_error(self):
+        with self._lock:
+            self.counters["errors"] += 1
+
+    def answer(self, key, create_stream):
+        """התשובה לבקשה: תשובה שכבר בהזרמה לבקשה זהה, או הזרמה חדשה מהמודל. ההזרמה רצה
+        כמשימה על לולאת האירועים עם הלקוח האסינכרוני, כך שמספר התשובות במקביל לא מוגבל
+        במספר התהליכונים - רק במגביל הקצב ובמאגר החיבורים"""
+        with self._lock:
+            shared = self._in_flight.get(key)
+            if shared is not None:
+                self.counters["coalesced"] += 1
+                return shared
+            shared = self._in_flight[key] = _SharedAnswer()
+
+        async def run():
+            try:
+                # span לכל תשובה שמופקת מהמודל (בקשות זהות שמצטרפות אליה לא פותחות span משלהן)
+                with tracer.span("api.answer") as span:
+                    await shared.produce(create_stream())
+                    span.set(chunks=len(shared.chunks))
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+
+        # שמירת המשימה על התשובה, כדי שלא תיאסף באמצע ההזרמה
+        shared.task = asyncio.get_running_loop().create_task(run())
+        return shared
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "in_flight_answers": len(self._in_flight),
+                "open_requests": sum(self._client_requests.values()),
+                "clients": len(self._client_requests),
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+            }
+
+
+api_state = ApiState()
+
+
+def _client_id(request):
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+
+def _parse_request(body):
+    """בדיקת גוף הבקשה. מחזיר (question, tools, history, stream) או זורק ValueError"""
+    if not isinstance(body, dict):
+        raise ValueError("גוף הבקשה חייב להיות אובייקט JSON")
+    question = body.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise ValueError("חסר שדה question")
+    if len(question) > API_MAX_QUESTION_CHARS:
+        raise ValueError(f"השאלה ארוכה מ-{API_MAX_QUESTION_CHARS} תווים")
+    tools = body.get("tools") or []
+    if not isinstance(tools, list) or not all(isinstance(tool, str) for tool in tools):
+        raise ValueError("השדה tools חייב להיות רשימת שמות כלים")
+    history = body.get("history") or []
+    if not isinstance(history, list) or not all(
+        isinstance(message, dict) and message.get("role") in ("user", "assistant")
+        and isinstance(message.get("content"), str)
+        for message in history
+    ):
+        raise ValueError("השדה history חייב להיות רשימת הודעות עם role ו-content")
+    history = [{"role": message["role"], "content": message["content"]} for message in history[-API_MAX_HISTORY_MESSAGES:]]
+    return question, list(dict.fromkeys(tools)), history, bool(body.get("stream"))
+
+
+def _create_stream(question, tools, history):
+    """בחירת פונקציית ההזרמה לפי הכלים, כמו בממשק ה-Streamlit"""
+    if not tools:
+        return lambda: stream_about_tool_async(GENERAL_CHAT_TOOL, question, general_chat=True, conversation_history=history)
+    if len(tools) == 1:
+        return lambda: stream_about_tool_async(tools[0], question, conversation_history=history)
+    return lambda: stream_about_multiple_tools_async(tools, question, conversation_history=history)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def ask(request):
+    try:
+        question, tools, history, stream = _parse_request(await request.json())
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    # רענון הקטלוג ברקע כשהגיע הזמן, כמו בכל הרצה של ממשק ה-Streamlit
+    catalog_refresher.refresh_in_background()
+
+    client_id = _client_id(request)
+    if not api_state.acquire(client_id):
+        return JSONResponse(
+            {"error": "יותר מדי בקשות פתוחות ללקוח"}, status_code=429, headers={"Retry-After": "1"},
+        )
+
+    try:
+        if not tools:
+            # שיחה כללית - כלים מהקטלוג שמוזכרים בשאלה נענים עם המידע עליהם
+            tools = await asyncio.to_thread(tool_matcher.find_tools, question)
+        key = fingerprint({"tools": sorted(tools), "question": normalize_question(question), "history": history})
+        shared = api_state.answer(key, _create_stream(question, tools, history))
+    except Exception:
+        api_state.release(client_id)
+        api_state.record_error()
+        raise
+
+    if not stream:
+        try:
+            answer = "".join([chunk async for chunk in shared])
+        finally:
+            api_state.release(client_id)
+        return JSONResponse({"answer": answer, "tools": tools})
+
+    async def events():
+        try:
+            yield _sse("tools", {"tools": tools})
+            async for chunk in shared:
+                yield _sse("delta", {"content": chunk})
+            yield _sse("done", {})
+        finally:
+            api_state.release(client_id)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+async def healthz(request):
+    models = model_router.stats()
+    catalog_tools = len(tools_catalog.names())
+    catalog_ready = catalog_tools > 0
+    models_available = not models or any(not model["circuit_open"] for model in models.values())
+    healthy = catalog_ready and models_available
+    return JSONResponse(
+        {
+            "status": "ok" if healthy else "degraded",
+            "catalog_tools": catalog_tools,
+            "models_available": models_available,
+            "retry_in": model_router.retry_in(),
+        },
+        status_code=200 if healthy else 503,
+    )
+
+
+async def metrics(request):
+    return JSONResponse({
+        "server": api_state.stats(),
+        "models": model_router.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "response_cache": response_cache.stats(),
+        "prompts": prompt_stats.stats(),
+    })
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # הקטלוג מורד (או מרוענן ברקע) לפני הבקשה הראשונה
+    await asyncio.get_running_loop().run_in_executor(None, catalog_refresher.ensure_catalog)
+    warm_up_in_background()
+    # הבקשות של השרת רצות על הלולאה של uvicorn - הלקוח ומאגר החיבורים שלה נוצרים כבר עכשיו
+    await warm_up_event_loop()
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/v1/ask", ask, methods=["POST"]),
+        Route("/healthz", healthz, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("API_HOST", "0.0.0.0"), port=int(os.getenv("API_PORT", 8000)))
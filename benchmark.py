@@ -0,0 +1,475 @@
+"""מדידת זמני התגובה והתפוקה של האפליקציה מקצה לקצה, מול מודל מדומה וקטלוגים סינתטיים.
+
+דוגמאות הרצה:
+    python benchmark.py                                   # כל הגדלים, פלט JSON למסך
+    python benchmark.py --sizes 100,5000 --concurrency 1,16 --output results.json
+    python benchmark.py --latency 0.2 --tokens-per-second 100 --requests 100
+    python benchmark.py --compare previous.json --output current.json
+    python benchmark.py --sizes "" --startup-runs 10          # זמני העלייה בלבד
+
+המודל המדומה רץ בתוך התהליך (ללא רשת), כך שהמדידה משקפת את התקורה של האפליקציה עצמה
+מעבר לזמן התגובה שהוגדר. עם --env-backend נעשה שימוש בספק שמוגדר בסביבה (למשל mock_llm_server.py).
+כל קטלוג נמדד בתהליך נפרד עם ספריית נתונים זמנית משלו (DATA_DIR בסביבה של התהליך), כך שספריית
+הנתונים האמיתית לא משתנה - גם כשהיא מוגדרת בנתיב מלא ב-.env.
+זמני העלייה נמדדים בתהליכים חדשים: ייבוא המודולים של main.py (לפי -X importtime), ואם Streamlit
+מותקן - הרצה ראשונה של הדף עד שהוא מוצג במלואו (עם streamlit.testing).
+"""
+import os
+import ast
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import importlib.util
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# המדידה לא שולחת בקשות ל-API ולא שומרת תשובות במטמון בין הרצות
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+
+import groq_client
+from llm_backend import LLMBackend
+from tools_catalog import tools_catalog, ToolsCatalog, TOOLS_FILE
+from catalog_search import catalog_search
+from tool_matcher import tool_matcher
+from conversation_history import prepare_conversation_history, fit_messages
+
+_WORDS_HE = "יצירת תמונות וידאו מוזיקה כתיבה עיצוב מצגות קוד תרגום סיכום קול דיבור אתרים אוטומציה".split()
+_WORDS_EN = "image video music writing design slides code translate summary voice speech website automation".split()
+# הדף שזמן העלייה שלו נמדד
+STARTUP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# הרצה ראשונה של הדף בתהליך חדש, עד שכל הרכיבים שלו מוצגים
+_FIRST_RENDER_CODE = (
+    "import sys\n"
+    "from streamlit.testing.v1 import AppTest\n"
+    "app = AppTest.from_file(sys.argv[1], default_timeout=120)\n"
+    "app.run()\n"
+    "sys.exit(1 if app.exception else 0)\n"
+)
+_CATEGORIES = ["image", "video", "audio", "text", "design", "code", "productivity", "chatbot"]
+
+
+class StubBackend(LLMBackend):
+    """מודל מדומה בתוך התהליך: המתנה עד הטוקן הראשון ואז טוקנים בקצב קבוע"""
+
+    name = "stub"
+
+    def __init__(self, latency, tokens_per_second, answer_tokens):
+        self.latency = latency
+        self.token_delay = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+        self.answer_tokens = answer_tokens
+
+    def _tokens(self, max_tokens):
+        return [_WORDS_HE[index % len(_WORDS_HE)] + " " for index in range(min(self.answer_tokens, max_tokens))]
+
+    def complete(self, model, messages, temperature, max_tokens):
+        tokens = self._tokens(max_tokens)
+        time.sleep(self.latency + self.token_delay * len(tokens))
+        return "".join(tokens)
+
+    async def complete_async(self, model, messages, temperature, max_tokens):
+        import asyncio
+
+        tokens = self._tokens(max_tokens)
+        await asyncio.sleep(self.latency + self.token_delay * len(tokens))
+        return "".join(tokens)
+
+    def stream(self, model, messages, temperature, max_tokens):
+        time.sleep(self.latency)
+        for token in self._tokens(max_tokens):
+            yield token
+            if self.token_delay:
+                time.sleep(self.token_delay)
+
+    async def stream_async(self, model, messages, temperature, max_tokens):
+        import asyncio
+
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(max_tokens):
+            yield token
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+
+
+def synthetic_catalog(size, seed=0):
+    """קטלוג סינתטי בגודל נתון, עם שמות, קטגוריות ותיאורים בעברית ובאנגלית"""
+    rng = random.Random(seed)
+    tools = []
+    for index in range(size):
+        words = rng.sample(_WORDS_HE, 5) + rng.sample(_WORDS_EN, 3)
+        tools.append({
+            "name": f"Tool {index:05d} {rng.choice(_WORDS_EN).title()}",
+            "category": rng.choice(_CATEGORIES),
+            "description": "כלי ל" + " ".join(words),
+            "rating": rng.randint(1, 5),
+            "url": f"https://example.com/tools/{index}",
+        })
+    return tools
+
+
+def synthetic_conversation(turns, seed=0):
+    """שיחה סינתטית עם מספר חילופי הודעות נתון, בפורמט של st.session_state.messages"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(turns):
+        messages.append({"role": "user", "content": "איך אפשר " + " ".join(rng.choices(_WORDS_HE, k=12)) + "?"})
+        messages.append({"role": "assistant", "content": ". ".join(" ".join(rng.choices(_WORDS_HE, k=15)) for _ in range(6))})
+    return messages
+
+
+def _percentiles(samples):
+    """p50/p95/p99 במילישניות"""
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": percentile(0.50), "p95_ms": percentile(0.95), "p99_ms": percentile(0.99)}
+
+
+def _measure(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _run_concurrent(function, requests, concurrency):
+    """הרצת הבקשות ב-concurrency סשנים במקביל. מחזיר את זמני הבקשות ואת הזמן הכולל"""
+    samples = []
+    lock = threading.Lock()
+
+    def one(index):
+        started = time.perf_counter()
+        function(index)
+        elapsed = time.perf_counter() - started
+        with lock:
+            samples.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    return samples, time.perf_counter() - started
+
+
+def _prepare_data_dir(directory, tools, with_prompts):
+    data_dir = os.path.join(directory, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, "tools.json"), 'w', encoding='utf-8') as file:
+        json.dump(tools, file, ensure_ascii=False)
+    if with_prompts:
+        # הנחיות קיימות לכל הכלים, כדי שהמדידה לא תכלול את יצירתן
+        prompts = {tool["name"]: "מידע מורחב על " + tool["name"] + ": " + tool["description"] for tool in tools}
+        with open(os.path.join(data_dir, "tools_prompts.json"), 'w', encoding='utf-8') as file:
+            json.dump(prompts, file, ensure_ascii=False)
+
+
+def benchmark_catalog(size, args, argv):
+    """כל המדידות לקטלוג בגודל אחד. המדידה רצה בתהליך חדש שספריית הנתונים שלו היא תיקייה זמנית,
+    כי המודולים קובעים את הנתיבים שלהם לפי DATA_DIR בזמן הייבוא. מחזיר את התוצאות ואת נתוני
+    הזיכרון של התהליך"""
+    with tempfile.TemporaryDirectory(prefix="bench-") as directory:
+        _prepare_data_dir(directory, synthetic_catalog(size, seed=args.seed), with_prompts=True)
+        output = os.path.join(directory, "results.json")
+        # משתנה סביבה גובר על הערך שב-.env, כך שהמדידה לא נוגעת בספריית הנתונים האמיתית
+        env = dict(os.environ, DATA_DIR=os.path.join(directory, "data"))
+        command = [sys.executable, os.path.abspath(__file__), *argv, "--catalog-worker", str(size), "--output", output]
+        completed = subprocess.run(command, env=env)
+        if completed.returncode != 0:
+            raise RuntimeError(f"המדידה של קטלוג בגודל {size} נכשלה (קוד יציאה {completed.returncode})")
+        with open(output, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+
+def _measure_catalog(size, args):
+    """המדידות עצמן, בתהליך של benchmark_catalog. ספריית הנתונים כבר מכילה את הקטלוג וההנחיות"""
+    results = []
+    tools = synthetic_catalog(size, seed=args.seed)
+    names = [tool["name"] for tool in tools]
+    rng = random.Random(args.seed)
+
+    # טעינת הקטלוג (כמו load_tools ב-main.py): הידור ה-JSON בפעם הראשונה, פתיחה של קטלוג
+    # שכבר הודר (למשל אחרי הפעלה מחדש), ואחריה קריאות מהזיכרון
+    compile_run = _measure(lambda: ToolsCatalog(TOOLS_FILE).names(), 1)
+    cold = _measure(lambda: ToolsCatalog(TOOLS_FILE).names(), 1 if size > 10000 else 3)
+    warm = _measure(tools_catalog.names, args.repeat)
+    results.append({"name": "load_tools.compile", "catalog_size": size, **_percentiles(compile_run)})
+    results.append({"name": "load_tools.cold", "catalog_size": size, **_percentiles(cold)})
+    results.append({"name": "load_tools.warm", "catalog_size": size, **_percentiles(warm)})
+
+    # בניית האינדקסים בבקשה הראשונה: חיפוש BM25 וזיהוי שמות כלים
+    results.append({"name": "catalog_search.build", "catalog_size": size,
+                    **_percentiles(_measure(lambda: catalog_search.search("כלי ליצירת מוזיקה"), 1))})
+    results.append({"name": "catalog_search.query", "catalog_size": size,
+                    **_percentiles(_measure(lambda: catalog_search.search("כלי ליצירת מוזיקה"), args.repeat))})
+    results.append({"name": "tool_matcher.build", "catalog_size": size,
+                    **_percentiles(_measure(lambda: tool_matcher.find_tools(names[0]), 1))})
+    results.append({"name": "tool_matcher.query", "catalog_size": size,
+                    **_percentiles(_measure(lambda: tool_matcher.find_tools(f"מה ההבדל בין {names[1]} ל{names[-1]}?"), args.repeat))})
+
+    conversation = synthetic_conversation(args.history_turns, seed=args.seed)
+    history = prepare_conversation_history(conversation)
+    for concurrency in args.concurrency:
+        def ask_tool(index):
+            groq_client.ask_about_tool(rng.choice(names), f"שאלה {index} על הכלי", conversation_history=history)
+
+        def ask_multiple(index):
+            groq_client.ask_about_multiple_tools(rng.sample(names, 3), f"השוואה {index}", conversation_history=history)
+
+        def ask_comparison(index):
+            groq_client.ask_about_multiple_tools(rng.sample(names, min(10, len(names))), f"השוואה רחבה {index}",
+                                                 conversation_history=history)
+
+        def ask_general(index):
+            groq_client.ask_about_tool("AI Tools", f"כלי ליצירת וידאו {index}", general_chat=True, conversation_history=history)
+
+        for scenario, function in (("ask_about_tool", ask_tool), ("ask_about_multiple_tools", ask_multiple),
+                                   ("ask_comparison", ask_comparison), ("ask_general_chat", ask_general)):
+            samples, elapsed = _run_concurrent(function, args.requests, concurrency)
+            results.append({
+                "name": scenario, "catalog_size": size, "concurrency": concurrency,
+                "requests": args.requests, "rps": round(args.requests / elapsed, 2), **_percentiles(samples),
+            })
+
+        # זמן עד הקטע הראשון בהזרמה, כפי שהמשתמש ב-Streamlit חווה אותו
+        first_chunks = []
+        lock = threading.Lock()
+
+        def stream_tool(index):
+            started = time.perf_counter()
+            stream = groq_client.stream_about_tool(rng.choice(names), f"שאלה בהזרמה {index}", conversation_history=history)
+            next(stream, None)
+            with lock:
+                first_chunks.append(time.perf_counter() - started)
+            for _ in stream:
+                pass
+
+        samples, elapsed = _run_concurrent(stream_tool, args.requests, concurrency)
+        ttft = {key.replace("_ms", "_ttft_ms"): value for key, value in _percentiles(first_chunks).items()}
+        results.append({
+            "name": "stream_about_tool", "catalog_size": size, "concurrency": concurrency,
+            "requests": args.requests, "rps": round(args.requests / elapsed, 2), **_percentiles(samples), **ttft,
+        })
+    return results
+
+
+def _script_imports(path):
+    """המודולים שהסקריפט מייבא ברמה העליונה, לפי סדר הייבוא"""
+    with open(path, 'r', encoding='utf-8') as file:
+        tree = ast.parse(file.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def _parse_importtime(output):
+    """הזמן המצטבר (בשניות) של כל מודול שיובא ישירות, מתוך הפלט של -X importtime.
+    מודול שכבר יובא דרך מודול קודם לא מופיע, והזמן שלו נספר אצל מי שייבא אותו"""
+    top_level = {}
+    for line in output.splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3:
+            continue
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2][1:]
+        if not name.startswith(" "):
+            top_level[name] = cumulative / 1e6
+    return top_level
+
+
+def _run_startup(command, env):
+    """הרצת תהליך חדש עד סופו. מחזיר את הזמן הכולל ואת פלט השגיאות"""
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=os.path.dirname(STARTUP_SCRIPT), env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        raise RuntimeError(f"{' '.join(command[:3])} נכשל: {lines[-1] if lines else completed.returncode}")
+    return elapsed, completed.stderr
+
+
+def benchmark_startup(args):
+    """זמני העלייה של עותק חדש: ייבוא המודולים של הדף, וזמן ההצגה הראשונה שלו"""
+    results = []
+    streamlit_installed = importlib.util.find_spec("streamlit") is not None
+    modules = _script_imports(STARTUP_SCRIPT)
+    if not streamlit_installed:
+        modules = [module for module in modules if module.split(".")[0] != "streamlit"]
+
+    import_samples, process_samples, by_module = [], [], {module: [] for module in modules}
+    command = [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)]
+    for _ in range(args.startup_runs):
+        elapsed, output = _run_startup(command, dict(os.environ))
+        top_level = _parse_importtime(output)
+        process_samples.append(elapsed)
+        import_samples.append(sum(top_level.get(module, 0.0) for module in modules))
+        for module in modules:
+            by_module[module].append(top_level.get(module, 0.0))
+    slowest = sorted(
+        ((module, round(sorted(samples)[len(samples) // 2] * 1000, 3)) for module, samples in by_module.items()),
+        key=lambda item: item[1], reverse=True,
+    )[:5]
+    results.append({"name": "startup.import", "modules": len(modules), **_percentiles(import_samples),
+                    "slowest_imports_ms": dict(slowest)})
+    results.append({"name": "startup.process", **_percentiles(process_samples)})
+
+    if not streamlit_installed:
+        print("Streamlit לא מותקן - מדידת ההצגה הראשונה של הדף מדולגת", file=sys.stderr)
+        return results
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as directory:
+        _prepare_data_dir(directory, synthetic_catalog(1000, seed=args.seed), with_prompts=True)
+        # הקטלוג כבר קיים, והרענון ברקע נכשל מיד במקום לפנות לרשת
+        env = dict(os.environ, DATA_DIR=os.path.join(directory, "data"), AI_TOOLS_URL="http://127.0.0.1:9/tools.json")
+        samples = [
+            _run_startup([sys.executable, "-c", _FIRST_RENDER_CODE, STARTUP_SCRIPT], env)[0]
+            for _ in range(args.startup_runs)
+        ]
+    results.append({"name": "startup.first_render", **_percentiles(samples)})
+    return results
+
+
+def benchmark_history(args):
+    """הכנת ההיסטוריה והתאמתה לתקציב הטוקנים, לשיחות באורכים שונים"""
+    results = []
+    for turns in (5, 50, 500):
+        conversation = synthetic_conversation(turns, seed=args.seed)
+        samples = _measure(
+            lambda: fit_messages("system", prepare_conversation_history(conversation), "שאלה", groq_client.GROQ_MODELS),
+            args.repeat,
+        )
+        results.append({"name": "prepare_conversation_history", "history_turns": turns, **_percentiles(samples)})
+    return results
+
+
+def compare(previous, current):
+    """השוואה לתוצאות קודמות: היחס בין ה-p95 הנוכחי לקודם בכל מדידה שקיימת בשתיהן"""
+    def key(result):
+        return (result["name"], result.get("catalog_size"), result.get("concurrency"), result.get("history_turns"))
+
+    before = {key(result): result for result in previous.get("results", [])}
+    changes = []
+    for result in current["results"]:
+        old = before.get(key(result))
+        if old and old.get("p95_ms") and result.get("p95_ms") is not None:
+            changes.append({
+                "name": result["name"], "catalog_size": result.get("catalog_size"),
+                "concurrency": result.get("concurrency"), "history_turns": result.get("history_turns"),
+                "p95_ratio": round(result["p95_ms"] / old["p95_ms"], 3),
+            })
+    return changes
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def _peak_rss_mb():
+    """שיא הזיכרון של התהליך (RSS) במגה-בייטים, או None במערכות בלי המודול resource"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss בקילובייטים בלינוקס
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+
+
+def _catalog_worker(args):
+    """הרצת המדידות של קטלוג אחד ושמירתן בקובץ, בתהליך שנוצר ב-benchmark_catalog"""
+    results = _measure_catalog(args.catalog_worker, args)
+    peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump({"results": results, "peak_traced_memory": peak, "peak_rss_mb": _peak_rss_mb()}, file, ensure_ascii=False)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="מדידת זמני תגובה ותפוקה של הצ'אטבוט")
+    parser.add_argument("--sizes", type=_int_list, default=[100, 1000, 10000, 50000], help="גדלי הקטלוגים הסינתטיים")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32], help="מספרי הסשנים במקביל")
+    parser.add_argument("--requests", type=int, default=64, help="מספר הבקשות לכל תרחיש")
+    parser.add_argument("--repeat", type=int, default=50, help="מספר החזרות במדידות המקומיות")
+    parser.add_argument("--history-turns", type=int, default=10, help="אורך השיחה הסינתטית בבקשות")
+    parser.add_argument("--latency", type=float, default=0.05, help="זמן עד הטוקן הראשון של המודל המדומה (שניות)")
+    parser.add_argument("--tokens-per-second", type=float, default=500, help="קצב הטוקנים של המודל המדומה")
+    parser.add_argument("--answer-tokens", type=int, default=50, help="אורך התשובה של המודל המדומה")
+    parser.add_argument("--env-backend", action="store_true", help="שימוש בספק המודל שמוגדר בסביבה במקום במודל המדומה")
+    parser.add_argument("--trace-memory", action="store_true", help="מדידת שיא הזיכרון של Python עם tracemalloc (מאט את המדידה)")
+    parser.add_argument("--startup-runs", type=int, default=5, help="מספר התהליכים החדשים במדידת זמני העלייה (0 = ללא)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="נתיב לשמירת התוצאות כ-JSON")
+    parser.add_argument("--compare", help="קובץ תוצאות קודם להשוואה")
+    parser.add_argument("--catalog-worker", type=int, help=argparse.SUPPRESS)
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parser.parse_args(argv)
+
+    if not args.env_backend:
+        groq_client.llm_backend = StubBackend(args.latency, args.tokens_per_second, args.answer_tokens)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    if args.catalog_worker is not None:
+        return _catalog_worker(args)
+    started = time.time()
+    results = benchmark_history(args)
+    if args.startup_runs:
+        print("מודד את זמני העלייה...", file=sys.stderr)
+        results.extend(benchmark_startup(args))
+    peaks, peak_rss = [], [_peak_rss_mb()]
+    for size in args.sizes:
+        print(f"מודד קטלוג של {size} כלים...", file=sys.stderr)
+        worker = benchmark_catalog(size, args, argv)
+        results.extend(worker["results"])
+        peaks.append(worker["peak_traced_memory"])
+        peak_rss.append(worker["peak_rss_mb"])
+    peak = None
+    if args.trace_memory:
+        # השיא של התהליך הזה ושל תהליכי המדידה של הקטלוגים
+        peak = max([tracemalloc.get_traced_memory()[1]] + [value for value in peaks if value is not None])
+        tracemalloc.stop()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": groq_client.llm_backend.name,
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "trace_memory")},
+            "elapsed_seconds": round(time.time() - started, 2),
+            "peak_traced_memory_mb": round(peak / 2 ** 20, 2) if peak is not None else None,
+        },
+        "results": results,
+    }
+    peak_rss = [value for value in peak_rss if value is not None]
+    if peak_rss:
+        report["meta"]["peak_rss_mb"] = max(peak_rss)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            report["comparison"] = compare(json.load(file), report)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
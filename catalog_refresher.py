@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+
+from file_utils import DATA_DIR, FileLock, write_file_atomic, write_json_atomic
+from tools_catalog import tools_catalog, TOOLS_FILE
+from tracing import get_logger, log_event
+
+# קריאת כתובת ה-URL מקובץ .env
+AI_TOOLS_URL = os.getenv("AI_TOOLS_URL", "https://thewitcher-sagi-ai-tools.static.hf.space/tools.json")
+# קובץ ההגדרות ששומר את מועד הבדיקה האחרונה ואת כותרות ה-ETag/Last-Modified
+CONFIG_FILE = os.path.join(DATA_DIR, "config.json")
+# מנעול הרענון - בכמה תהליכים שחולקים את ספריית הנתונים, רק מי שמחזיק בו מוריד את הקטלוג
+CATALOG_REFRESH_LOCK_FILE = os.path.join(DATA_DIR, "catalog_refresh.lock")
+# כל כמה זמן (בשניות) בודקים אם הקטלוג בשרת השתנה
+CATALOG_REFRESH_INTERVAL_SECONDS = int(os.getenv("CATALOG_REFRESH_INTERVAL_SECONDS", 24 * 60 * 60))
+# זמן מקסימלי (בשניות) להורדת הקטלוג
+CATALOG_DOWNLOAD_TIMEOUT_SECONDS = float(os.getenv("CATALOG_DOWNLOAD_TIMEOUT_SECONDS", 10))
+# זמן המתנה (בשניות) לפני ניסיון נוסף אחרי הורדה שנכשלה
+CATALOG_RETRY_AFTER_FAILURE_SECONDS = 300
+# זמן המתנה (בשניות) לפני בדיקה נוספת כשתהליך אחר באמצע רענון
+CATALOG_RETRY_WHILE_LOCKED_SECONDS = 60
+
+logger = get_logger("catalog_refresher")
+
+
+class CatalogRefresher:
+    """רענון קובץ הכלים מהשרת ברקע, עם בקשה מותנית (ETag / If-Modified-Since) וכתיבה אטומית.
+    עד שהרענון מסתיים ממשיכים להגיש את העותק האחרון התקין שבדיסק"""
+
+    def __init__(self, url=AI_TOOLS_URL, path=TOOLS_FILE, config_path=CONFIG_FILE,
+                 interval=CATALOG_REFRESH_INTERVAL_SECONDS, timeout=CATALOG_DOWNLOAD_TIMEOUT_SECONDS,
+                 lock_path=CATALOG_REFRESH_LOCK_FILE):
+        self.url = url
+        self.path = path
+        self.config_path = config_path
+        self.lock_path = lock_path
+        self.interval = interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_check = None
+        self._next_attempt = 0.0
+        self._has_catalog = False
+        self.last_error = None
+
+    def _load_config(self):
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as file:
+                config = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return config if isinstance(config, dict) else {}
+
+    def _save_config(self, config):
+        write_json_atomic(self.config_path, config)
+
+    def is_due(self):
+        """האם הגיע הזמן לבדוק שוב את הקטלוג בשרת"""
+        if time.time() < self._next_attempt:
+            return False
+        if not self._catalog_exists():
+            return True
+        if self._last_check is None:
+            # מועד הבדיקה נקרא מהדיסק רק פעם אחת, ואחר כך נשמר בזיכרון
+            self._last_check = self._load_config().get("last_check", 0)
+        return time.time() - self._last_check >= self.interval
+
+    def _catalog_exists(self):
+        """האם יש קטלוג בדיסק - אחרי שנמצא פעם אחת לא בודקים שוב, כי הוא רק מוחלף ולא נמחק"""
+        if not self._has_catalog:
+            self._has_catalog = os.path.exists(self.path)
+        return self._has_catalog
+
+    def refresh(self, wait=False):
+        """בדיקה מול השרת והורדת הקטלוג אם השתנה. מחזיר True אם יש בדיסק עותק תקין אחרי הבדיקה.
+        מכמה תהליכים שחולקים את ספריית הנתונים רק אחד מרענן - השאר מדלגים (או ממתינים, עם wait)
+        ומשתמשים בקטלוג שהוא הוריד"""
+        lock = FileLock(self.lock_path)
+        if not lock.acquire(blocking=wait, timeout=self.timeout * 3):
+            self._next_attempt = time.time() + CATALOG_RETRY_WHILE_LOCKED_SECONDS
+            return os.path.exists(self.path)
+        try:
+            return self._refresh_locked()
+        finally:
+            lock.release()
+
+    def _refresh_locked(self):
+        config = self._load_config()
+        if os.path.exists(self.path) and time.time() - config.get("last_check", 0) < self.interval:
+            # תהליך אחר כבר בדק את השרת לאחרונה - רק מעדכנים את הקטלוג בזיכרון
+            self._last_check = config.get("last_check", 0)
+            tools_catalog.invalidate()
+            return True
+
+        headers = {}
+        if os.path.exists(self.path):
+            # בקשה מותנית - אם הקטלוג לא השתנה השרת מחזיר 304 בלי גוף
+            if config.get("etag"):
+                headers["If-None-Match"] = config["etag"]
+            if config.get("last_modified"):
+                headers["If-Modified-Since"] = config["last_modified"]
+
+        # requests נטען רק כשיש צורך בהורדה, ולא בכל הפעלה של האפליקציה
+        import requests
+
+        try:
+            response = requests.get(self.url, headers=headers, timeout=self.timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+                # בדיקה שהתוכן הוא JSON תקין לפני שמחליפים את העותק הקיים
+                json.loads(response.content)
+                write_file_atomic(self.path, response.content)
+                tools_catalog.invalidate()
+                # הידור הקטלוג כבר כאן, כדי שהבקשה הבאה של משתמש לא תמתין לו
+                tools_catalog.version
+                config["etag"] = response.headers.get("ETag")
+                config["last_modified"] = response.headers.get("Last-Modified")
+                config["last_update"] = datetime.now().strftime("%Y-%m-%d")
+        except (requests.RequestException, ValueError, OSError) as e:
+            self.last_error = e
+            self._next_attempt = time.time() + CATALOG_RETRY_AFTER_FAILURE_SECONDS
+            log_event(logger, logging.ERROR, "שגיאה בהורדת קובץ הכלים", url=self.url, error=str(e))
+            return os.path.exists(self.path)
+
+        self.last_error = None
+        config["last_check"] = self._last_check = time.time()
+        try:
+            self._save_config(config)
+        except OSError as e:
+            log_event(logger, logging.WARNING, "שגיאה בשמירת קובץ התצורה", path=self.config_path, error=str(e))
+        return True
+
+    def refresh_in_background(self):
+        """הפעלת רענון בתהליכון רקע אם הגיע הזמן ואין רענון שכבר רץ. לא חוסם את הקורא"""
+        if not self.is_due():
+            return False
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self.refresh, name="catalog-refresh", daemon=True)
+            self._thread.start()
+            return True
+
+    def ensure_catalog(self):
+        """הגשת הקטלוג מיד אם קיים בדיסק (ורענון ברקע), או הורדה חוסמת בהפעלה הראשונה.
+        מחזיר True אם יש קטלוג להגיש"""
+        if self._catalog_exists():
+            self.refresh_in_background()
+            return True
+        with self._lock:
+            # ייתכן שהורדה במקביל כבר הסתיימה בזמן שחיכינו למנעול
+            if self._catalog_exists():
+                return True
+            if time.time() < self._next_attempt:
+                return False
+            # בהפעלה הראשונה של כמה תהליכים יחד - אחד מוריד והשאר ממתינים לקטלוג שהוריד
+            return self.refresh(wait=True)
+
+
+# מופע משותף לכל התהליך
+catalog_refresher = CatalogRefresher()
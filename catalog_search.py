@@ -0,0 +1,256 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+import unicodedata
+from collections import Counter
+
+from file_utils import DATA_DIR, FileLock, write_json_atomic
+from tools_catalog import tools_catalog
+from prompt_store import prompt_store
+from tracing import get_logger, log_event
+
+# נתיב לקובץ אינדקס החיפוש של הקטלוג
+CATALOG_INDEX_FILE = os.path.join(DATA_DIR, "catalog_index.json")
+# מספר הכלים הרלוונטיים שמצורפים לשאלה בשיחה כללית
+CATALOG_SEARCH_TOP_K = int(os.getenv("CATALOG_SEARCH_TOP_K", 5))
+
+# פרמטרי BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+# משקל כל שדה - מילה בשם הכלי חשובה יותר ממילה בתיאור
+FIELD_WEIGHTS = {"name": 3, "category": 2, "description": 1, "prompt": 1}
+
+logger = get_logger("catalog_search")
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_NIQQUD_PATTERN = re.compile(r"[֑-ׇ]")
+_FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+# אותיות שימוש שמצטרפות לתחילת מילה בעברית (ו, ה, ב, ל, מ, ש, כ)
+_HEBREW_PREFIXES = "והבלמשכ"
+_STOP_WORDS = {
+    "של", "את", "על", "עם", "זה", "זו", "מה", "איך", "אני", "הוא", "היא", "יש", "אין", "או", "גם",
+    "כל", "לא", "כן", "אם", "כי", "מי", "אפשר", "the", "a", "an", "and", "or", "of", "to", "in",
+    "for", "is", "are", "with", "on", "what", "how",
+}
+
+
+def prefix_variants(token):
+    """המילה עצמה, ואחריה הצורות שלה בלי אחת או שתי אותיות שימוש (ו, ה, ב, ל, מ, ש, כ) בתחילתה,
+    כל עוד נשארים לפחות שלושה תווים. לא תמיד אפשר לדעת אם האות הראשונה היא אות שימוש
+    ("מוזיקה" לעומת "מהמוזיקה"), ולכן נשמרות כל הצורות"""
+    variants = [token]
+    for _ in range(2):
+        if len(token) > 3 and token[0] in _HEBREW_PREFIXES:
+            token = token[1:]
+            variants.append(token)
+        else:
+            break
+    return variants
+
+
+def tokenize(text):
+    """פירוק טקסט למילים מנורמלות: אותיות קטנות, בלי ניקוד, אותיות סופיות אחידות ובלי מילות קישור"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = _NIQQUD_PATTERN.sub("", text).translate(_FINAL_LETTERS)
+    return [
+        token for token in _TOKEN_PATTERN.findall(text)
+        if token not in _STOP_WORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def _field_terms(field, value):
+    """המונחים של שדה אחד, כשכל מונח חוזר לפי משקל השדה"""
+    terms = []
+    for token in tokenize(str(value or "")):
+        # כל הצורות של המילה נכנסות לאינדקס, כדי ש"ליצירת" בשאלה ימצא את "יצירת" בתיאור
+        terms.extend(prefix_variants(token))
+    return terms * FIELD_WEIGHTS[field]
+
+
+def _document_terms(tool):
+    """המונחים של כלי אחד מהשדות שבקטלוג"""
+    terms = []
+    for field in ("name", "category", "description"):
+        terms.extend(_field_terms(field, tool.get(field, "")))
+    return terms
+
+
+class _SearchIndex:
+    """אינדקס BM25: רשימות הופעה לכל מונח מהשדות שבקטלוג, שנבנות פעם אחת לכל גרסה של הקטלוג
+    ונשמרות בדיסק, ומונחי ההנחיות שמתעדכנים בזיכרון רק עבור הכלים שההנחיה שלהם השתנתה"""
+
+    def __init__(self, version, names, doc_lengths, postings):
+        self.version = version
+        self.names = names
+        self.doc_lengths = doc_lengths
+        self.postings = postings
+        self._doc_ids = {name: doc_id for doc_id, name in enumerate(names)}
+        self._total_length = sum(doc_lengths)
+        # ההנחיה שממנה נלקחו המונחים של כל כלי, המונחים עצמם ואורכם לכל מסמך
+        self.prompts = {}
+        self.prompt_postings = {}
+        self.prompt_lengths = [0] * len(names)
+        self.prompts_version = None
+
+    @property
+    def avg_length(self):
+        return self._total_length / len(self.names) if self.names else 0.0
+
+    @classmethod
+    def build(cls, version, tools):
+        names = []
+        doc_lengths = []
+        postings = {}
+        for tool in tools:
+            name = tool.get("name")
+            if not name:
+                continue
+            doc_id = len(names)
+            terms = _document_terms(tool)
+            names.append(name)
+            doc_lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                postings.setdefault(term, []).append([doc_id, count])
+        return cls(version, names, doc_lengths, postings)
+
+    def update_prompts(self, prompts, prompts_version):
+        """עדכון מונחי ההנחיות רק עבור כלים שההנחיה שלהם נוספה, השתנתה או נמחקה. כל רשימת
+        הופעות שמשתנה מוחלפת ברשימה חדשה, כך שחיפוש שרץ במקביל רואה גרסה שלמה שלה"""
+        changed = [name for name, prompt in prompts.items() if self.prompts.get(name) != prompt]
+        changed.extend(name for name in self.prompts if name not in prompts)
+        # השינויים מקובצים לפי מונח, כך שכל רשימת הופעות מועתקת פעם אחת גם בבנייה הראשונה
+        updates = {}
+        for name in changed:
+            doc_id = self._doc_ids.get(name)
+            if doc_id is None:
+                continue
+            new_terms = Counter(_field_terms("prompt", prompts.get(name)))
+            for term in _field_terms("prompt", self.prompts.get(name)):
+                updates.setdefault(term, {})[doc_id] = 0
+            for term, count in new_terms.items():
+                updates.setdefault(term, {})[doc_id] = count
+            length = sum(new_terms.values())
+            self._total_length += length - self.prompt_lengths[doc_id]
+            self.prompt_lengths[doc_id] = length
+        for term, counts in updates.items():
+            postings = dict(self.prompt_postings.get(term, {}))
+            for doc_id, count in counts.items():
+                if count:
+                    postings[doc_id] = count
+                else:
+                    postings.pop(doc_id, None)
+            self.prompt_postings[term] = postings
+        self.prompts = prompts
+        self.prompts_version = prompts_version
+
+    def to_json(self):
+        return {
+            "version": self.version,
+            "names": self.names,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["version"], data["names"], data["doc_lengths"], data["postings"])
+
+    def score(self, query, allowed=None):
+        """ציוני BM25 לכל מסמך שמכיל לפחות מונח אחד מהשאלה"""
+        scores = {}
+        total = len(self.names)
+        avg_length = self.avg_length or 1
+        for token in set(tokenize(query)):
+            # הצורה הראשונה של המילה שמופיעה באינדקס - קודם המילה כפי שהיא, ואז בלי אותיות שימוש
+            postings = None
+            for term in prefix_variants(token):
+                postings = dict(self.postings.get(term, ()))
+                for doc_id, count in self.prompt_postings.get(term, {}).items():
+                    postings[doc_id] = postings.get(doc_id, 0) + count
+                if postings:
+                    break
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, count in postings.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                doc_length = self.doc_lengths[doc_id] + self.prompt_lengths[doc_id]
+                length_norm = 1 - BM25_B + BM25_B * doc_length / avg_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * count * (BM25_K1 + 1) / (count + BM25_K1 * length_norm)
+        return scores
+
+
+class CatalogSearch:
+    """חיפוש כלים רלוונטיים לשאלה מתוך הקטלוג, עם אינדקס שנשמר בדיסק ונבנה מחדש רק כשהקטלוג
+    משתנה. הנחיה חדשה של כלי מעדכנת בזיכרון רק את המונחים של אותו כלי"""
+
+    def __init__(self, catalog=tools_catalog, store=prompt_store, path=CATALOG_INDEX_FILE):
+        self.catalog = catalog
+        self.store = store
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _source_version(self):
+        return list(self.catalog.version or [])
+
+    def _load(self):
+        """האינדקס העדכני: מהזיכרון, מהדיסק, או בנייה מחדש אם הקטלוג השתנה - ועדכון מונחי
+        ההנחיות שהשתנו מאז הגישה הקודמת"""
+        version = self._source_version()
+        prompts_version = self.store.version
+        index = self._index
+        if index is not None and index.version == version and index.prompts_version == prompts_version:
+            return index
+
+        with self._lock:
+            index = self._index
+            if index is None or index.version != version:
+                index = self._load_catalog_index(version)
+            if index.prompts_version != prompts_version:
+                index.update_prompts(self.store.all(), prompts_version)
+            self._index = index
+            return index
+
+    def _load_catalog_index(self, version):
+        """החלק של הקטלוג באינדקס: מהדיסק, או בנייה מחדש אם הקטלוג השתנה. נקרא כשהמנעול מוחזק"""
+        # תהליך אחד בונה את האינדקס לכל גרסה, והשאר טוענים אותו מהדיסק
+        with FileLock(self.path + ".lock"):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    index = _SearchIndex.from_json(json.load(file))
+            except (OSError, ValueError, KeyError):
+                index = None
+
+            if index is None or index.version != version:
+                index = _SearchIndex.build(version, self.catalog.iter_tools())
+                try:
+                    write_json_atomic(self.path, index.to_json(), indent=None)
+                except OSError as e:
+                    log_event(logger, logging.WARNING, f"שגיאה בשמירת אינדקס החיפוש {self.path}", path=self.path, error=str(e))
+        return index
+
+    def search(self, query, k=CATALOG_SEARCH_TOP_K, tool_names=None):
+        """עד k הכלים הרלוונטיים ביותר לשאלה, מהרלוונטי לפחות רלוונטי.
+        אם התקבלו tool_names, החיפוש מוגבל לכלים האלו"""
+        index = self._load()
+        allowed = None
+        if tool_names is not None:
+            wanted = set(tool_names)
+            allowed = {doc_id for doc_id, name in enumerate(index.names) if name in wanted}
+        scores = index.score(query, allowed)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        results = []
+        for doc_id, _ in ranked:
+            tool = self.catalog.get(index.names[doc_id])
+            if tool is not None:
+                results.append(tool)
+        return results
+
+
+# מופע משותף לכל התהליך
+catalog_search = CatalogSearch()
@@ -0,0 +1,146 @@
+import os
+import re
+
+# מספר חילופי ההודעות המקסימלי שנשלח למודל. בתוך המגבלה הזו ההיסטוריה מותאמת לתקציב הטוקנים
+# של המודל, והודעות ישנות שלא נכנסות מסוכמות
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", 50))
+# תקציב הטוקנים לכל הבקשה (הנחיית מערכת + היסטוריה + שאלה), ברירת מחדל לכל המודלים
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 4000))
+# תקציבים לפי מודל, בפורמט "model=tokens,model=tokens"
+MODEL_PROMPT_TOKEN_BUDGETS = os.getenv("MODEL_PROMPT_TOKEN_BUDGETS", "")
+# החלק מהתקציב של ההיסטוריה ששמור לסיכום ההודעות הישנות
+SUMMARY_BUDGET_FRACTION = 0.25
+# מספר התווים המקסימלי שנשמר מכל הודעה ישנה בסיכום
+SUMMARY_LINE_CHARS = 160
+# תוספת טוקנים לכל הודעה (תפקיד ותגיות הפורמט של ה-API)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+_HEBREW_PATTERN = re.compile(r"[֐-׿]")
+_SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?׃])\s|\n")
+
+SUMMARY_HEADER = "סיכום החלק המוקדם של השיחה:"
+_ROLE_LABELS = {"user": "משתמש", "assistant": "עוזר"}
+
+
+def estimate_tokens(text):
+    """הערכה מקומית של מספר הטוקנים בטקסט, בלי טוקנייזר חיצוני.
+    מילים בעברית מתפרקות לטוקנים רבים יותר ממילים באנגלית, ולכן מוערכות לפי טוקן לכל שני תווים"""
+    tokens = 0
+    for word in _WORD_PATTERN.findall(text or ""):
+        if _HEBREW_PATTERN.search(word):
+            tokens += (len(word) + 1) // 2
+        else:
+            tokens += (len(word) + 3) // 4
+    return tokens
+
+
+def estimate_message_tokens(message):
+    """הערכת מספר הטוקנים של הודעה אחת, כולל התוספת של פורמט ה-API"""
+    return estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def estimate_messages_tokens(messages):
+    """הערכת מספר הטוקנים של רשימת הודעות"""
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+def prepare_conversation_history(messages, max_history=MAX_HISTORY_MESSAGES):
+    """הכנת היסטוריית שיחה לשליחה למודל השפה"""
+    if not messages or len(messages) < 2:  # אם אין מספיק הודעות להיסטוריה
+        return []
+
+    # בחירת ההודעות האחרונות (עד למקסימום שהוגדר)
+    recent_messages = messages[-max_history*2:] if len(messages) > max_history*2 else messages
+
+    # המרת הודעות לפורמט המתאים ל-API
+    conversation_history = []
+    for msg in recent_messages:
+        if msg["role"] in ["user", "assistant"]:
+            conversation_history.append({"role": msg["role"], "content": msg["content"]})
+
+    return conversation_history
+
+
+def _parse_model_budgets(value):
+    budgets = {}
+    for item in value.split(","):
+        model, _, tokens = item.partition("=")
+        if model.strip() and tokens.strip().isdigit():
+            budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+_model_budgets = _parse_model_budgets(MODEL_PROMPT_TOKEN_BUDGETS)
+
+
+def prompt_token_budget(models):
+    """תקציב הטוקנים לבקשה: הקטן מבין התקציבים של המודלים, כי כל אחד מהם עשוי לענות"""
+    budgets = [_model_budgets.get(model.strip(), PROMPT_TOKEN_BUDGET) for model in models if model.strip()]
+    return min(budgets) if budgets else PROMPT_TOKEN_BUDGET
+
+
+def _summary_line(message):
+    """שורת סיכום להודעה ישנה: המשפט הראשון שלה, מקוצר"""
+    content = " ".join((message.get("content") or "").split("\n", 1)[0].split())
+    first_sentence = _SENTENCE_END_PATTERN.split(content, 1)[0]
+    if len(first_sentence) > SUMMARY_LINE_CHARS:
+        first_sentence = first_sentence[:SUMMARY_LINE_CHARS].rstrip() + "…"
+    label = _ROLE_LABELS.get(message.get("role"), message.get("role"))
+    return f"- {label}: {first_sentence}"
+
+
+def _summarize(messages, budget):
+    """סיכום מתגלגל של ההודעות הישנות, מהחדשה לישנה ועד לתקציב, מוצג לפי סדר השיחה"""
+    lines = []
+    used = estimate_tokens(SUMMARY_HEADER) + MESSAGE_OVERHEAD_TOKENS
+    for message in reversed(messages):
+        line = _summary_line(message)
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        return None
+    lines.reverse()
+    return {"role": "system", "content": "\n".join([SUMMARY_HEADER] + lines)}
+
+
+def compact_history(conversation_history, budget):
+    """התאמת היסטוריית השיחה לתקציב טוקנים: ההודעות האחרונות נשמרות במלואן,
+    והודעות ישנות שלא נכנסו מסוכמות לסיכום קצר במקום להימחק"""
+    if not conversation_history or budget <= 0:
+        return []
+    if estimate_messages_tokens(conversation_history) <= budget:
+        return list(conversation_history)
+
+    summary_budget = int(budget * SUMMARY_BUDGET_FRACTION)
+    recent_budget = budget - summary_budget
+    used = 0
+    index = len(conversation_history)
+    while index > 0:
+        cost = estimate_message_tokens(conversation_history[index - 1])
+        if used + cost > recent_budget:
+            break
+        used += cost
+        index -= 1
+    recent = conversation_history[index:]
+
+    # התקציב שלא נוצל על ידי ההודעות האחרונות עובר לסיכום
+    summary = _summarize(conversation_history[:index], budget - used)
+    return ([summary] if summary else []) + list(recent)
+
+
+def fit_messages(system_prompt, conversation_history, user_prompt, models):
+    """בניית ההודעות למודל כך שהנחיית המערכת, ההיסטוריה והשאלה ייכנסו בתקציב של המודלים"""
+    messages = [{"role": "system", "content": system_prompt}]
+    question = {"role": "user", "content": user_prompt}
+    available = (
+        prompt_token_budget(models)
+        - estimate_message_tokens(messages[0])
+        - estimate_message_tokens(question)
+    )
+    messages.extend(compact_history(conversation_history, available))
+    messages.append(question)
+    return messages
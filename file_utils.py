@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    # ב-Windows אין flock - נעילה של הבית הראשון בקובץ עם msvcrt
+    fcntl = None
+    import msvcrt
+
+# ספריית הנתונים (קטלוג, הנחיות, מטמון). כשמריצים כמה עותקים של האפליקציה מאחורי מאזן עומסים,
+# מפנים את כולם לאותה ספרייה בכונן משותף, והמנעולים שכאן מתאמים ביניהם את הכתיבה
+DATA_DIR = os.getenv("DATA_DIR", "data")
+# כל כמה זמן (בשניות) בודקים שוב מנעול שתפוס בידי תהליך אחר
+LOCK_POLL_SECONDS = 0.05
+
+
+def write_file_atomic(path, data):
+    """כתיבת תוכן (bytes) לקובץ זמני באותה ספרייה והחלפה אטומית, כך שקורא לעולם לא יראה קובץ חלקי"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json_atomic(path, data, indent=2):
+    """כתיבת קובץ JSON בהחלפה אטומית. indent=None לקבצים גדולים שלא נקראים בידי אדם"""
+    content = json.dumps(data, indent=indent, ensure_ascii=False, separators=None if indent else (",", ":"))
+    write_file_atomic(path, content.encode("utf-8"))
+
+
+class FileLock:
+    """מנעול בין תהליכים (ובין תהליכונים) על קובץ נעילה, כך שרק אחד מחזיק אותו בכל רגע.
+    המנעול משתחרר אוטומטית גם כשהתהליך שמחזיק אותו קורס"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def _try_lock(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self, blocking=True, timeout=None):
+        """תפיסת המנעול. מחזיר False אם הוא תפוס ו-blocking כבוי, או שעבר timeout שניות"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a+b')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._try_lock():
+            if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                self._file.close()
+                self._file = None
+                return False
+            time.sleep(LOCK_POLL_SECONDS)
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,220 @@
+"""יצירה מראש של הנחיות המערכת לכל הכלים בקטלוג, מחוץ למסלול הבקשה של המשתמשים.
+
+דוגמאות הרצה:
+    python generate_prompts.py                      # יצירת הנחיות חסרות ומיושנות
+    python generate_prompts.py --concurrency 8 --rpm 60
+    python generate_prompts.py --force --limit 20   # יצירה מחדש גם להנחיות קיימות
+    python generate_prompts.py --dry-run            # רק הצגת מה שהיה נוצר
+
+ההנחיות נשמרות בקבוצות תוך כדי ההרצה (כל SAVE_BATCH_SIZE הנחיות או כל SAVE_INTERVAL_SECONDS שניות),
+כך שהרצה שנקטעה ממשיכה בהרצה הבאה כמעט מאותה נקודה. היצירה של כל כלי נעשית תחת מנעול היצירה
+של prompt_store, כך שהכלי ואפליקציה שרצה במקביל לא יוצרים את אותה הנחיה פעמיים ולא דורסים זה את זה.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from groq_client import (
+    tools_catalog,
+    prompt_store,
+    model_router,
+    tool_prompt_source,
+    generate_tool_prompt_async,
+)
+from rate_limiter import PRIORITY_BACKGROUND
+
+# מספר ההנחיות שנשמרות יחד בכתיבה אחת של קובץ ההנחיות
+SAVE_BATCH_SIZE = 25
+# הזמן המקסימלי (בשניות) שהנחיה שנוצרה ממתינה לשמירה
+SAVE_INTERVAL_SECONDS = 10.0
+
+
+class _PromptWriter:
+    """צבירת ההנחיות שנוצרו ושמירתן בקבוצות. כל שמירה כותבת את כל הקובץ, ולכן שמירה של כל
+    הנחיה בנפרד הייתה כותבת כמות נתונים ריבועית במספר ההנחיות. הכתיבה רצה בתהליכון נפרד,
+    כך שלולאת האירועים ממשיכה לשלוח בקשות בזמן השמירה. מנעולי היצירה של הכלים משתחררים רק
+    אחרי השמירה, כדי שאפליקציה שממתינה למנעול תמצא את ההנחיה בדיסק ולא תיצור אותה שוב"""
+
+    def __init__(self, store, batch_size=SAVE_BATCH_SIZE, interval=SAVE_INTERVAL_SECONDS):
+        self.store = store
+        self.batch_size = batch_size
+        self.interval = interval
+        self._prompts = {}
+        self._sources = {}
+        self._locks = []
+        self._last_save = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def add(self, name, prompt, source, lock=None):
+        self._prompts[name] = prompt
+        self._sources[name] = source
+        if lock is not None:
+            self._locks.append(lock)
+        if len(self._prompts) >= self.batch_size or time.monotonic() - self._last_save >= self.interval:
+            await self.flush()
+
+    def _take(self):
+        prompts, sources, locks = self._prompts, self._sources, self._locks
+        self._prompts, self._sources, self._locks = {}, {}, []
+        self._last_save = time.monotonic()
+        return prompts, sources, locks
+
+    @staticmethod
+    def _release(locks):
+        for lock in locks:
+            lock.release()
+
+    async def flush(self):
+        async with self._lock:
+            prompts, sources, locks = self._take()
+            try:
+                await asyncio.to_thread(self.store.set_many, prompts, sources)
+            finally:
+                self._release(locks)
+
+    def flush_now(self):
+        """שמירה סינכרונית של מה שנותר, גם כשההרצה נקטעה"""
+        prompts, sources, locks = self._take()
+        try:
+            self.store.set_many(prompts, sources)
+        finally:
+            self._release(locks)
+
+
+class _Throttle:
+    """ריווח תחילת הבקשות לפי מכסת בקשות לדקה"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            # אם כל המודלים חסומים (429 או מפסק פתוח) ממתינים עד שאחד מהם יתפנה
+            delay = max(self._next_start - time.monotonic(), model_router.retry_in(), 0.0)
+            if delay:
+                await asyncio.sleep(delay)
+            self._next_start = time.monotonic() + self.interval
+
+
+def _pending_reason(name, force=False):
+    """הסיבה ליצירת הנחיה לכלי (חסרה, מיושנת או force), או None אם ההנחיה השמורה עדכנית"""
+    if name not in prompt_store:
+        return "missing"
+    if force:
+        return "forced"
+    recorded_source = prompt_store.source(name)
+    if recorded_source is not None and recorded_source != tool_prompt_source(name):
+        return "stale"
+    return None
+
+
+def find_pending_tools(force=False):
+    """הכלים שצריך ליצור עבורם הנחיה: חסרה, מיושנת (מידע הכלי השתנה מאז), או כולם עם force"""
+    pending = []
+    for name in tools_catalog.names():
+        reason = _pending_reason(name, force)
+        if reason is not None:
+            pending.append((name, reason))
+    return pending
+
+
+async def generate_prompts(pending, concurrency, requests_per_minute):
+    """יצירת ההנחיות במקביל, עם מספר בקשות פתוחות מוגבל וריווח לפי מכסת הבקשות"""
+    semaphore = asyncio.Semaphore(concurrency)
+    throttle = _Throttle(requests_per_minute)
+    results = {"generated": [], "failed": [], "skipped": []}
+    writer = _PromptWriter(prompt_store)
+    total = len(pending)
+    done = 0
+
+    async def generate_one(name, reason):
+        nonlocal done
+        async with semaphore:
+            # אותו מנעול שהאפליקציה תופסת כשהיא יוצרת הנחיה לכלי חסר
+            lock = await prompt_store.acquire_generation_lock_async(name)
+            try:
+                # ייתכן שהאפליקציה יצרה את ההנחיה בזמן שחיכינו למנעול
+                if reason != "forced" and await asyncio.to_thread(_pending_reason, name) is None:
+                    done += 1
+                    results["skipped"].append({"tool": name, "reason": reason})
+                    print(f"[{done}/{total}] ההנחייה עבור {name} כבר נוצרה בתהליך אחר")
+                    return
+                await throttle.wait()
+                started = time.monotonic()
+                try:
+                    prompt = await generate_tool_prompt_async(name, priority=PRIORITY_BACKGROUND)
+                except Exception as e:
+                    print(f"שגיאה ביצירת הנחייה עבור {name}: {str(e)}")
+                    prompt = None
+                elapsed = time.monotonic() - started
+                done += 1
+                if prompt:
+                    source = await asyncio.to_thread(tool_prompt_source, name)
+                    # המנעול עובר לשמירה, ומשתחרר רק אחרי שההנחיה נכתבה לדיסק
+                    await writer.add(name, prompt, source, lock)
+                    lock = None
+                    results["generated"].append({"tool": name, "reason": reason, "seconds": round(elapsed, 2)})
+                    print(f"[{done}/{total}] נוצרה הנחייה עבור {name} ({reason}, {elapsed:.1f} שניות)")
+                else:
+                    results["failed"].append({"tool": name, "reason": reason})
+                    print(f"[{done}/{total}] נכשלה יצירת ההנחייה עבור {name}")
+            finally:
+                if lock is not None:
+                    lock.release()
+
+    try:
+        await asyncio.gather(*(generate_one(name, reason) for name, reason in pending))
+    finally:
+        # גם בהרצה שנקטעה (למשל Ctrl+C) ההנחיות שכבר נוצרו נשמרות
+        writer.flush_now()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="יצירה מראש של הנחיות מערכת לכלי הקטלוג")
+    parser.add_argument("--concurrency", type=int, default=4, help="מספר הבקשות המקסימלי במקביל")
+    parser.add_argument("--rpm", type=float, default=30, help="מספר הבקשות המקסימלי לדקה (0 ללא הגבלה)")
+    parser.add_argument("--limit", type=int, default=None, help="מספר הכלים המקסימלי בהרצה אחת")
+    parser.add_argument("--force", action="store_true", help="יצירה מחדש גם של הנחיות קיימות")
+    parser.add_argument("--dry-run", action="store_true", help="הצגת הכלים שהיו מעובדים, בלי ליצור הנחיות")
+    parser.add_argument("--report", help="נתיב לשמירת דוח הסיכום כ-JSON")
+    args = parser.parse_args(argv)
+
+    pending = find_pending_tools(force=args.force)
+    if args.limit is not None:
+        pending = pending[:args.limit]
+
+    catalog_size = len(tools_catalog.names())
+    print(f"בקטלוג {catalog_size} כלים, {len(pending)} מהם ממתינים ליצירת הנחייה")
+    if args.dry_run:
+        for name, reason in pending:
+            print(f"  {name} ({reason})")
+        return 0
+
+    started = time.monotonic()
+    results = asyncio.run(generate_prompts(pending, max(1, args.concurrency), args.rpm))
+    report = {
+        "catalog_size": catalog_size,
+        "pending": len(pending),
+        "generated": len(results["generated"]),
+        "failed": len(results["failed"]),
+        "skipped": len(results["skipped"]),
+        "elapsed_seconds": round(time.monotonic() - started, 2),
+        "models": model_router.stats(),
+        "details": results,
+    }
+
+    print(f"הסתיים: נוצרו {report['generated']}, נכשלו {report['failed']}, דולגו {report['skipped']}, "
+          f"תוך {report['elapsed_seconds']} שניות")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+    return 1 if results["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,79 +1,135 @@
 import os
-import json
-import random
-from functools import lru_cache
-import groq
+import time
+import asyncio
+import logging
+import threading
 from dotenv import load_dotenv
 
-# טעינת משתני סביבה
+# טעינת משתני סביבה - לפני ייבוא שאר המודולים, שקוראים את ההגדרות שלהם בזמן הייבוא
 load_dotenv()
 
+from tools_catalog import tools_catalog
+from llm_backend import create_llm_backend
+from model_router import ModelRouter
+from rate_limiter import rate_limiter, RateLimitExceeded, PRIORITY_INTERACTIVE, RATE_LIMIT_COMPLETION_TOKENS
+from response_cache import response_cache, fingerprint
+from prompt_store import prompt_store
+from conversation_history import fit_messages, estimate_tokens, estimate_messages_tokens
+from catalog_search import catalog_search, CATALOG_SEARCH_TOP_K, tokenize, prefix_variants
+from prompt_builder import (
+    GENERAL_SYSTEM_PROMPT,
+    COMPARISON_REDUCE_SYSTEM_PROMPT,
+    format_tool_details,
+    tool_system_prompt,
+    multiple_tools_system_prompt,
+    general_user_prompt,
+    tool_user_prompt,
+    multiple_tools_user_prompt,
+    comparison_map_user_prompt,
+    comparison_reduce_user_prompt,
+    prompt_stats,
+)
+from tracing import tracer, get_logger, log_event
+
 # קביעת ה-API Key של Groq
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-# מודלים זמינים לשימוש, יוחלפו באופן אקראי אם אחד לא זמין
+# מודלים זמינים לשימוש, הנתב בוחר את המהיר מבין התקינים ועובר לבא אם אחד לא זמין
 GROQ_MODELS = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile,llama3-70b-8192").split(",")
 # מספר הטוקנים המקסימלי לתשובה
 GROQ_MAX_TOKENS = int(os.getenv("GROQ_MAX_TOKENS", 2024))
-# מספר ההודעות לשמירה בהיסטוריה
-MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", 5))
-
-# אתחול הלקוח של Groq
-groq_client = groq.Groq(api_key=GROQ_API_KEY)
-
-# נתיב לקובץ של ההנחיות לכלי AI
-TOOLS_PROMPTS_FILE = os.path.join("data", "tools_prompts.json")
-TOOLS_FILE = os.path.join("data", "tools.json")
-
-def load_tool_prompts():
-    """טעינת הנחיות לכלי AI מקובץ JSON"""
-    if os.path.exists(TOOLS_PROMPTS_FILE):
-        with open(TOOLS_PROMPTS_FILE, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    return {}
-
-def save_tool_prompt(tool_name, prompt):
-    """שמירת הנחייה לכלי AI בקובץ JSON"""
-    prompts = load_tool_prompts()
-    prompts[tool_name] = prompt
-    os.makedirs(os.path.dirname(TOOLS_PROMPTS_FILE), exist_ok=True)
-    with open(TOOLS_PROMPTS_FILE, 'w', encoding='utf-8') as file:
-        json.dump(prompts, file, indent=2, ensure_ascii=False)
-
-def load_tools_data():
-    """טעינת נתוני כלים מקובץ JSON"""
-    if os.path.exists(TOOLS_FILE):
-        with open(TOOLS_FILE, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    return []
+# מספר הכלים שממנו שאלת השוואה על מספר כלים נענית בהשוואה מקבילית: שאלה קצרה על כל כלי
+# במקביל, ושלב סיכום שמאחד את התשובות לטבלה (0 = כבוי)
+COMPARISON_MIN_TOOLS = int(os.getenv("COMPARISON_MIN_TOOLS", 6))
+# מספר הטוקנים המקסימלי לתשובה הקצרה על כל כלי בהשוואה
+COMPARISON_MAP_MAX_TOKENS = int(os.getenv("COMPARISON_MAP_MAX_TOKENS", 300))
+# מספר ההודעות האחרונות מהשיחה שנשלחות עם השאלה הקצרה על כל כלי (למשל "ומה לגבי המחיר?")
+COMPARISON_MAP_HISTORY_MESSAGES = 4
+# מילים שמעידות שהשאלה מבקשת השוואה בין הכלים (אחרי הנרמול של חיפוש הקטלוג)
+COMPARISON_KEYWORDS = frozenset(tokenize(
+    "השווה השוו תשווה להשוות השוואה השוואת הבדל הבדלים ההבדל ההבדלים לעומת עדיף עדיפה הכי מומלץ "
+    "טבלה compare comparison vs versus difference differences better best"
+))
+# מגבלות מאגר החיבורים של הלקוח האסינכרוני
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", 20))
+GROQ_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GROQ_MAX_KEEPALIVE_CONNECTIONS", 10))
+
+# מספר הניסיונות החוזרים של ספריית Groq לאותו מודל - ברירת המחדל 0, כי הנתב כבר עובר למודל הבא
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", 0))
+
+# ספק מודל השפה: "groq", או "openai" לכל שרת תואם OpenAI (למשל השרת המדומה לבדיקות עומס)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+# כתובת השרת של הספק (ב-groq ברירת המחדל היא ה-API הרשמי)
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+# זמן מקסימלי (בשניות) לבקשה אחת למודל
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+
+# ספק המודל המשותף - הלקוחות עצמם נוצרים רק בבקשה הראשונה
+llm_backend = create_llm_backend(
+    LLM_BACKEND,
+    api_key=os.getenv("LLM_API_KEY") or GROQ_API_KEY,
+    base_url=LLM_BASE_URL,
+    timeout=LLM_TIMEOUT_SECONDS,
+    max_retries=GROQ_MAX_RETRIES,
+    max_connections=GROQ_MAX_CONNECTIONS,
+    max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS,
+)
+
+# נתב המודלים המשותף לכל הבקשות בתהליך
+model_router = ModelRouter(GROQ_MODELS)
+
+# לולאת אירועים משותפת ברקע, להרצת הפונקציות האסינכרוניות מקוד סינכרוני (כמו Streamlit)
+_async_loop = None
+_async_loop_lock = threading.Lock()
+
+# לוג JSON לשגיאות המודלים, עם מזהה הבקשה בכל שורה
+logger = get_logger("groq_client")
+
+# הודעה שמוחזרת למשתמש כאשר כל המודלים נכשלו
+FAILURE_MESSAGE = "מצטער, לא הצלחתי לקבל תשובה כרגע. אנא נסה שוב מאוחר יותר."
+# הודעה שמוחזרת כשהבקשה נדחתה בגלל עומס, עם זמן ההמתנה המשוער
+BUSY_MESSAGE = "יש כרגע עומס רב על המערכת. אנא נסה שוב בעוד כ-{seconds} שניות."
+
+def busy_message(retry_after):
+    """הודעת העומס למשתמש, עם זמן ההמתנה המשוער בשניות שלמות"""
+    return BUSY_MESSAGE.format(seconds=max(1, round(retry_after)))
+
+def estimated_wait():
+    """זמן ההמתנה המשוער (בשניות) בתור המשותף לשאלה חדשה, להצגה למשתמש"""
+    return rate_limiter.estimated_wait(model_router.candidates())
 
 def find_tool_in_local_data(tool_name):
     """חיפוש כלי בנתונים המקומיים והחזרת המידע עליו"""
-    tools_data = load_tools_data()
-    for tool in tools_data:
-        if tool.get("name") == tool_name:
-            return tool
-    return None
+    return tools_catalog.get(tool_name)
 
 def find_tools_in_local_data(tool_names):
     """חיפוש מספר כלים בנתונים המקומיים והחזרת המידע עליהם"""
-    tools_data = load_tools_data()
-    found_tools = []
-    
-    for tool_name in tool_names:
-        for tool in tools_data:
-            if tool.get("name") == tool_name:
-                found_tools.append(tool)
-                break
-    
-    return found_tools
+    return tools_catalog.get_many(tool_names)
 
-# הסרנו את הדקורטור lru_cache כי הוא לא יכול לעבוד עם רשימות
-def get_or_create_tool_prompt(tool_name):
-    """קבלת הנחייה לכלי AI או יצירת הנחייה חדשה אם לא קיימת"""
-    prompts = load_tool_prompts()
-    if tool_name in prompts:
-        return prompts[tool_name]
-    
+def _get_async_loop():
+    """לולאת האירועים המשותפת שרצה בתהליכון רקע, נוצרת בשימוש הראשון"""
+    global _async_loop
+    if _async_loop is None:
+        with _async_loop_lock:
+            if _async_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="groq-async-loop", daemon=True).start()
+                _async_loop = loop
+    return _async_loop
+
+def run_async(coroutine):
+    """הרצת קורוטינה על לולאת האירועים המשותפת והמתנה לתוצאה, לשימוש מקוד סינכרוני"""
+    span = tracer.current_span()
+    if span is not None:
+        # ההקשר (contextvars) לא עובר ללולאה שבתהליכון אחר, ולכן ה-span מועבר במפורש
+        coroutine = tracer.run_with_parent(span, coroutine)
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_async_loop()).result()
+
+def run_async_in_background(coroutine):
+    """הרצת קורוטינה על לולאת האירועים המשותפת בלי להמתין לה. מחזיר concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_async_loop())
+
+def _tool_prompt_messages(tool_name):
+    """בניית ההודעות למודל ליצירת הנחיית מערכת לכלי AI"""
     # בדיקה אם קיים מידע בסיסי על הכלי בקובץ tools.json
     tool_info = find_tool_in_local_data(tool_name)
     
@@ -111,146 +167,518 @@ def get_or_create_tool_prompt(tool_name):
         
         Always answer in Hebrew and keep responses concise."""
     
-    try:
-        # ערבוב המודלים כדי להשתמש באחד הזמין
-        random.shuffle(GROQ_MODELS)
-        for model in GROQ_MODELS:
-            try:
-                response = groq_client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": "You are an expert in AI tools and advanced technologies."},
-                    ],
-                    model=model,
-                    temperature=0.7,
-                    max_tokens=GROQ_MAX_TOKENS,
-                    stream=False,
-                )
-                new_prompt = response.choices[0].message.content
-                save_tool_prompt(tool_name, new_prompt)
-                return new_prompt
-            except Exception as e:
-                print(f"שגיאה עם מודל {model}: {str(e)}. מנסה מודל הבא.")
-                continue
-    except Exception as e:
-        print(f"שגיאה ביצירת הנחייה עבור {tool_name}: {str(e)}")
-        return f"מידע בסיסי על {tool_name}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "You are an expert in AI tools and advanced technologies."},
+    ]
 
-# הסרנו את הדקורטור lru_cache כי אנחנו עכשיו מעבירים רשימה
-def ask_about_tool(tool_name, question, general_chat=False, conversation_history=None):
-    """שאילת שאלה על כלי AI או שיחה כללית, עם תמיכה בהיסטוריית שיחה"""
-    if general_chat:
-        system_prompt = """You are a helpful and accurate information assistant. You are an expert in AI tools, machine learning models, 
-        and software development. You answer in Hebrew and strive to provide accurate and useful information."""
+def tool_prompt_source(tool_name):
+    """טביעת האצבע של מידע הכלי מהקטלוג שממנו נבנית ההנחיה, לזיהוי הנחיות שהתיישנו"""
+    tool_info = find_tool_in_local_data(tool_name) or {}
+    return fingerprint({key: tool_info.get(key) for key in ("description", "category", "rating")})
+
+async def generate_tool_prompt_async(tool_name, priority=PRIORITY_INTERACTIVE):
+    """יצירת הנחיה חדשה לכלי מהמודל, בלי לשמור אותה (None אם כל המודלים נכשלו)"""
+    messages = await asyncio.to_thread(_tool_prompt_messages, tool_name)
+    return await _chat_completion_async(messages, temperature=0.7, priority=priority)
+
+# הסרנו את הדקורטור lru_cache כי הוא לא יכול לעבוד עם רשימות
+def get_or_create_tool_prompt(tool_name):
+    """קבלת הנחייה לכלי AI או יצירת הנחייה חדשה אם לא קיימת"""
+    with tracer.span("prompt.lookup", tool=tool_name, generated=False) as span:
+        def create():
+            span.set(generated=True)
+            with tracer.span("prompt.generate", tool=tool_name):
+                return _chat_completion(_tool_prompt_messages(tool_name), temperature=0.7)
+
+        # כמה סשנים ששואלים במקביל על אותו כלי חדש ממתינים ליצירה אחת בלבד
+        try:
+            new_prompt = prompt_store.get_or_create(tool_name, create, source=tool_prompt_source(tool_name))
+        except RateLimitExceeded:
+            # בעומס עונים עם המידע הבסיסי, וההנחיה תיווצר בשאלה הבאה על הכלי
+            new_prompt = None
+        if new_prompt is None:
+            log_event(logger, logging.ERROR, f"שגיאה ביצירת הנחייה עבור {tool_name}: כל המודלים נכשלו", tool=tool_name)
+            return f"מידע בסיסי על {tool_name}"
+        return new_prompt
+
+async def get_or_create_tool_prompt_async(tool_name, priority=PRIORITY_INTERACTIVE):
+    """גרסה אסינכרונית של get_or_create_tool_prompt"""
+    with tracer.span("prompt.lookup", tool=tool_name, generated=False) as span:
+        async def create():
+            span.set(generated=True)
+            with tracer.span("prompt.generate", tool=tool_name):
+                return await generate_tool_prompt_async(tool_name, priority=priority)
+
+        try:
+            source = await asyncio.to_thread(tool_prompt_source, tool_name)
+            new_prompt = await prompt_store.get_or_create_async(tool_name, create, source=source)
+        except RateLimitExceeded:
+            new_prompt = None
+        if new_prompt is None:
+            log_event(logger, logging.ERROR, f"שגיאה ביצירת הנחייה עבור {tool_name}: כל המודלים נכשלו", tool=tool_name)
+            return f"מידע בסיסי על {tool_name}"
+        return new_prompt
+
+def _reserved_tokens(messages, max_tokens=GROQ_MAX_TOKENS):
+    """מספר הטוקנים שנשמר מהמכסה לבקשה: ההודעות ותשובה באורך המשוער"""
+    return estimate_messages_tokens(messages) + min(RATE_LIMIT_COMPLETION_TOKENS, max_tokens)
+
+def _start_attempt(permit, messages, temperature, stream=False):
+    """span לניסיון אחד מול מודל, עם הערכת מספר הטוקנים של הבקשה וזמן ההמתנה בתור"""
+    return tracer.start_span(
+        "llm.attempt", model=permit.model, temperature=temperature, stream=stream,
+        backend=llm_backend.name, prompt_tokens_estimate=estimate_messages_tokens(messages),
+        queue_wait_ms=round(permit.waited * 1000, 3),
+    )
+
+def _attempt_succeeded(span, permit, messages, answer):
+    """עדכון המכסה וה-span לפי אורך התשובה בפועל"""
+    completion_tokens = estimate_tokens(answer)
+    permit.settle(estimate_messages_tokens(messages) + completion_tokens)
+    span.set(completion_tokens_estimate=completion_tokens).end()
+
+def _attempt_failed(span, permit, error, elapsed, messages=None, partial_answer=None):
+    """רישום ניסיון שנכשל בנתב, במגביל הקצב, ב-span ובלוג. partial_answer הוא מה שכבר הוזרם
+    לפני שההזרמה נקטעה - הניסיון נרשם ככשלון, אבל הטוקנים שנוצלו בפועל נספרים במכסה"""
+    model = permit.model
+    model_router.record_failure(model, error, elapsed)
+    if partial_answer is None:
+        # הבקשה נספרת במכסת הבקשות, אבל הטוקנים שנשמרו לה חוזרים למכסה
+        permit.settle(0)
     else:
-        # בדיקה אם יש מידע מקומי על הכלי
-        tool_info = find_tool_in_local_data(tool_name)
-        tool_prompt = get_or_create_tool_prompt(tool_name)
-        
-        if tool_info:
-            # הוספת מידע מקומי להנחייה
-            system_prompt = f"""You are an expert in the tool {tool_name}. Here is information about the tool:
-            
-            Basic information:
-            Description: {tool_info.get('description', 'Unknown')}
-            Category: {tool_info.get('category', 'Unknown')}
-            Rating: {tool_info.get('rating', 'Unknown')}
-            URL: {tool_info.get('url', 'Unknown')}
-            
-            Additional information:
-            {tool_prompt}
-            
-            Answer in Hebrew in a concise and accurate manner. If you don't have information, simply say so."""
-        else:
-            system_prompt = f"""You are an expert in the tool {tool_name}. Here is information about the tool:
-            {tool_prompt}
-            
-            Answer in Hebrew in a concise and accurate manner. If you don't have information, simply say so."""
+        permit.settle(estimate_messages_tokens(messages) + estimate_tokens(partial_answer))
+    # בזמן שהמפסק פתוח (למשל אחרי 429 עם retry-after) הבקשות בתור של המודל ממתינות ולא נשלחות
+    rate_limiter.penalize(model, model_router.cooldown_remaining(model))
+    span.record_error(error)
+    span.end()
+    if partial_answer is None:
+        log_event(
+            logger, logging.WARNING, f"שגיאה עם מודל {model}. מנסה מודל הבא.",
+            model=model, error=str(error), status_code=getattr(error, "status_code", None),
+        )
+    else:
+        log_event(
+            logger, logging.ERROR, f"שגיאה עם מודל {model} באמצע הזרמת התשובה",
+            model=model, error=str(error), status_code=getattr(error, "status_code", None),
+        )
 
-    # בניית ההודעות עם היסטוריית השיחה אם קיימת
-    messages = [{"role": "system", "content": system_prompt}]
-    
-    if conversation_history and len(conversation_history) > 0:
-        # הוספת היסטוריית השיחה להודעות
-        messages.extend(conversation_history)
-    
-    # הוספת השאלה הנוכחית
-    user_prompt = f"Question about {tool_name if not general_chat else 'AI tools'}: {question}"
-    messages.append({"role": "user", "content": user_prompt})
-    
-    # ערבוב המודלים כדי להשתמש באחד הזמין
-    random.shuffle(GROQ_MODELS)
-    
-    for model in GROQ_MODELS:
+def _chat_completion(messages, temperature, priority=PRIORITY_INTERACTIVE):
+    """שליחת ההודעות למודלים הזמינים לפי סדר הנתב, עד לקבלת תשובה מלאה (None אם כולם נכשלו).
+    כל ניסיון ממתין לתור ולמכסה המשותפים, וזורק RateLimitExceeded כשההמתנה ארוכה מדי"""
+    candidates = model_router.candidates()
+    while candidates:
+        # המגביל בוחר מבין המודלים שנותרו את הראשון שיש לו מכסה פנויה
+        permit = rate_limiter.acquire(candidates, _reserved_tokens(messages), priority)
+        model = permit.model
+        candidates.remove(model)
+        span = _start_attempt(permit, messages, temperature)
+        started = time.monotonic()
         try:
-            response = groq_client.chat.completions.create(
-                messages=messages,
-                model=model,
-                temperature=0.7,
-                max_tokens=GROQ_MAX_TOKENS,
-                stream=False,
-            )
-            return response.choices[0].message.content
+            answer = llm_backend.complete(model, messages, temperature, GROQ_MAX_TOKENS)
         except Exception as e:
-            print(f"שגיאה עם מודל {model}: {str(e)}. מנסה מודל הבא.")
+            _attempt_failed(span, permit, e, time.monotonic() - started)
             continue
-    
-    # אם כל המודלים נכשלו
-    return "מצטער, לא הצלחתי לקבל תשובה כרגע. אנא נסה שוב מאוחר יותר."
+        model_router.record_success(model, time.monotonic() - started)
+        _attempt_succeeded(span, permit, messages, answer)
+        return answer
 
-def ask_about_multiple_tools(tools, question, conversation_history=None):
-    """שאילת שאלה על מספר כלי AI, עם תמיכה בהיסטוריית שיחה"""
-    tools_str = ", ".join(tools)
-    
-    # איסוף מידע מקומי על הכלים
-    tools_info = find_tools_in_local_data(tools)
-    tools_details = ""
-    
-    if tools_info:
-        # הכנת מידע מפורט על הכלים מהנתונים המקומיים
-        for tool in tools_info:
-            tools_details += f"""
-            כלי: {tool.get('name', 'Unknown')}
-            תיאור: {tool.get('description', 'Unknown')}
-            קטגוריה: {tool.get('category', 'Unknown')}
-            דירוג: {tool.get('rating', 'Unknown')}
-            URL: {tool.get('url', 'Unknown')}
-            """
-    
-    system_prompt = f"""אתה מומחה בכלי AI, במיוחד: {tools_str}.
-    
-    מידע בסיסי על הכלים:
-    {tools_details}
-    
-    אתה עונה בעברית ובצורה תמציתית ומדויקת. נסה להשוות בין הכלים כאשר רלוונטי."""
-    
-    # בניית ההודעות עם היסטוריית השיחה אם קיימת
-    messages = [{"role": "system", "content": system_prompt}]
-    
-    if conversation_history and len(conversation_history) > 0:
-        # הוספת היסטוריית השיחה להודעות
-        messages.extend(conversation_history)
-    
-    # הוספת השאלה הנוכחית
-    user_prompt = f"שאלה על הכלים הבאים: {tools_str}. השאלה: {question}"
-    messages.append({"role": "user", "content": user_prompt})
-    
-    # ערבוב המודלים כדי להשתמש באחד הזמין
-    random.shuffle(GROQ_MODELS)
-    
-    for model in GROQ_MODELS:
+    return None
+
+async def _chat_completion_async(messages, temperature, priority=PRIORITY_INTERACTIVE, max_tokens=GROQ_MAX_TOKENS):
+    """גרסה אסינכרונית של _chat_completion, על גבי מאגר החיבורים המשותף"""
+    candidates = model_router.candidates()
+    while candidates:
+        permit = await rate_limiter.acquire_async(candidates, _reserved_tokens(messages, max_tokens), priority)
+        model = permit.model
+        candidates.remove(model)
+        span = _start_attempt(permit, messages, temperature)
+        started = time.monotonic()
         try:
-            response = groq_client.chat.completions.create(
-                messages=messages,
-                model=model,
-                temperature=0.1,
-                max_tokens=GROQ_MAX_TOKENS,
-                stream=False,
-            )
-            return response.choices[0].message.content
+            answer = await llm_backend.complete_async(model, messages, temperature, max_tokens)
         except Exception as e:
-            print(f"שגיאה עם מודל {model}: {str(e)}. מנסה מודל הבא.")
+            _attempt_failed(span, permit, e, time.monotonic() - started)
             continue
-    
+        model_router.record_success(model, time.monotonic() - started)
+        _attempt_succeeded(span, permit, messages, answer)
+        return answer
+
+    return None
+
+def _chat_completion_stream(messages, temperature, priority=PRIORITY_INTERACTIVE):
+    """הזרמת תשובה מהמודלים הזמינים, מחזיר את קטעי הטקסט כפי שהם מגיעים מהמודל.
+    ערך ההחזרה של המחולל הוא True רק אם התשובה התקבלה במלואה"""
+    candidates = model_router.candidates()
+    while candidates:
+        permit = rate_limiter.acquire(candidates, _reserved_tokens(messages), priority)
+        model = permit.model
+        candidates.remove(model)
+        # ה-span לא הופך לנוכחי, כי המחולל מחזיר שליטה לקורא באמצע הניסיון
+        span = _start_attempt(permit, messages, temperature, stream=True)
+        started = time.monotonic()
+        ttft = None
+        parts = []
+        try:
+            for delta in llm_backend.stream(model, messages, temperature, GROQ_MAX_TOKENS):
+                if ttft is None:
+                    # בהזרמה, זמן התגובה שמעניין את הנתב הוא הזמן עד הטוקן הראשון. ההצלחה נרשמת
+                    # רק בסוף ההזרמה, כדי שהזרמה שנקטעת באמצע תיספר ככשלון
+                    ttft = time.monotonic() - started
+                    span.set(ttft_ms=round(ttft * 1000, 3))
+                parts.append(delta)
+                yield delta
+            return True
+        except Exception as e:
+            span.set(chunks=len(parts))
+            if ttft is not None:
+                # חלק מהתשובה כבר הוצג למשתמש - אי אפשר לעבור למודל אחר באמצע
+                _attempt_failed(span, permit, e, time.monotonic() - started, messages, "".join(parts))
+                return False
+            _attempt_failed(span, permit, e, time.monotonic() - started)
+            continue
+        finally:
+            # התשובה הסתיימה, או שהקורא הפסיק לקרוא אותה (למשל משתמש שעזב את הדף)
+            if span.end_ns is None:
+                if ttft is not None:
+                    model_router.record_success(model, ttft)
+                span.set(chunks=len(parts))
+                _attempt_succeeded(span, permit, messages, "".join(parts))
+
     # אם כל המודלים נכשלו
-    return "מצטער, לא הצלחתי לקבל תשובה כרגע. אנא נסה שוב מאוחר יותר."
\ No newline at end of file
+    yield FAILURE_MESSAGE
+    return False
+
+async def _chat_completion_stream_async(messages, temperature, result, priority=PRIORITY_INTERACTIVE):
+    """גרסה אסינכרונית של _chat_completion_stream. למחולל אסינכרוני אין ערך החזרה, ולכן
+    result["completed"] הוא True רק אם התשובה התקבלה במלואה"""
+    result["completed"] = False
+    candidates = model_router.candidates()
+    while candidates:
+        permit = await rate_limiter.acquire_async(candidates, _reserved_tokens(messages), priority)
+        model = permit.model
+        candidates.remove(model)
+        span = _start_attempt(permit, messages, temperature, stream=True)
+        started = time.monotonic()
+        ttft = None
+        parts = []
+        try:
+            async for delta in llm_backend.stream_async(model, messages, temperature, GROQ_MAX_TOKENS):
+                if ttft is None:
+                    ttft = time.monotonic() - started
+                    span.set(ttft_ms=round(ttft * 1000, 3))
+                parts.append(delta)
+                yield delta
+            result["completed"] = True
+            return
+        except Exception as e:
+            span.set(chunks=len(parts))
+            if ttft is not None:
+                _attempt_failed(span, permit, e, time.monotonic() - started, messages, "".join(parts))
+                return
+            _attempt_failed(span, permit, e, time.monotonic() - started)
+            continue
+        finally:
+            if span.end_ns is None:
+                if ttft is not None:
+                    model_router.record_success(model, ttft)
+                span.set(chunks=len(parts))
+                _attempt_succeeded(span, permit, messages, "".join(parts))
+
+    yield FAILURE_MESSAGE
+
+def _build_tool_messages(tool_name, question, general_chat=False, conversation_history=None, tool_prompt=None, related_tools=None):
+    """בניית ההודעות למודל עבור שאלה על כלי AI או שיחה כללית (tool_prompt נדרש כשזו לא שיחה כללית).
+    בשיחה כללית related_tools הם הכלים מהקטלוג שנמצאו רלוונטיים לשאלה"""
+    if general_chat:
+        # הנחיה קבועה - הכלים הרלוונטיים, שמשתנים משאלה לשאלה, מצורפים לשאלה עצמה
+        system_prompt = GENERAL_SYSTEM_PROMPT
+        user_prompt = general_user_prompt(question, related_tools)
+    else:
+        system_prompt = tool_system_prompt(tool_name, tool_prompt)
+        user_prompt = tool_user_prompt(tool_name, question)
+
+    # הוספת השאלה הנוכחית, עם היסטוריית השיחה שנכנסת בתקציב הטוקנים (הודעות ישנות מסוכמות)
+    messages = fit_messages(system_prompt, conversation_history, user_prompt, GROQ_MODELS)
+    prompt_stats.record(messages)
+    return messages
+
+def _build_multiple_tools_messages(tools, question, conversation_history=None):
+    """בניית ההודעות למודל עבור שאלה על מספר כלי AI"""
+    # כשנבחרו כלים רבים, רק הרלוונטיים ביותר לשאלה נכנסים בפירוט - והם מצורפים לשאלה,
+    # כי הבחירה משתנה משאלה לשאלה ואסור לה לשנות את תחילת הבקשה
+    selected_tools_info = None
+    if len(tools) > CATALOG_SEARCH_TOP_K:
+        selected_tools_info = catalog_search.search(question, k=CATALOG_SEARCH_TOP_K, tool_names=tools)
+    if selected_tools_info:
+        system_prompt = multiple_tools_system_prompt(tools, include_details=False)
+    else:
+        # שאלה שלא מתייחסת לכלי מסוים (למשל "השווה ביניהם") - כל הכלים נכנסים להנחיית המערכת
+        system_prompt = multiple_tools_system_prompt(tools)
+
+    # הוספת השאלה הנוכחית, עם היסטוריית השיחה שנכנסת בתקציב הטוקנים (הודעות ישנות מסוכמות)
+    user_prompt = multiple_tools_user_prompt(question, selected_tools_info)
+    messages = fit_messages(system_prompt, conversation_history, user_prompt, GROQ_MODELS)
+    prompt_stats.record(messages)
+    return messages
+
+def _response_cache_key(mode, tools, question, conversation_history, temperature, tool_prompts=None):
+    """מפתח מטמון התשובות לבקשה, או None כשהמטמון כבוי. רשומות הכלים מהקטלוג וההנחיות שלהם
+    הם חלק מהמפתח, כך ששינוי ב-tools.json או ב-tools_prompts.json מבטל את התשובות השמורות"""
+    if not response_cache.enabled:
+        return None
+    sources = {"tools": find_tools_in_local_data(sorted(tools)), "prompts": tool_prompts}
+    return response_cache.make_key(mode, tools, question, conversation_history, GROQ_MODELS, temperature, sources)
+
+def _tool_request(tool_name, question, general_chat, conversation_history, tool_prompt):
+    """ההודעות ומפתח המטמון של שאלה על כלי יחיד או בשיחה כללית"""
+    with tracer.span("request.build", mode="general" if general_chat else "tool") as span:
+        if general_chat:
+            with tracer.span("catalog.search"):
+                related_tools = catalog_search.search(question)
+            mode, scope = "general", [tool.get("name") for tool in related_tools]
+        else:
+            related_tools = None
+            mode, scope = "tool", [tool_name]
+        messages = _build_tool_messages(tool_name, question, general_chat, conversation_history, tool_prompt, related_tools)
+        cache_key = _response_cache_key(mode, scope, question, conversation_history, 0.7, tool_prompt)
+        span.set(tools=scope, messages=len(messages), prompt_tokens_estimate=estimate_messages_tokens(messages))
+        return messages, cache_key
+
+def _multiple_tools_request(tools, question, conversation_history):
+    """ההודעות ומפתח המטמון של שאלה על מספר כלים"""
+    with tracer.span("request.build", mode="multiple", tools=list(tools)) as span:
+        messages = _build_multiple_tools_messages(tools, question, conversation_history)
+        cache_key = _response_cache_key("multiple", tools, question, conversation_history, 0.1)
+        span.set(messages=len(messages), prompt_tokens_estimate=estimate_messages_tokens(messages))
+        return messages, cache_key
+
+def is_comparison_question(question):
+    """האם השאלה מבקשת השוואה בין כלים ("מה ההבדל", "מה עדיף", "compare")"""
+    return any(
+        variant in COMPARISON_KEYWORDS
+        for token in tokenize(question) for variant in prefix_variants(token)
+    )
+
+def _use_comparison(tools, question, comparison=None):
+    """האם לענות על שאלה על מספר כלים בהשוואה מקבילית במקום בבקשה אחת: כשהקורא ביקש זאת
+    במפורש, או כשנבחרו מספיק כלים והשאלה מבקשת השוואה. שאלה אחרת (למשל "איך מתחילים?")
+    נענית בבקשה הרגילה גם כשנבחרו כלים רבים"""
+    if comparison is not None:
+        return comparison
+    return (
+        COMPARISON_MIN_TOOLS > 0 and len(set(tools)) >= COMPARISON_MIN_TOOLS
+        and is_comparison_question(question)
+    )
+
+async def _comparison_tool_answer(tool_name, question, conversation_history=None):
+    """שלב המיפוי בהשוואה: תשובה קצרה על כלי אחד, עם ההנחיה השמורה של הכלי. על כלי שלא
+    התקבלה עליו תשובה, שלב הסיכום מקבל את פרטיו מהקטלוג"""
+    with tracer.span("comparison.tool", tool=tool_name) as span:
+        tool_prompt = await get_or_create_tool_prompt_async(tool_name)
+        messages, cache_key = await asyncio.to_thread(
+            _comparison_tool_request, tool_name, question, conversation_history, tool_prompt,
+        )
+        answer = await _cache_lookup_async(cache_key)
+        if answer is not None:
+            return answer
+        try:
+            answer = await _chat_completion_async(messages, temperature=0.1, max_tokens=COMPARISON_MAP_MAX_TOKENS)
+        except RateLimitExceeded:
+            answer = None
+        if answer is None:
+            span.set(fallback=True)
+            tool_info = await asyncio.to_thread(find_tool_in_local_data, tool_name)
+            return format_tool_details(tool_info) if tool_info else "אין מידע על הכלי"
+        await _cache_put_async(cache_key, answer)
+        return answer
+
+def _comparison_tool_request(tool_name, question, conversation_history, tool_prompt):
+    """ההודעות ומפתח המטמון של השאלה הקצרה על כלי אחד בהשוואה"""
+    # אותה הנחיית מערכת כמו בשאלה על הכלי לבד, כך שהיא נבנית פעם אחת וחולקת את התחילית.
+    # ההודעות האחרונות בשיחה נשלחות גם הן, כדי ששאלת המשך תובן בהקשר שלה
+    history = (conversation_history or [])[-COMPARISON_MAP_HISTORY_MESSAGES:]
+    messages = fit_messages(
+        tool_system_prompt(tool_name, tool_prompt), history,
+        comparison_map_user_prompt(tool_name, question), GROQ_MODELS,
+    )
+    prompt_stats.record(messages)
+    cache_key = _response_cache_key("comparison.tool", [tool_name], question, history, 0.1, tool_prompt)
+    return messages, cache_key
+
+async def _comparison_request_async(tools, question, conversation_history):
+    """השוואה בין כלים רבים: שאלה קצרה על כל כלי, כולן במקביל - כך שזמן ההמתנה תלוי בכלי
+    האיטי ביותר ולא בגודל הבקשה. מחזיר את ההודעות ומפתח המטמון של שלב הסיכום"""
+    tools = list(dict.fromkeys(tools))
+    with tracer.span("comparison.map", tools=tools):
+        answers = await asyncio.gather(*(
+            _comparison_tool_answer(tool_name, question, conversation_history) for tool_name in tools
+        ))
+    # בניית הבקשה קוראת מהקטלוג בדיסק, ולכן רצה בתהליכון נפרד ולא על לולאת האירועים
+    return await asyncio.to_thread(_comparison_reduce_request, tools, question, conversation_history, dict(zip(tools, answers)))
+
+def _comparison_reduce_request(tools, question, conversation_history, tool_answers):
+    """ההודעות ומפתח המטמון של שלב הסיכום בהשוואה"""
+    with tracer.span("request.build", mode="comparison", tools=tools) as span:
+        user_prompt = comparison_reduce_user_prompt(question, tool_answers)
+        messages = fit_messages(COMPARISON_REDUCE_SYSTEM_PROMPT, conversation_history, user_prompt, GROQ_MODELS)
+        prompt_stats.record(messages)
+        # התשובות על הכלים הן חלק מהמפתח, כך ששינוי בהנחיה של כלי מבטל גם את טבלת ההשוואה
+        cache_key = _response_cache_key("comparison", tools, question, conversation_history, 0.1, tool_answers)
+        span.set(messages=len(messages), prompt_tokens_estimate=estimate_messages_tokens(messages))
+        return messages, cache_key
+
+def _comparison_request(tools, question, conversation_history):
+    """גרסה סינכרונית של _comparison_request_async"""
+    return run_async(_comparison_request_async(tools, question, conversation_history))
+
+def _cache_lookup(cache_key):
+    """תשובה מהמטמון, או None"""
+    if cache_key is None:
+        return None
+    with tracer.span("response_cache.get") as span:
+        answer = response_cache.get(cache_key)
+        span.set(hit=answer is not None)
+        return answer
+
+async def _cache_lookup_async(cache_key):
+    """גרסה אסינכרונית של _cache_lookup - הקריאה מ-SQLite רצה בתהליכון נפרד"""
+    if cache_key is None:
+        return None
+    return await asyncio.to_thread(_cache_lookup, cache_key)
+
+async def _cache_put_async(cache_key, answer):
+    """שמירת תשובה במטמון בתהליכון נפרד, כדי שכתיבה איטית לא תעכב את לולאת האירועים"""
+    if cache_key is not None:
+        await asyncio.to_thread(response_cache.put, cache_key, answer)
+
+def _cached_completion(cache_key, messages, temperature):
+    """תשובה מהמטמון אם קיימת, אחרת מהמודל - ותשובה מוצלחת נשמרת במטמון"""
+    answer = _cache_lookup(cache_key)
+    if answer is None:
+        try:
+            answer = _chat_completion(messages, temperature)
+        except RateLimitExceeded as e:
+            return busy_message(e.retry_after)
+        if answer is None:
+            return FAILURE_MESSAGE
+        response_cache.put(cache_key, answer)
+    return answer
+
+async def _cached_completion_async(cache_key, messages, temperature):
+    """גרסה אסינכרונית של _cached_completion"""
+    answer = await _cache_lookup_async(cache_key)
+    if answer is None:
+        try:
+            answer = await _chat_completion_async(messages, temperature)
+        except RateLimitExceeded as e:
+            return busy_message(e.retry_after)
+        if answer is None:
+            return FAILURE_MESSAGE
+        await _cache_put_async(cache_key, answer)
+    return answer
+
+def _collect(stream, parts):
+    """העברת קטעי ההזרמה הלאה תוך שמירתם ברשימה, והחזרת ערך ההחזרה של המחולל המקורי"""
+    while True:
+        try:
+            delta = next(stream)
+        except StopIteration as stop:
+            return stop.value
+        parts.append(delta)
+        yield delta
+
+def _cached_completion_stream(cache_key, messages, temperature):
+    """הזרמת תשובה עם מטמון - תשובה שמורה מוחזרת כקטע אחד, ותשובה שהוזרמה במלואה נשמרת"""
+    answer = _cache_lookup(cache_key)
+    if answer is not None:
+        yield answer
+        return
+    parts = []
+    try:
+        completed = yield from _collect(_chat_completion_stream(messages, temperature), parts)
+    except RateLimitExceeded as e:
+        # הבקשה נדחתה עוד לפני שנשלחה, כך שלא הוזרם למשתמש דבר
+        yield busy_message(e.retry_after)
+        return
+    if completed:
+        response_cache.put(cache_key, "".join(parts))
+
+async def _cached_completion_stream_async(cache_key, messages, temperature):
+    """גרסה אסינכרונית של _cached_completion_stream"""
+    answer = await _cache_lookup_async(cache_key)
+    if answer is not None:
+        yield answer
+        return
+    parts = []
+    result = {}
+    try:
+        async for delta in _chat_completion_stream_async(messages, temperature, result):
+            parts.append(delta)
+            yield delta
+    except RateLimitExceeded as e:
+        yield busy_message(e.retry_after)
+        return
+    if result["completed"]:
+        await _cache_put_async(cache_key, "".join(parts))
+
+# הסרנו את הדקורטור lru_cache כי אנחנו עכשיו מעבירים רשימה
+def ask_about_tool(tool_name, question, general_chat=False, conversation_history=None):
+    """שאילת שאלה על כלי AI או שיחה כללית, עם תמיכה בהיסטוריית שיחה"""
+    tool_prompt = None if general_chat else get_or_create_tool_prompt(tool_name)
+    messages, cache_key = _tool_request(tool_name, question, general_chat, conversation_history, tool_prompt)
+    return _cached_completion(cache_key, messages, temperature=0.7)
+
+async def ask_about_tool_async(tool_name, question, general_chat=False, conversation_history=None):
+    """גרסה אסינכרונית של ask_about_tool"""
+    tool_prompt = None if general_chat else await get_or_create_tool_prompt_async(tool_name)
+    messages, cache_key = await asyncio.to_thread(_tool_request, tool_name, question, general_chat, conversation_history, tool_prompt)
+    return await _cached_completion_async(cache_key, messages, temperature=0.7)
+
+def stream_about_tool(tool_name, question, general_chat=False, conversation_history=None):
+    """כמו ask_about_tool, אבל מחזיר את התשובה בהזרמה - קטע אחר קטע כפי שהוא מגיע מהמודל"""
+    tool_prompt = None if general_chat else get_or_create_tool_prompt(tool_name)
+    messages, cache_key = _tool_request(tool_name, question, general_chat, conversation_history, tool_prompt)
+    yield from _cached_completion_stream(cache_key, messages, temperature=0.7)
+
+async def stream_about_tool_async(tool_name, question, general_chat=False, conversation_history=None):
+    """גרסה אסינכרונית של stream_about_tool (מחולל אסינכרוני)"""
+    tool_prompt = None if general_chat else await get_or_create_tool_prompt_async(tool_name)
+    # בניית הבקשה (קטלוג ב-SQLite וחיפוש BM25) רצה בתהליכון נפרד, ולא על לולאת האירועים
+    messages, cache_key = await asyncio.to_thread(_tool_request, tool_name, question, general_chat, conversation_history, tool_prompt)
+    async for delta in _cached_completion_stream_async(cache_key, messages, temperature=0.7):
+        yield delta
+
+def ask_about_multiple_tools(tools, question, conversation_history=None, comparison=None):
+    """שאילת שאלה על מספר כלי AI, עם תמיכה בהיסטוריית שיחה. שאלת השוואה על COMPARISON_MIN_TOOLS
+    כלים או יותר נענית בהשוואה מקבילית: שאלה קצרה על כל כלי, ושלב סיכום לטבלת השוואה.
+    comparison=True או False קובע את המצב במפורש, במקום לפי השאלה"""
+    if _use_comparison(tools, question, comparison):
+        messages, cache_key = _comparison_request(tools, question, conversation_history)
+    else:
+        messages, cache_key = _multiple_tools_request(tools, question, conversation_history)
+    return _cached_completion(cache_key, messages, temperature=0.1)
+
+async def ask_about_multiple_tools_async(tools, question, conversation_history=None, comparison=None):
+    """גרסה אסינכרונית של ask_about_multiple_tools"""
+    if _use_comparison(tools, question, comparison):
+        messages, cache_key = await _comparison_request_async(tools, question, conversation_history)
+    else:
+        messages, cache_key = await asyncio.to_thread(_multiple_tools_request, tools, question, conversation_history)
+    return await _cached_completion_async(cache_key, messages, temperature=0.1)
+
+def stream_about_multiple_tools(tools, question, conversation_history=None, comparison=None):
+    """כמו ask_about_multiple_tools, אבל מחזיר את התשובה בהזרמה. בהשוואה מקבילית מוזרם שלב הסיכום"""
+    if _use_comparison(tools, question, comparison):
+        messages, cache_key = _comparison_request(tools, question, conversation_history)
+    else:
+        messages, cache_key = _multiple_tools_request(tools, question, conversation_history)
+    yield from _cached_completion_stream(cache_key, messages, temperature=0.1)
+
+async def stream_about_multiple_tools_async(tools, question, conversation_history=None, comparison=None):
+    """גרסה אסינכרונית של stream_about_multiple_tools (מחולל אסינכרוני)"""
+    if _use_comparison(tools, question, comparison):
+        messages, cache_key = await _comparison_request_async(tools, question, conversation_history)
+    else:
+        messages, cache_key = await asyncio.to_thread(_multiple_tools_request, tools, question, conversation_history)
+    async for delta in _cached_completion_stream_async(cache_key, messages, temperature=0.1):
+        yield delta
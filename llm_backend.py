@@ -0,0 +1,234 @@
+import json
+import asyncio
+import threading
+import weakref
+
+
+class LLMBackend:
+    """ממשק לספק מודל השפה. כל מימוש מחזיר טקסט (או קטעי טקסט בהזרמה) וזורק חריגה בכישלון.
+    לחריגות של שגיאות HTTP יש response עם status_code וכותרות, כך שהנתב מזהה 429 ו-retry-after"""
+
+    name = "base"
+
+    def complete(self, model, messages, temperature, max_tokens):
+        raise NotImplementedError
+
+    async def complete_async(self, model, messages, temperature, max_tokens):
+        raise NotImplementedError
+
+    def stream(self, model, messages, temperature, max_tokens):
+        """מחולל של קטעי הטקסט של התשובה, לפי הסדר שבו הם מגיעים מהמודל"""
+        raise NotImplementedError
+
+    def stream_async(self, model, messages, temperature, max_tokens):
+        """גרסה אסינכרונית של stream: מחולל אסינכרוני על גבי הלקוח האסינכרוני"""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """יצירה מראש של הלקוח הסינכרוני (וטעינת הספריות שלו), מחוץ לבקשה הראשונה"""
+
+    async def warm_up_async(self):
+        """יצירה מראש של הלקוח האסינכרוני של לולאת האירועים הנוכחית"""
+
+
+def _limits(max_connections, max_keepalive_connections):
+    # httpx נטען רק כשנוצר הלקוח הראשון, ולא בייבוא המודול
+    import httpx
+
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+
+
+class _PerLoopClients:
+    """לקוח אסינכרוני אחד לכל לולאת אירועים - מאגר החיבורים של httpx קשור ללולאה שבה נוצר"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self.factory()
+        return client
+
+
+class GroqBackend(LLMBackend):
+    """מימוש מעל ספריית groq. הלקוחות נוצרים רק בשימוש הראשון, כך שייבוא המודול לא נכשל בלי מפתח"""
+
+    name = "groq"
+
+    def __init__(self, api_key, base_url=None, timeout=60.0, max_retries=0, max_connections=20, max_keepalive_connections=10):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limits = (max_connections, max_keepalive_connections)
+        self._client = None
+        self._lock = threading.Lock()
+        self._async_clients = _PerLoopClients(self._create_async_client)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import groq
+
+                    self._client = groq.Groq(
+                        api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=self.max_retries,
+                    )
+        return self._client
+
+    def _create_async_client(self):
+        import groq
+
+        http_client = groq.DefaultAsyncHttpxClient(limits=_limits(*self.limits))
+        return groq.AsyncGroq(
+            api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=self.max_retries,
+            http_client=http_client,
+        )
+
+    def complete(self, model, messages, temperature, max_tokens):
+        response = self.client.chat.completions.create(
+            messages=messages, model=model, temperature=temperature, max_tokens=max_tokens, stream=False,
+        )
+        return response.choices[0].message.content
+
+    def warm_up(self):
+        self.client
+
+    async def warm_up_async(self):
+        self._async_clients.get()
+
+    async def complete_async(self, model, messages, temperature, max_tokens):
+        response = await self._async_clients.get().chat.completions.create(
+            messages=messages, model=model, temperature=temperature, max_tokens=max_tokens, stream=False,
+        )
+        return response.choices[0].message.content
+
+    def stream(self, model, messages, temperature, max_tokens):
+        stream = self.client.chat.completions.create(
+            messages=messages, model=model, temperature=temperature, max_tokens=max_tokens, stream=True,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def stream_async(self, model, messages, temperature, max_tokens):
+        stream = await self._async_clients.get().chat.completions.create(
+            messages=messages, model=model, temperature=temperature, max_tokens=max_tokens, stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """מימוש מעל כל שרת שתואם ל-API של OpenAI (למשל השרת המדומה mock_llm_server.py), ישירות עם httpx"""
+
+    name = "openai"
+
+    def __init__(self, base_url, api_key=None, timeout=60.0, max_connections=20, max_keepalive_connections=10):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.timeout = timeout
+        self.limits = (max_connections, max_keepalive_connections)
+        self._client = None
+        self._lock = threading.Lock()
+        self._async_clients = _PerLoopClients(self._create_async_client)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+
+                    self._client = httpx.Client(headers=self.headers, timeout=self.timeout, limits=_limits(*self.limits))
+        return self._client
+
+    def _create_async_client(self):
+        import httpx
+
+        return httpx.AsyncClient(headers=self.headers, timeout=self.timeout, limits=_limits(*self.limits))
+
+    def warm_up(self):
+        self.client
+
+    async def warm_up_async(self):
+        self._async_clients.get()
+
+    @staticmethod
+    def _body(model, messages, temperature, max_tokens, stream):
+        return {
+            "model": model, "messages": messages, "temperature": temperature,
+            "max_tokens": max_tokens, "stream": stream,
+        }
+
+    def complete(self, model, messages, temperature, max_tokens):
+        response = self.client.post(self.url, json=self._body(model, messages, temperature, max_tokens, False))
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def complete_async(self, model, messages, temperature, max_tokens):
+        client = self._async_clients.get()
+        response = await client.post(self.url, json=self._body(model, messages, temperature, max_tokens, False))
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    @staticmethod
+    def _delta(line):
+        """הטקסט שבשורת SSE אחת של ההזרמה: None לשורה בלי טקסט, ו-False בסוף ההזרמה"""
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return False
+        choices = json.loads(data).get("choices") or []
+        return choices[0].get("delta", {}).get("content") if choices else None
+
+    def stream(self, model, messages, temperature, max_tokens):
+        body = self._body(model, messages, temperature, max_tokens, True)
+        with self.client.stream("POST", self.url, json=body) as response:
+            if response.is_error:
+                response.read()
+                response.raise_for_status()
+            for line in response.iter_lines():
+                delta = self._delta(line)
+                if delta is False:
+                    return
+                if delta:
+                    yield delta
+
+    async def stream_async(self, model, messages, temperature, max_tokens):
+        body = self._body(model, messages, temperature, max_tokens, True)
+        async with self._async_clients.get().stream("POST", self.url, json=body) as response:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                delta = self._delta(line)
+                if delta is False:
+                    return
+                if delta:
+                    yield delta
+
+
+def create_llm_backend(kind, api_key=None, base_url=None, timeout=60.0, max_retries=0,
+                       max_connections=20, max_keepalive_connections=10):
+    """יצירת המימוש לפי שמו: "groq" (ברירת המחדל) או "openai" לשרת תואם OpenAI בכתובת base_url"""
+    limits = {"max_connections": max_connections, "max_keepalive_connections": max_keepalive_connections}
+    if kind == "openai":
+        if not base_url:
+            raise ValueError("LLM_BACKEND=openai דורש LLM_BASE_URL")
+        return OpenAICompatibleBackend(base_url, api_key=api_key, timeout=timeout, **limits)
+    if kind != "groq":
+        raise ValueError(f"ספק מודל לא מוכר: {kind}")
+    return GroqBackend(api_key, base_url=base_url, timeout=timeout, max_retries=max_retries, **limits)
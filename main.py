@@ -1,18 +1,11 @@
 import streamlit as st
 import random
-import time
-import json
 import os
-import requests
-from datetime import datetime, timedelta
-import pathlib
+import time
 from dotenv import load_dotenv
 
-# טעינת מודול הלקוח של Groq
-from groq_client import ask_about_tool, ask_about_multiple_tools
-
-# הוספת CSS מותאם אישית לתמיכה ב-RTL
-st.markdown("""
+# CSS מותאם אישית לתמיכה ב-RTL ולהסתרת הכותרת והתחתית של Streamlit, נשלח בקריאה אחת בכל הרצה
+PAGE_STYLE = """
 <style>
     body {
         direction: rtl;
@@ -29,128 +22,69 @@ st.markdown("""
         text-align: right;
         direction: rtl;
     }
+    #MainMenu {visibility: hidden;}
+    footer {visibility: hidden;}
+    header {visibility: hidden;}
+    .block-container {
+        padding-top: 0rem !important;
+        padding-bottom: 0rem !important;
+    }
+    .stChatMessage, .stChatInput {
+        margin-bottom: 0rem !important;
+    }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(PAGE_STYLE, unsafe_allow_html=True)
 
-# טעינת משתני סביבה מקובץ .env
+# טעינת משתני סביבה מקובץ .env - לפני ייבוא המודולים, שקוראים את ההגדרות שלהם בזמן הייבוא
 load_dotenv()
 
-# קביעת מספר ההודעות המקסימלי לשמירה בהיסטוריה
-MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", 5))
-
-# יצירת ספריית data אם היא לא קיימת
-DATA_DIR = pathlib.Path("data")
-DATA_DIR.mkdir(exist_ok=True)
-
-TOOLS_FILE = DATA_DIR / "tools.json"
-CONFIG_FILE = DATA_DIR / "config.json"
-
-# קריאת כתובת ה-URL מקובץ .env
-AI_TOOLS_URL = os.getenv("AI_TOOLS_URL", "https://thewitcher-sagi-ai-tools.static.hf.space/tools.json")
-
-def hide_streamlit_header_footer():
-    hide_st_style = """
-     <style>
-        #MainMenu {visibility: hidden;}
-        footer {visibility: hidden;}
-        header {visibility: hidden;}
-        .block-container {
-            padding-top: 0rem !important;
-            padding-bottom: 0rem !important;
-        }
-        .stChatMessage, .stChatInput {
-            margin-bottom: 0rem !important;
-        }
-    </style>
-    """
-    st.markdown(hide_st_style, unsafe_allow_html=True)
-
-# פונקציה לבדיקה האם הקובץ התעדכן היום
-def is_file_updated_today():
-    if not CONFIG_FILE.exists():
-        return False
-    
-    try:
-        with open(CONFIG_FILE, "r") as f:
-            config = json.load(f)
-        
-        last_update_str = config.get("last_update")
-        if not last_update_str:
-            return False
-        
-        last_update = datetime.strptime(last_update_str, "%Y-%m-%d")
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        return last_update == today
-    except Exception as e:
-        st.error(f"שגיאה בקריאת קובץ התצורה: {e}")
-        return False
+# המודולים של האפליקציה נטענים רק אחרי שהסגנון נשלח לדפדפן. כאן רק המודולים הקלים שכל הרצה
+# צריכה - הלקוח של המודל, הקטלוג והאינדקסים נטענים בפונקציות ובענפים שמשתמשים בהם
+from file_utils import DATA_DIR
+from transcript_store import Transcript, TRANSCRIPT_PAGE_SIZE
+from warm_up import warm_up_in_background
 
-# פונקציה להורדת קובץ הכלים
-def download_tools_file():
-    try:
-        response = requests.get(AI_TOOLS_URL)
-        response.raise_for_status()
-        
-        # שמירת תוכן הקובץ
-        with open(TOOLS_FILE, "wb") as f:
-            f.write(response.content)
-        
-        # עדכון הגדרות
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        config = {"last_update": today.strftime("%Y-%m-%d")}
-        
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(config, f)
-        
-        return True
-    except Exception as e:
-        st.error(f"שגיאה בהורדת קובץ הכלים: {e}")
-        return False
+# יצירת הלקוחות של המודל ובניית האינדקסים ברקע, פעם אחת לכל תהליך - כך שהדף מוצג מיד
+# והשאלה הראשונה לא משלמת על ייבוא הספריות ועל יצירת החיבורים
+warm_up_in_background()
+
+# הצגת חלונית דיבאג עם פירוט הזמנים של הבקשה האחרונה (אפשר גם עם ?debug=1 בכתובת)
+DEBUG_PANEL = os.getenv("DEBUG_PANEL", "false").lower() in ("1", "true", "yes")
+
+# יצירת ספריית הנתונים אם היא לא קיימת
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# שמות הכלים ואפשרויות הבחירה נשמרים במטמון של Streamlit לפי גרסת הקטלוג,
+# כך שהרצה חוזרת של הדף (למשל אחרי הודעה חדשה) לא קוראת קבצים ולא בונה אותם מחדש
+@st.cache_data(show_spinner=False)
+def get_tool_names(catalog_version):
+    """שמות הכלים בגרסה מסוימת של הקטלוג"""
+    from tools_catalog import tools_catalog
+    return tools_catalog.names()
+
+@st.cache_data(show_spinner=False)
+def get_tool_options(catalog_version):
+    """אפשרויות הבחירה של st.multiselect בגרסה מסוימת של הקטלוג"""
+    return ["שיחה כללית"] + get_tool_names(catalog_version)
 
 # פונקציה לטעינת רשימת הכלים
 def load_tools():
+    """גרסת הקטלוג ושמות הכלים מהקטלוג שבדיסק. הרענון מהשרת רץ ברקע ולא מעכב את הצגת הדף"""
+    from tools_catalog import tools_catalog
+    from catalog_refresher import catalog_refresher
     try:
-        if not TOOLS_FILE.exists() or not is_file_updated_today():
-            if not download_tools_file():
-                if not TOOLS_FILE.exists():
-                    return []
-        
-        with open(TOOLS_FILE, "r", encoding="utf-8") as f:
-            tools_data = json.load(f)
-        
-        # החזרת רשימת שמות הכלים
-        tools = []
-        if isinstance(tools_data, list):
-            tools = [tool.get("name", "") for tool in tools_data if tool.get("name")]
-        elif isinstance(tools_data, dict) and "tools" in tools_data:
-            tools = [tool.get("name", "") for tool in tools_data["tools"] if tool.get("name")]
-        
-        return tools
+        if not catalog_refresher.ensure_catalog():
+            st.error(f"שגיאה בהורדת קובץ הכלים: {catalog_refresher.last_error}")
+            return None, []
+        catalog_version = tools_catalog.version
+        return catalog_version, get_tool_names(catalog_version)
     except Exception as e:
         st.error(f"שגיאה בטעינת רשימת הכלים: {e}")
-        return []
+        return None, []
 
-# פונקציה להכנת היסטוריית שיחה לשליחה למודל השפה
-def prepare_conversation_history(messages, max_history=MAX_HISTORY_MESSAGES):
-    """הכנת היסטוריית שיחה לשליחה למודל השפה"""
-    if not messages or len(messages) < 2:  # אם אין מספיק הודעות להיסטוריה
-        return []
-    
-    # בחירת ההודעות האחרונות (עד למקסימום שהוגדר)
-    recent_messages = messages[-max_history*2:] if len(messages) > max_history*2 else messages
-    
-    # המרת הודעות לפורמט המתאים ל-API
-    conversation_history = []
-    for msg in recent_messages:
-        if msg["role"] in ["user", "assistant"]:
-            conversation_history.append({"role": msg["role"], "content": msg["content"]})
-    
-    return conversation_history
-
-hide_streamlit_header_footer()        
 # טעינת רשימת הכלים
-tools = load_tools()
+catalog_version, tools = load_tools()
 
 # הצגת מידע על הכלים
 # if tools:
@@ -159,9 +93,16 @@ tools = load_tools()
 #     st.warning("לא נמצאו כלים זמינים. בדוק את החיבור לאינטרנט ונסה שוב.")
 
 # יצירת בחירת כלים מרובים
-tool_options = ["שיחה כללית"] + tools
+tool_options = get_tool_options(catalog_version) if tools else ["שיחה כללית"]
 selected_tools = st.multiselect("בחר כלים לשיחה (ניתן לבחור יותר מאחד):", tool_options, default=["שיחה כללית"])
 
+# טעינה מוקדמת ברקע של ההנחיות לכלים שנבחרו זה עתה, כך שהשאלה הראשונה לא ממתינה ליצירתן
+chosen_tools = [tool for tool in selected_tools if tool != "שיחה כללית"]
+if chosen_tools != st.session_state.get("prefetched_tools", []):
+    from prompt_prefetcher import prompt_prefetcher
+    prompt_prefetcher.update(st.session_state.get("prefetched_tools", []), chosen_tools)
+    st.session_state.prefetched_tools = chosen_tools
+
 if "שיחה כללית" in selected_tools:
     if len(selected_tools) > 1:
         st.info("מצב שיחה כללית וגם על כלים ספציפיים")
@@ -173,65 +114,138 @@ else:
     tools_str = ", ".join(selected_tools)
     st.info(f"מצב שיחה על הכלים: {tools_str}")
 
-# אתחול היסטוריית צ'אט
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# אתחול היסטוריית צ'אט - ההודעות האחרונות בזיכרון, והישנות יותר בקובץ של הסשן בדיסק
+if "transcript" not in st.session_state:
+    st.session_state.transcript = Transcript()
+    st.session_state.visible_messages = TRANSCRIPT_PAGE_SIZE
+transcript = st.session_state.transcript
 
 # איתחול הודעת פתיחה לפי הכלים שנבחרו
-if not st.session_state.messages:
+if not len(transcript):
     if "שיחה כללית" in selected_tools and len(selected_tools) == 1:
-        st.session_state.messages = [{"role": "assistant", "content": "הי,  \nשמי ברק הראל ואני העוזר האישי של שגיא בר און.  \nאשמח לענות על שאלות בנושא ארגז כלי בינה מלאכותית ששגיא המליץ, שימושים שלהם, והשוואות ביניהם. אז במה אוכל לעזור לך היום? 👋"}]
+        transcript.append({"role": "assistant", "content": "הי,  \nשמי ברק הראל ואני העוזר האישי של שגיא בר און.  \nאשמח לענות על שאלות בנושא ארגז כלי בינה מלאכותית ששגיא המליץ, שימושים שלהם, והשוואות ביניהם. אז במה אוכל לעזור לך היום? 👋"})
     elif "שיחה כללית" in selected_tools:
         tools_str = ", ".join([tool for tool in selected_tools if tool != "שיחה כללית"])
-        st.session_state.messages = [{"role": "assistant", "content": f"ברוך הבא! אשמח לשוחח על נושאים כלליים בתחום ה-AI וגם על הכלים הספציפיים: {tools_str}. אתה יכול לשאול על יכולות, הבדלים בין כלים, מקרי שימוש או כל נושא אחר 👋"}]
+        transcript.append({"role": "assistant", "content": f"ברוך הבא! אשמח לשוחח על נושאים כלליים בתחום ה-AI וגם על הכלים הספציפיים: {tools_str}. אתה יכול לשאול על יכולות, הבדלים בין כלים, מקרי שימוש או כל נושא אחר 👋"})
     else:
         tools_str = ", ".join(selected_tools)
-        st.session_state.messages = [{"role": "assistant", "content": f"ברוך הבא לשיחה על הכלים: {tools_str}! אשמח לענות על שאלות לגבי יכולות, מגבלות, יתרונות וחסרונות של כלים אלו 👋"}]
+        transcript.append({"role": "assistant", "content": f"ברוך הבא לשיחה על הכלים: {tools_str}! אשמח לענות על שאלות לגבי יכולות, מגבלות, יתרונות וחסרונות של כלים אלו 👋"})
+
+def show_earlier_messages():
+    """הרחבת החלון המוצג בעמוד נוסף של הודעות קודמות"""
+    st.session_state.visible_messages += TRANSCRIPT_PAGE_SIZE
 
-# הצגת הודעות צ'אט מההיסטוריה
-for message in st.session_state.messages:
+# הצגת ההודעות האחרונות בלבד, כך שזמן ההרצה החוזרת של הדף לא גדל עם אורך השיחה
+hidden_messages = len(transcript) - st.session_state.visible_messages
+if hidden_messages > 0:
+    st.button(f"⬆️ הצגת הודעות קודמות ({hidden_messages})", on_click=show_earlier_messages)
+for message in transcript.window(st.session_state.visible_messages):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
 # קבלת קלט מהמשתמש
 if prompt := st.chat_input("הקלד את שאלתך כאן..."):
-    # הוספת הודעת משתמש להיסטוריית הצ'אט
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    # הלקוח של המודל נטען רק כשנשאלת שאלה (ובדרך כלל כבר נטען ברקע בחימום)
+    from groq_client import stream_about_tool, stream_about_multiple_tools, estimated_wait
+    from tool_matcher import tool_matcher
+    from conversation_history import prepare_conversation_history
+    from tracing import tracer
+
+    # הוספת הודעת משתמש להיסטוריית הצ'אט, וחזרה לחלון של ההודעות האחרונות
+    transcript.append({"role": "user", "content": prompt})
+    st.session_state.visible_messages = TRANSCRIPT_PAGE_SIZE
     # הצגת הודעת המשתמש במיכל הצ'אט
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # הכנת היסטוריית השיחה לשליחה למודל
-    conversation_history = prepare_conversation_history(st.session_state.messages[:-1])  # לא כולל השאלה הנוכחית
-
-    # הצגת תגובת הבוט במיכל הצ'אט
-    with st.chat_message("assistant"):
-        message_placeholder = st.empty()
-        full_response = ""
+    # span לכל הבקשה - כל השלבים (קטלוג, הנחיות, ניסיונות מול המודלים, הצגה) נרשמים תחתיו
+    request_started = time.perf_counter()
+    with tracer.span("chat.request", selected_tools=selected_tools) as request_span:
+        # הכנת היסטוריית השיחה לשליחה למודל
+        conversation_history = prepare_conversation_history(transcript.recent()[:-1])  # לא כולל השאלה הנוכחית
+
+        # בשיחה כללית בלבד - זיהוי כלים מהקטלוג שמוזכרים בשאלה, כדי לענות עם המידע עליהם
+        mentioned_tools = []
+        if "שיחה כללית" in selected_tools and len(selected_tools) == 1:
+            mentioned_tools = tool_matcher.find_tools(prompt)
+            request_span.set(mentioned_tools=mentioned_tools)
+
+        # הצגת תגובת הבוט במיכל הצ'אט
+        with st.chat_message("assistant"):
+            if mentioned_tools:
+                st.caption("זוהו כלים בשאלה: " + ", ".join(mentioned_tools))
+            message_placeholder = st.empty()
         
-        # קבלת תשובה באמצעות Groq API
-        with st.spinner('מחפש תשובה...'):
-            if "שיחה כללית" in selected_tools and len(selected_tools) == 1:
-                # מצב שיחה כללית בלבד
-                response = ask_about_tool("AI Tools", prompt, general_chat=True, conversation_history=conversation_history)
-            elif "שיחה כללית" in selected_tools:
-                # מצב משולב - שיחה כללית וכלים ספציפיים
-                specific_tools = [tool for tool in selected_tools if tool != "שיחה כללית"]
-                response = ask_about_multiple_tools(specific_tools, prompt, conversation_history=conversation_history)
-            elif len(selected_tools) == 1:
-                # כלי אחד בלבד
-                response = ask_about_tool(selected_tools[0], prompt, conversation_history=conversation_history)
-            else:
-                # מספר כלים
-                response = ask_about_multiple_tools(selected_tools, prompt, conversation_history=conversation_history)
+            # קבלת תשובה בהזרמה באמצעות Groq API - בעומס מוצג זמן ההמתנה המשוער בתור המשותף
+            wait_seconds = estimated_wait()
+            spinner_text = f"יש עומס, השאלה ממתינה בתור (כ-{wait_seconds:.0f} שניות)..." if wait_seconds >= 1 else 'מחפש תשובה...'
+            with st.spinner(spinner_text):
+                if len(mentioned_tools) == 1:
+                    # שיחה כללית על כלי אחד שזוהה בשאלה
+                    response_stream = stream_about_tool(mentioned_tools[0], prompt, conversation_history=conversation_history)
+                elif mentioned_tools:
+                    # שיחה כללית על מספר כלים שזוהו בשאלה
+                    response_stream = stream_about_multiple_tools(mentioned_tools, prompt, conversation_history=conversation_history)
+                elif "שיחה כללית" in selected_tools and len(selected_tools) == 1:
+                    # מצב שיחה כללית בלבד
+                    response_stream = stream_about_tool("AI Tools", prompt, general_chat=True, conversation_history=conversation_history)
+                elif "שיחה כללית" in selected_tools:
+                    # מצב משולב - שיחה כללית וכלים ספציפיים
+                    specific_tools = [tool for tool in selected_tools if tool != "שיחה כללית"]
+                    response_stream = stream_about_multiple_tools(specific_tools, prompt, conversation_history=conversation_history)
+                elif len(selected_tools) == 1:
+                    # כלי אחד בלבד
+                    response_stream = stream_about_tool(selected_tools[0], prompt, conversation_history=conversation_history)
+                else:
+                    # מספר כלים
+                    response_stream = stream_about_multiple_tools(selected_tools, prompt, conversation_history=conversation_history)
+            
+                # הספינר מוצג עד שמגיע הקטע הראשון של התשובה
+                first_chunk = next(response_stream, "")
+                request_span.set(ttft_ms=round((time.perf_counter() - request_started) * 1000, 3))
         
-        # סימולציה של זרימת תשובה עם השהייה קצרה
-        for chunk in response.split():
-            full_response += chunk + " "
-            time.sleep(0.01)  # השהייה קצרה יותר כי התשובות ארוכות יותר
-            # הוספת סמן מהבהב לסימולציית הקלדה
-            message_placeholder.markdown(full_response + "▌")
-        message_placeholder.markdown(full_response)
+            # הצגת התשובה תוך כדי הזרמה מהמודל, עם סמן מהבהב
+            with tracer.span("render") as render_span:
+                full_response = first_chunk
+                chunks = 1
+                message_placeholder.markdown(full_response + "▌")
+                for chunk in response_stream:
+                    full_response += chunk
+                    chunks += 1
+                    message_placeholder.markdown(full_response + "▌")
+                message_placeholder.markdown(full_response)
+                render_span.set(chunks=chunks, characters=len(full_response))
     
-    # הוספת תגובת הבוט להיסטוריית הצ'אט
-    st.session_state.messages.append({"role": "assistant", "content": full_response})
\ No newline at end of file
+        # הוספת תגובת הבוט להיסטוריית הצ'אט
+        transcript.append({"role": "assistant", "content": full_response})
+    st.session_state.last_trace_id = request_span.trace_id
+
+# חלונית דיבאג - פירוט הזמנים של כל שלב בבקשה האחרונה של הסשן
+def render_debug_panel(trace_id):
+    """טבלת השלבים של הבקשה האחרונה: זמן התחלה יחסי, משך, סטטוס ופרטים"""
+    from tracing import tracer
+    spans = tracer.get_trace(trace_id) if trace_id else []
+    with st.sidebar.expander("⏱️ פירוט זמנים של הבקשה האחרונה", expanded=True):
+        if not spans:
+            st.caption("עדיין לא נשלחה שאלה בסשן הזה")
+            return
+        parents = {span.span_id: span.parent_span_id for span in spans}
+        started = min(span.start_ns for span in spans)
+        rows = []
+        for span in spans:
+            depth = 0
+            parent = span.parent_span_id
+            while parent in parents:
+                depth += 1
+                parent = parents[parent]
+            rows.append({
+                "שלב": "\u2003" * depth + span.name,
+                "התחלה (ms)": round((span.start_ns - started) / 1e6, 1),
+                "משך (ms)": span.duration_ms,
+                "סטטוס": span.status,
+                "פרטים": ", ".join(f"{key}={value}" for key, value in span.attributes.items()),
+            })
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+if DEBUG_PANEL or st.query_params.get("debug") == "1":
+    render_debug_panel(st.session_state.get("last_trace_id"))
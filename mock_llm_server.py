@@ -0,0 +1,171 @@
+"""שרת מדומה תואם OpenAI/Groq, לבדיקות עומס ומדידות של האפליקציה בלי ה-API האמיתי.
+
+דוגמאות הרצה:
+    python mock_llm_server.py --port 8081 --latency 0.3 --tokens-per-second 150
+    python mock_llm_server.py --error-rate 0.1 --retry-after 2   # 10% מהבקשות נענות ב-429
+
+חיבור האפליקציה לשרת:
+    LLM_BACKEND=openai LLM_BASE_URL=http://localhost:8081/v1 streamlit run main.py
+    או עם ספריית groq עצמה: GROQ_BASE_URL=http://localhost:8081 (הנתיב /openai/v1 נתמך)
+
+כל ההגדרות זמינות גם כמשתני סביבה (MOCK_LLM_LATENCY וכו'), להרצה עם uvicorn mock_llm_server:app.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass, asdict
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# מילים לתשובות המדומות - כל מילה נספרת כטוקן אחד
+_WORDS = "זהו כלי AI שימושי מאוד ליצירת תוכן עם ממשק פשוט ותמיכה בעברית ובשפות נוספות".split()
+
+
+@dataclass
+class MockConfig:
+    """התנהגות השרת המדומה"""
+
+    latency: float = float(os.getenv("MOCK_LLM_LATENCY", 0.3))  # זמן עד הטוקן הראשון, בשניות
+    jitter: float = float(os.getenv("MOCK_LLM_JITTER", 0.1))  # סטייה אקראית של זמן התגובה, בשניות
+    tokens_per_second: float = float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", 200))
+    answer_tokens: int = int(os.getenv("MOCK_LLM_ANSWER_TOKENS", 120))
+    error_rate: float = float(os.getenv("MOCK_LLM_ERROR_RATE", 0))  # שיעור הבקשות שנענות ב-429
+    retry_after: float = float(os.getenv("MOCK_LLM_RETRY_AFTER", 1))
+    seed: int = int(os.getenv("MOCK_LLM_SEED", 0))
+
+
+config = MockConfig()
+_random = random.Random(config.seed)
+_stats = {"requests": 0, "streamed": 0, "rate_limited": 0, "tokens": 0}
+
+
+def _answer_tokens(max_tokens):
+    count = min(config.answer_tokens, max_tokens or config.answer_tokens)
+    return [_WORDS[index % len(_WORDS)] + " " for index in range(count)]
+
+
+async def _first_token_delay():
+    await asyncio.sleep(max(0.0, config.latency + _random.uniform(-config.jitter, config.jitter)))
+
+
+def _completion_id():
+    return "chatcmpl-" + uuid.uuid4().hex[:24]
+
+
+def _usage(messages, completion_tokens):
+    prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in messages)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def chat_completions(request):
+    body = await request.json()
+    model = body.get("model", "mock-model")
+    messages = body.get("messages") or []
+    _stats["requests"] += 1
+
+    if config.error_rate and _random.random() < config.error_rate:
+        _stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after": str(config.retry_after)},
+        )
+
+    tokens = _answer_tokens(body.get("max_tokens"))
+    completion_id = _completion_id()
+    created = int(time.time())
+    token_delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+    _stats["tokens"] += len(tokens)
+
+    if not body.get("stream"):
+        await _first_token_delay()
+        await asyncio.sleep(token_delay * len(tokens))
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(messages, len(tokens)),
+        })
+
+    _stats["streamed"] += 1
+
+    def chunk(delta, finish_reason=None):
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def events():
+        await _first_token_delay()
+        yield chunk({"role": "assistant", "content": ""})
+        for token in tokens:
+            yield chunk({"content": token})
+            if token_delay:
+                await asyncio.sleep(token_delay)
+        yield chunk({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def models(request):
+    return JSONResponse({"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+
+
+async def stats(request):
+    return JSONResponse({"config": asdict(config), **_stats})
+
+
+app = Starlette(routes=[
+    # הנתיב של OpenAI ושל Groq (שמוסיפה /openai לפני /v1)
+    Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+    Route("/openai/v1/chat/completions", chat_completions, methods=["POST"]),
+    Route("/v1/models", models, methods=["GET"]),
+    Route("/stats", stats, methods=["GET"]),
+])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="שרת LLM מדומה תואם OpenAI לבדיקות עומס")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=config.latency, help="זמן עד הטוקן הראשון (שניות)")
+    parser.add_argument("--jitter", type=float, default=config.jitter, help="סטייה אקראית של זמן התגובה (שניות)")
+    parser.add_argument("--tokens-per-second", type=float, default=config.tokens_per_second, help="קצב הטוקנים בהזרמה")
+    parser.add_argument("--answer-tokens", type=int, default=config.answer_tokens, help="אורך התשובה בטוקנים")
+    parser.add_argument("--error-rate", type=float, default=config.error_rate, help="שיעור הבקשות שנענות ב-429 (0 עד 1)")
+    parser.add_argument("--retry-after", type=float, default=config.retry_after, help="ערך retry-after בתשובות 429")
+    parser.add_argument("--seed", type=int, default=config.seed, help="זרע לאקראיות, לתוצאות שחוזרות על עצמן")
+    args = parser.parse_args(argv)
+
+    for field in asdict(config):
+        setattr(config, field, getattr(args, field))
+    _random.seed(config.seed)
+
+    import uvicorn
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
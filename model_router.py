@@ -0,0 +1,170 @@
+import os
+import time
+import threading
+from collections import deque
+
+# מספר כשלונות רצופים שאחריהם נפתח המפסק (circuit breaker) של מודל
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("MODEL_CIRCUIT_FAILURE_THRESHOLD", 3))
+# זמן ההמתנה הבסיסי (בשניות) לפני ניסיון חוזר במודל שהמפסק שלו פתוח
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("MODEL_CIRCUIT_COOLDOWN_SECONDS", 30))
+# זמן ההמתנה המקסימלי, גם אחרי כשלונות חוזרים
+CIRCUIT_MAX_COOLDOWN_SECONDS = float(os.getenv("MODEL_CIRCUIT_MAX_COOLDOWN_SECONDS", 600))
+# החזקה המקסימלית בהכפלת זמן ההמתנה - מעבר לה זמן ההמתנה כבר מגיע לתקרה בכל מקרה
+MAX_BACKOFF_EXPONENT = 32
+# מספר מדידות הזמן האחרונות שנשמרות לכל מודל לחישוב האחוזונים
+LATENCY_WINDOW = 100
+# מספר מדידות מינימלי לפני שמדרגים מודל לפי זמן התגובה שלו
+MIN_LATENCY_SAMPLES = 3
+
+
+def _percentile(sorted_values, fraction):
+    """אחוזון מתוך רשימה ממוינת, או None אם אין מדידות"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _error_status_code(error):
+    """קוד ה-HTTP של שגיאה מה-API, או None לשגיאות רשת ושגיאות אחרות"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+    return status_code
+
+
+def _error_retry_after(error):
+    """ערך הכותרת retry-after (בשניות) מתוך תשובת השגיאה, אם קיימת"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class _ModelHealth:
+    """סטטיסטיקות הבריאות וזמני התגובה של מודל אחד"""
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def success_rate(self):
+        total = self.successes + self.failures
+        return self.successes / total if total else 1.0
+
+    def latency_percentiles(self):
+        values = sorted(self.latencies)
+        return _percentile(values, 0.5), _percentile(values, 0.95)
+
+
+class ModelRouter:
+    """בחירת מודל לפי בריאות וזמן תגובה, עם מפסק לכל מודל שנכשל שוב ושוב"""
+
+    def __init__(self, models):
+        self.models = [model.strip() for model in models if model.strip()]
+        self._lock = threading.Lock()
+        self._health = {model: _ModelHealth() for model in self.models}
+
+    def _score(self, health):
+        """ציון למיון המודלים התקינים - נמוך יותר עדיף"""
+        if len(health.latencies) < MIN_LATENCY_SAMPLES:
+            # מודל שעדיין אין עליו מספיק מדידות מקבל עדיפות, כדי ללמוד את זמן התגובה שלו
+            return 0.0
+        p50, _ = health.latency_percentiles()
+        return p50 / max(health.success_rate(), 0.1)
+
+    def candidates(self):
+        """רשימת המודלים לפי סדר הניסיון: מודלים תקינים מהמהיר לאיטי, ואחריהם מודלים שהמפסק שלהם פתוח"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [model for model in self.models if self._health[model].open_until <= now]
+            healthy.sort(key=lambda model: self._score(self._health[model]))
+            if healthy:
+                return healthy
+            # כל המפסקים פתוחים - ננסה קודם את המודל שזמן ההמתנה שלו יסתיים ראשון
+            return sorted(self.models, key=lambda model: self._health[model].open_until)
+
+    def retry_in(self):
+        """מספר השניות עד שמודל כלשהו יהיה זמין (0 אם יש מודל תקין כבר עכשיו)"""
+        now = time.monotonic()
+        with self._lock:
+            if not self._health:
+                return 0.0
+            return max(0.0, min(health.open_until for health in self._health.values()) - now)
+
+    def cooldown_remaining(self, model):
+        """מספר השניות עד שהמפסק של המודל ייסגר (0 אם המודל תקין)"""
+        with self._lock:
+            health = self._health.get(model)
+            return max(0.0, health.open_until - time.monotonic()) if health else 0.0
+
+    def record_success(self, model, latency):
+        """רישום תשובה מוצלחת וזמן התגובה שלה (בשניות)"""
+        with self._lock:
+            health = self._health.setdefault(model, _ModelHealth())
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+            health.latencies.append(latency)
+
+    def record_failure(self, model, error, latency=None):
+        """רישום כשלון, ופתיחת המפסק של המודל במקרה של 429 או כשלונות חוזרים"""
+        status_code = _error_status_code(error)
+        retry_after = _error_retry_after(error)
+        now = time.monotonic()
+        with self._lock:
+            health = self._health.setdefault(model, _ModelHealth())
+            health.failures += 1
+            health.consecutive_failures += 1
+
+            if status_code == 429:
+                health.rate_limited += 1
+                # המודל חסום עד שהשרת מרשה לנסות שוב - אין טעם לנסות אותו לפני כן
+                cooldown = retry_after if retry_after is not None else CIRCUIT_COOLDOWN_SECONDS
+                health.open_until = max(health.open_until, now + cooldown)
+                return
+
+            if status_code is not None and status_code >= 500:
+                health.server_errors += 1
+
+            if retry_after is not None:
+                health.open_until = max(health.open_until, now + retry_after)
+            elif health.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+                # כל כשלון נוסף אחרי הסף מכפיל את זמן ההמתנה, עד לתקרה. החזקה מוגבלת לפני הכפל -
+                # אחרי כאלף כשלונות רצופים 2 בחזקת המונה כבר לא נכנס ב-float
+                exponent = min(health.consecutive_failures - CIRCUIT_FAILURE_THRESHOLD, MAX_BACKOFF_EXPONENT)
+                cooldown = min(CIRCUIT_MAX_COOLDOWN_SECONDS, CIRCUIT_COOLDOWN_SECONDS * (2 ** exponent))
+                health.open_until = now + cooldown
+
+    def stats(self):
+        """תמונת מצב של הסטטיסטיקות לכל מודל, לניטור ולדיבאג"""
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for model, health in self._health.items():
+                p50, p95 = health.latency_percentiles()
+                result[model] = {
+                    "successes": health.successes,
+                    "failures": health.failures,
+                    "success_rate": health.success_rate(),
+                    "rate_limited": health.rate_limited,
+                    "server_errors": health.server_errors,
+                    "p50_latency": p50,
+                    "p95_latency": p95,
+                    "circuit_open": health.open_until > now,
+                    "retry_in": max(0.0, health.open_until - now),
+                }
+            return result
@@ -0,0 +1,171 @@
+import threading
+from functools import lru_cache
+
+from tools_catalog import tools_catalog
+from conversation_history import estimate_tokens, estimate_messages_tokens
+
+# מספר הנחיות המערכת שנשמרות בזיכרון (לכל כלי ולכל צירוף כלים)
+PROMPT_CACHE_SIZE = 1024
+
+# החלקים הקבועים של ההנחיות - מופיעים ראשונים, כך שתחילת הבקשה זהה בין שאלות ובין סבבי שיחה
+# ומטמון התחיליות (prefix caching) של הספק יכול לעבוד
+GENERAL_SYSTEM_PROMPT = (
+    "You are a helpful and accurate information assistant. You are an expert in AI tools, "
+    "machine learning models, and software development. You answer in Hebrew and strive to "
+    "provide accurate and useful information."
+)
+TOOL_SYSTEM_PROMPT = (
+    "You are an expert in AI tools. Answer in Hebrew in a concise and accurate manner. "
+    "If you don't have information, simply say so."
+)
+MULTIPLE_TOOLS_SYSTEM_PROMPT = "אתה מומחה בכלי AI. אתה עונה בעברית ובצורה תמציתית ומדויקת. נסה להשוות בין הכלים כאשר רלוונטי."
+# שלב הסיכום בהשוואה בין כלים רבים: איחוד התשובות הקצרות על כל כלי לטבלת השוואה
+COMPARISON_REDUCE_SYSTEM_PROMPT = (
+    "אתה מומחה בכלי AI. קיבלת תשובות קצרות על כל אחד מהכלים לאותה שאלה. "
+    "ענה בעברית: קודם טבלת השוואה ב-Markdown עם שורה לכל כלי ועמודות לפי מה שחשוב לשאלה, "
+    "ואחריה סיכום קצר והמלצה. הסתמך רק על המידע שקיבלת, ואם חסר מידע על כלי - ציין זאת בטבלה."
+)
+RELATED_TOOLS_HEADER = "Tools from our recommended catalog that may be relevant to the question (prefer recommending them when they fit):"
+
+
+def compact_text(text):
+    """הסרת רווחים מיותרים: הזחה בתחילת שורות, רווחים בסוף שורות ושורות ריקות כפולות"""
+    lines = [line.strip() for line in (text or "").strip().splitlines()]
+    compacted = []
+    for line in lines:
+        if line or (compacted and compacted[-1]):
+            compacted.append(line)
+    return "\n".join(compacted)
+
+
+def format_tool_details(tool):
+    """פרטי כלי מהקטלוג בשורות קצרות, בלי שדות חסרים"""
+    fields = (
+        ("כלי", tool.get("name")),
+        ("תיאור", tool.get("description")),
+        ("קטגוריה", tool.get("category")),
+        ("דירוג", tool.get("rating")),
+        ("URL", tool.get("url")),
+    )
+    return "\n".join(f"{label}: {compact_text(str(value))}" for label, value in fields if value not in (None, ""))
+
+
+def format_related_tools(related_tools):
+    """רשימה קצרה של הכלים הרלוונטיים מהקטלוג, שורה לכל כלי"""
+    return "\n".join(
+        f"- {tool.get('name', 'Unknown')} ({tool.get('category', 'Unknown')}): "
+        f"{compact_text(tool.get('description', 'Unknown'))} {tool.get('url', '')}".rstrip()
+        for tool in related_tools
+    )
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _tool_system_prompt(tool_name, tool_prompt, catalog_version):
+    tool_info = tools_catalog.get(tool_name)
+    parts = [TOOL_SYSTEM_PROMPT, f"The tool: {tool_name}"]
+    if tool_info:
+        parts.append(format_tool_details(tool_info))
+    if tool_prompt:
+        parts.append(compact_text(tool_prompt))
+    return "\n\n".join(parts)
+
+
+def tool_system_prompt(tool_name, tool_prompt):
+    """הנחיית המערכת לשאלה על כלי יחיד. נבנית פעם אחת לכל כלי ונשמרת עד שהקטלוג או ההנחיה משתנים"""
+    return _tool_system_prompt(tool_name, tool_prompt, tools_catalog.version)
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _multiple_tools_system_prompt(tools, catalog_version):
+    parts = [MULTIPLE_TOOLS_SYSTEM_PROMPT, "הכלים בשיחה: " + ", ".join(tools)]
+    details = [format_tool_details(tool) for tool in tools_catalog.get_many(tools)]
+    if details:
+        parts.append("מידע בסיסי על הכלים:\n\n" + "\n\n".join(details))
+    return "\n\n".join(parts)
+
+
+def multiple_tools_system_prompt(tools, include_details=True):
+    """הנחיית המערכת לשאלה על מספר כלים. הכלים ממוינים, כך שאותו צירוף בסדר אחר מקבל
+    את אותה הנחיה (ואת אותה תחילית). בלי include_details נכנסים רק שמות הכלים"""
+    tools = tuple(sorted(set(tools)))
+    if not include_details:
+        return MULTIPLE_TOOLS_SYSTEM_PROMPT + "\n\nהכלים בשיחה: " + ", ".join(tools)
+    return _multiple_tools_system_prompt(tools, tools_catalog.version)
+
+
+def general_user_prompt(question, related_tools=None):
+    """השאלה בשיחה כללית. הכלים הרלוונטיים משתנים משאלה לשאלה, ולכן הם מצורפים לשאלה עצמה
+    (ההודעה האחרונה) ולא להנחיית המערכת - כך ההנחיה וההיסטוריה נשארות תחילית קבועה"""
+    if not related_tools:
+        return f"Question about AI tools: {question}"
+    return f"{RELATED_TOOLS_HEADER}\n{format_related_tools(related_tools)}\n\nQuestion about AI tools: {question}"
+
+
+def tool_user_prompt(tool_name, question):
+    return f"Question about {tool_name}: {question}"
+
+
+def multiple_tools_user_prompt(question, selected_tools_info=None):
+    """השאלה על מספר כלים (שמות הכלים כבר בהנחיית המערכת ולא חוזרים כאן).
+    כשנבחרו כלים רבים, פרטי הכלים הרלוונטיים לשאלה מצורפים לשאלה"""
+    prompt = f"שאלה על הכלים בשיחה: {question}"
+    if selected_tools_info:
+        details = "\n\n".join(format_tool_details(tool) for tool in selected_tools_info)
+        prompt = f"מידע על הכלים הרלוונטיים לשאלה:\n\n{details}\n\n{prompt}"
+    return prompt
+
+
+def comparison_map_user_prompt(tool_name, question):
+    """שאלת המשנה על כלי אחד בהשוואה בין כלים רבים - תשובה קצרה שנכנסת לטבלת ההשוואה"""
+    return (
+        f"Question about {tool_name}: {question}\n\n"
+        f"ענה רק לגבי {tool_name}, בקצרה (עד 80 מילים) ובנקודות: מה הכלי עושה, יתרונות, חסרונות ומחיר - "
+        "ככל שהם רלוונטיים לשאלה."
+    )
+
+
+def comparison_reduce_user_prompt(question, tool_answers):
+    """שאלת שלב הסיכום: השאלה המקורית והתשובות הקצרות על כל כלי, לפי סדר הכלים"""
+    answers = "\n\n".join(f"### {tool_name}\n{compact_text(answer)}" for tool_name, answer in tool_answers.items())
+    return f"התשובות על כל כלי:\n\n{answers}\n\nשאלה להשוואה בין הכלים: {question}"
+
+
+class PromptStats:
+    """מעקב אחרי גודל הבקשות שנשלחות למודל, בהערכת טוקנים מקומית"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.last_tokens = 0
+        self.last_system_tokens = 0
+
+    def record(self, messages):
+        """רישום בקשה ששלחה את ההודעות האלו. מחזיר את מספר הטוקנים המשוער שלה"""
+        tokens = estimate_messages_tokens(messages)
+        system_tokens = estimate_tokens(messages[0].get("content", "")) if messages else 0
+        with self._lock:
+            self.requests += 1
+            self.total_tokens += tokens
+            self.max_tokens = max(self.max_tokens, tokens)
+            self.last_tokens = tokens
+            self.last_system_tokens = system_tokens
+        return tokens
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "last_prompt_tokens": self.last_tokens,
+                "last_system_prompt_tokens": self.last_system_tokens,
+                "avg_prompt_tokens": round(self.total_tokens / self.requests, 1) if self.requests else 0.0,
+                "max_prompt_tokens": self.max_tokens,
+                "cached_system_prompts": (
+                    _tool_system_prompt.cache_info().currsize + _multiple_tools_system_prompt.cache_info().currsize
+                ),
+            }
+
+
+# מופע משותף לכל התהליך
+prompt_stats = PromptStats()
@@ -0,0 +1,133 @@
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+
+from groq_client import (
+    get_or_create_tool_prompt_async,
+    run_async_in_background,
+    model_router,
+)
+from tools_catalog import tools_catalog
+from prompt_builder import tool_system_prompt, multiple_tools_system_prompt
+from rate_limiter import rate_limiter, PRIORITY_BACKGROUND
+from tracing import tracer
+
+# טעינה מוקדמת של ההנחיות לכלים שנבחרו, עוד לפני השאלה הראשונה
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+# מספר ההנחיות המקסימלי שנוצרות במקביל בטעינה המוקדמת
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", 2))
+# מספר הכלים המקסימלי מכל בחירה שנטענים מראש
+PREFETCH_MAX_TOOLS = 15
+# זמן ההמתנה (בשניות) לפני ניסיון נוסף כשאין כרגע מכסה פנויה אצל המודלים
+PREFETCH_RETRY_SECONDS = 5.0
+
+
+class PromptPrefetcher:
+    """טעינה מוקדמת ברקע של רשומת הקטלוג, ההנחיה והנחיית המערכת של כלים שנבחרו זה עתה.
+    כל כלי נטען פעם אחת גם כשכמה סשנים בוחרים אותו, כלי שבוטלה בחירתו יוצא מהתור אם עוד
+    לא התחיל, והטעינה מתחילה רק כשיש מכסה פנויה - כך שהיא לא מעכבת שאלות של משתמשים"""
+
+    def __init__(self, concurrency=PREFETCH_CONCURRENCY, enabled=PREFETCH_ENABLED):
+        self.concurrency = concurrency
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # מספר הסשנים שבחרו כל כלי שממתין לטעינה או נטען כרגע. הרשומה נמחקת כשהטעינה
+        # מסתיימת או כשאף סשן כבר לא בוחר בכלי, כך שהמילון לא גדל עם כל כלי שנבחר אי פעם
+        self._wanted = {}
+        # כלים שממתינים לטעינה, לפי סדר הבחירה
+        self._pending = OrderedDict()
+        self._running = set()
+        self._retry_timer = None
+        self.counters = {"queued": 0, "started": 0, "cancelled": 0}
+
+    def update(self, previous_tools, selected_tools):
+        """עדכון הבחירה של סשן אחד: כלים חדשים נכנסים לתור, וכלים שבוטלו יוצאים ממנו"""
+        if not self.enabled:
+            return
+        # אותה הגבלה גם על הבחירה הקודמת, כך שכל כלי שנספר בבחירה מופחת בדיוק פעם אחת בביטולה
+        previous_tools = set(list(dict.fromkeys(previous_tools))[:PREFETCH_MAX_TOOLS])
+        selected_tools = list(dict.fromkeys(selected_tools))[:PREFETCH_MAX_TOOLS]
+        with self._lock:
+            for tool in previous_tools - set(selected_tools):
+                count = self._wanted.get(tool, 0) - 1
+                if count > 0:
+                    self._wanted[tool] = count
+                    continue
+                self._wanted.pop(tool, None)
+                # טעינה שכבר התחילה ממשיכה עד הסוף - הטוקנים כבר נוצלו, וההנחיה תשמש בבחירה הבאה
+                if self._pending.pop(tool, None):
+                    self.counters["cancelled"] += 1
+            for tool in selected_tools:
+                if tool in previous_tools:
+                    continue
+                self._wanted[tool] = self._wanted.get(tool, 0) + 1
+                if tool not in self._running and tool not in self._pending:
+                    self._pending[tool] = True
+                    self.counters["queued"] += 1
+        if len(selected_tools) > 1:
+            run_async_in_background(asyncio.to_thread(self._warm_selection, selected_tools))
+        self._pump()
+
+    @staticmethod
+    def _warm_selection(tools):
+        """בניית הנחיית המערכת לצירוף הכלים, כך שהשאלה הראשונה מוצאת אותה מוכנה"""
+        multiple_tools_system_prompt(tools)
+
+    def _has_capacity(self):
+        return rate_limiter.estimated_wait(model_router.candidates(), priority=PRIORITY_BACKGROUND) <= 0
+
+    def _pump(self):
+        """הפעלת טעינות מהתור, עד למספר הטעינות המקבילות ורק כשיש מכסה פנויה"""
+        started = []
+        with self._lock:
+            while self._pending and len(self._running) < self.concurrency:
+                if not self._has_capacity():
+                    self._schedule_retry()
+                    break
+                tool, _ = self._pending.popitem(last=False)
+                self._running.add(tool)
+                self.counters["started"] += 1
+                started.append((tool, run_async_in_background(self._prefetch(tool))))
+        # רישום הסיום רק אחרי שחרור המנעול: טעינה שכבר הסתיימה מפעילה את _finished מיד,
+        # באותו תהליכון, והוא לוקח את המנעול בעצמו
+        for tool, future in started:
+            future.add_done_callback(lambda _, tool=tool: self._finished(tool))
+
+    def _schedule_retry(self):
+        """ניסיון נוסף מאוחר יותר. נקרא כשהמנעול מוחזק"""
+        if self._retry_timer is not None and self._retry_timer.is_alive():
+            return
+        self._retry_timer = threading.Timer(PREFETCH_RETRY_SECONDS, self._pump)
+        self._retry_timer.daemon = True
+        self._retry_timer.start()
+
+    def _finished(self, tool):
+        with self._lock:
+            self._running.discard(tool)
+            # בחירה חדשה של הכלי תכניס אותו שוב לתור, וההנחיה שלו כבר תהיה מוכנה
+            self._wanted.pop(tool, None)
+        self._pump()
+
+    def stats(self):
+        """תמונת מצב של התור והטעינות, לניטור ולדיבאג"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                **self.counters,
+                "pending": len(self._pending),
+                "running": len(self._running),
+                "tracked_tools": len(self._wanted),
+            }
+
+    async def _prefetch(self, tool):
+        with tracer.span("prompt.prefetch", tool=tool) as span:
+            if tools_catalog.get(tool) is None:
+                span.set(found=False)
+                return
+            prompt = await get_or_create_tool_prompt_async(tool, priority=PRIORITY_BACKGROUND)
+            tool_system_prompt(tool, prompt)
+
+
+# מופע משותף לכל התהליך
+prompt_prefetcher = PromptPrefetcher()
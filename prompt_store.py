@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+
+from file_utils import DATA_DIR, FileLock, write_json_atomic
+from tracing import get_logger, log_event
+
+# נתיב לקובץ של ההנחיות לכלי AI
+TOOLS_PROMPTS_FILE = os.path.join(DATA_DIR, "tools_prompts.json")
+# זמן ההמתנה המקסימלי (בשניות) לתהליך אחר שיוצר את אותה הנחיה, שאחריו יוצרים אותה בעצמנו
+PROMPT_LOCK_TIMEOUT_SECONDS = 180
+
+logger = get_logger("prompt_store")
+
+# תוצאת יצירה שהבעלים שלה בוטל (למשל כשהלקוח התנתק) - הממתינים מנסים שוב, ואחד מהם יוצר במקומו
+_ABANDONED = object()
+
+
+async def _to_thread_or_cleanup(cleanup, func, *args):
+    """כמו asyncio.to_thread, אבל אם הקורא בוטל לפני שהפעולה בתהליכון הסתיימה, התוצאה שלה
+    מועברת ל-cleanup כשהיא מסתיימת (למשל שחרור מנעול שנתפס בינתיים)"""
+    task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        def done(task):
+            if not task.cancelled() and task.exception() is None:
+                cleanup(task.result())
+
+        task.add_done_callback(done)
+        raise
+
+
+def _meta_path(path):
+    """נתיב קובץ המטא-דאטה של ההנחיות (טביעת האצבע של מידע הכלי שממנו נוצרה כל הנחיה)"""
+    return os.path.splitext(path)[0] + "_meta.json"
+
+
+class PromptStore:
+    """מאגר הנחיות הכלים: מטמון בזיכרון, כתיבה אטומית לדיסק ויצירה חד-פעמית של הנחיות חסרות"""
+
+    def __init__(self, path=TOOLS_PROMPTS_FILE):
+        self.path = path
+        self.meta_path = _meta_path(path)
+        self.locks_dir = os.path.join(os.path.dirname(path), "locks")
+        self._lock = threading.Lock()
+        self._version = None
+        self._prompts = {}
+        self._meta_version = None
+        self._meta = {}
+        # יצירות הנחיה שמתבצעות כרגע, לפי שם הכלי
+        self._inflight = {}
+
+    @staticmethod
+    def _file_version(path):
+        """גרסת הקובץ לפי זמן שינוי וגודל, או None אם הקובץ לא קיים"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _read(path):
+        """קריאת קובץ JSON של מילון, או None אם הקריאה נכשלה"""
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            log_event(logger, logging.WARNING, f"שגיאה בטעינת קובץ ההנחיות {path}", path=path, error=str(e))
+            return None
+        return data if isinstance(data, dict) else {}
+
+    def _refresh(self):
+        """טעינה מחדש מהדיסק אם הקבצים השתנו (למשל על ידי תהליך אחר). נקרא כשהמנעול מוחזק"""
+        version = self._file_version(self.path)
+        if version != self._version:
+            data = self._read(self.path) if version is not None else {}
+            # אם הקריאה נכשלה ממשיכים להגיש את הגרסה האחרונה התקינה
+            if data is not None:
+                self._prompts = data
+                self._version = version
+
+        meta_version = self._file_version(self.meta_path)
+        if meta_version != self._meta_version:
+            meta = self._read(self.meta_path) if meta_version is not None else {}
+            if meta is not None:
+                self._meta = meta
+                self._meta_version = meta_version
+
+    @property
+    def version(self):
+        """גרסת קובץ ההנחיות שנטענה כעת (זמן שינוי וגודל)"""
+        with self._lock:
+            self._refresh()
+            return self._version
+
+    def get(self, tool_name):
+        """ההנחיה השמורה לכלי, או None אם אין"""
+        with self._lock:
+            self._refresh()
+            return self._prompts.get(tool_name)
+
+    def all(self):
+        """עותק של כל ההנחיות השמורות"""
+        with self._lock:
+            self._refresh()
+            return dict(self._prompts)
+
+    def __contains__(self, tool_name):
+        return self.get(tool_name) is not None
+
+    def source(self, tool_name):
+        """טביעת האצבע של מידע הכלי שממנו נוצרה ההנחיה, או None אם לא נרשמה"""
+        with self._lock:
+            self._refresh()
+            return self._meta.get(tool_name, {}).get("source")
+
+    def set(self, tool_name, prompt, source=None):
+        """שמירת הנחייה לכלי"""
+        self.set_many({tool_name: prompt}, {tool_name: source})
+
+    def set_many(self, prompts, sources=None):
+        """שמירת מספר הנחיות בכתיבה אחת: מיזוג עם הגרסה העדכנית בדיסק והחלפה אטומית של הקובץ.
+        המנעול על הקובץ מונע מתהליכים שונים לדרוס זה את ההנחיות שזה עתה שמר.
+        sources הן טביעות האצבע של מידע הכלים, לפי שם הכלי"""
+        if not prompts:
+            return
+        sources = sources or {}
+        with self._lock, FileLock(self.path + ".lock"):
+            self._refresh()
+            merged = dict(self._prompts)
+            merged.update(prompts)
+            write_json_atomic(self.path, merged)
+            self._prompts = merged
+            self._version = self._file_version(self.path)
+
+            now = time.time()
+            meta = dict(self._meta)
+            for tool_name in prompts:
+                source = sources.get(tool_name)
+                if source is not None or tool_name in meta:
+                    meta[tool_name] = {"source": source, "generated_at": now}
+            if meta != self._meta:
+                write_json_atomic(self.meta_path, meta)
+                self._meta = meta
+                self._meta_version = self._file_version(self.meta_path)
+
+    def _claim(self, tool_name):
+        """רישום יצירה של הנחיה לכלי. מחזיר (future, owner) - רק הבעלים מריץ את היצירה"""
+        with self._lock:
+            self._refresh()
+            prompt = self._prompts.get(tool_name)
+            if prompt is not None:
+                future = Future()
+                future.set_result(prompt)
+                return future, False
+            future = self._inflight.get(tool_name)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[tool_name] = future
+            return future, True
+
+    def _generation_lock(self, tool_name):
+        """מנעול יצירת ההנחיה של כלי בין תהליכים. קובץ נעילה לכל כלי, כך שיצירות של כלים שונים
+        לא ממתינות זו לזו בזמן הבקשה למודל"""
+        digest = hashlib.sha1(tool_name.encode("utf-8")).hexdigest()
+        return FileLock(os.path.join(self.locks_dir, f"prompt-{digest}.lock"))
+
+    async def acquire_generation_lock_async(self, tool_name):
+        """תפיסת מנעול היצירה של כלי (אותו מנעול של get_or_create), לקוראים שיוצרים ושומרים
+        הנחיות בעצמם, כמו generate_prompts. מחזיר את המנעול לשחרור אחרי השמירה, או None אם
+        לא התפנה תוך PROMPT_LOCK_TIMEOUT_SECONDS - ואז ממשיכים בלעדיו, כמו get_or_create"""
+        lock = self._generation_lock(tool_name)
+        locked = await _to_thread_or_cleanup(
+            lambda acquired: acquired and lock.release(), lock.acquire, True, PROMPT_LOCK_TIMEOUT_SECONDS,
+        )
+        return lock if locked else None
+
+    def _finish(self, tool_name, future, prompt=None, error=None, source=None, save=True):
+        """שמירת ההנחיה שנוצרה (אם נוצרה) ושחרור כל מי שממתין לה"""
+        try:
+            if error is None and prompt is not None and save:
+                self.set(tool_name, prompt, source)
+        finally:
+            self._release(tool_name, future, prompt, error)
+
+    def _release(self, tool_name, future, result, error=None):
+        """שחרור היצירה והעברת התוצאה לממתינים - פעם אחת בלבד, גם כשהבעלים בוטל בזמן השמירה"""
+        with self._lock:
+            if self._inflight.get(tool_name) is future:
+                del self._inflight[tool_name]
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _abandon(self, tool_name, future):
+        """שחרור היצירה כשהבעלים בוטל: הממתינים לא מקבלים את הביטול, אלא מנסים שוב"""
+        self._release(tool_name, future, _ABANDONED)
+
+    def get_or_create(self, tool_name, create, source=None):
+        """ההנחיה לכלי, או יצירתה עם create() אם חסרה. כשכמה קוראים מבקשים את אותו כלי
+        בו-זמנית, רק אחד מהם מריץ את create והשאר ממתינים לתוצאה. None אם היצירה נכשלה.
+        source היא טביעת האצבע של מידע הכלי, שנשמרת לזיהוי הנחיות שהתיישנו"""
+        while True:
+            future, owner = self._claim(tool_name)
+            if owner:
+                break
+            prompt = future.result()
+            if prompt is not _ABANDONED:
+                return prompt
+        lock = self._generation_lock(tool_name)
+        locked = lock.acquire(timeout=PROMPT_LOCK_TIMEOUT_SECONDS)
+        try:
+            # ייתכן שתהליך אחר יצר את ההנחיה בזמן שחיכינו למנעול
+            prompt = self.get(tool_name)
+            created = prompt is None
+            if created:
+                prompt = create()
+            self._finish(tool_name, future, prompt, source=source, save=created)
+        except Exception as e:
+            if not future.done():
+                self._finish(tool_name, future, error=e)
+            raise
+        except BaseException:
+            self._abandon(tool_name, future)
+            raise
+        finally:
+            if locked:
+                lock.release()
+        return prompt
+
+    async def get_or_create_async(self, tool_name, create, source=None):
+        """גרסה אסינכרונית של get_or_create, כאשר create מחזירה קורוטינה"""
+        while True:
+            # הבדיקה מול הקובץ בדיסק רצה בתהליכון נפרד. אם בוטלנו ובינתיים הפכנו לבעלים,
+            # היצירה משתחררת לממתינים האחרים
+            future, owner = await _to_thread_or_cleanup(
+                lambda claim: claim[1] and self._abandon(tool_name, claim[0]), self._claim, tool_name,
+            )
+            if owner:
+                break
+            # shield - ביטול של ממתין אחד לא מבטל את התוצאה המשותפת לשאר הממתינים
+            prompt = await asyncio.shield(asyncio.wrap_future(future))
+            if prompt is not _ABANDONED:
+                return prompt
+        lock = self._generation_lock(tool_name)
+        locked = False
+        try:
+            # ההמתנה למנעול של תהליך אחר נעשית בתהליכון נפרד, כדי לא לחסום את לולאת האירועים
+            locked = await _to_thread_or_cleanup(
+                lambda acquired: acquired and lock.release(), lock.acquire, True, PROMPT_LOCK_TIMEOUT_SECONDS,
+            )
+            prompt = await asyncio.to_thread(self.get, tool_name)
+            created = prompt is None
+            if created:
+                prompt = await create()
+            # השמירה (כתיבה לדיסק ומנעול קובץ) רצה בתהליכון נפרד, כדי לא לחסום את לולאת האירועים
+            await asyncio.to_thread(self._finish, tool_name, future, prompt, source=source, save=created)
+        except Exception as e:
+            if not future.done():
+                self._finish(tool_name, future, error=e)
+            raise
+        except BaseException:
+            # ביטול המשימה (למשל לקוח שהתנתק) לא מועבר לממתינים של בקשות אחרות
+            self._abandon(tool_name, future)
+            raise
+        finally:
+            if locked:
+                lock.release()
+        return prompt
+
+
+# מופע משותף לכל התהליך
+prompt_store = PromptStore()
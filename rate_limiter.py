@@ -0,0 +1,299 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+
+# מכסת הבקשות והטוקנים לדקה לכל מודל (0 = ללא הגבלה). ברירת המחדל כבויה - מגדירים לפי המכסה בחשבון Groq
+RATE_LIMIT_RPM = float(os.getenv("RATE_LIMIT_RPM", 0))
+RATE_LIMIT_TPM = float(os.getenv("RATE_LIMIT_TPM", 0))
+# מכסות שונות למודלים מסוימים, בפורמט model=rpm:tpm, למשל "llama3-70b-8192=30:6000"
+MODEL_RATE_LIMITS = os.getenv("MODEL_RATE_LIMITS", "")
+# מספר הבקשות המקסימלי שממתינות בתור, מעבר לו בקשות חדשות נדחות מיד
+RATE_LIMIT_MAX_QUEUE = int(os.getenv("RATE_LIMIT_MAX_QUEUE", 100))
+# זמן ההמתנה המשוער המקסימלי (בשניות) לשאלה של משתמש - מעבר לו עדיף לומר לו לנסות שוב
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", 20))
+# זמן ההמתנה המקסימלי לעבודות רקע (כמו יצירה מראש של הנחיות), שאין מי שממתין להן
+RATE_LIMIT_BACKGROUND_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_BACKGROUND_MAX_WAIT_SECONDS", 600))
+# הערכת אורך התשובה בטוקנים, שנשמרת מראש מהמכסה ומתוקנת לפי האורך בפועל כשהתשובה מסתיימת
+RATE_LIMIT_COMPLETION_TOKENS = int(os.getenv("RATE_LIMIT_COMPLETION_TOKENS", 400))
+# כל כמה זמן (בשניות) לכל היותר ממתין אסינכרוני בודק אם הגיע תורו
+ASYNC_POLL_SECONDS = 0.05
+
+# עדיפויות בתור - מספר נמוך יותר נכנס קודם, ובאותה עדיפות לפי סדר ההגעה
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class RateLimitExceeded(Exception):
+    """הבקשה נדחתה כי התור מלא או שזמן ההמתנה המשוער ארוך מדי"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"עומס על המודלים, זמן המתנה משוער {retry_after:.1f} שניות")
+        self.retry_after = retry_after
+
+
+def _parse_model_limits(value):
+    limits = {}
+    for item in value.split(","):
+        model, _, quota = item.partition("=")
+        rpm, _, tpm = quota.partition(":")
+        try:
+            limits[model.strip()] = (float(rpm or 0), float(tpm or 0))
+        except ValueError:
+            continue
+    limits.pop("", None)
+    return limits
+
+
+class _Bucket:
+    """דלי אסימונים שמתמלא בקצב קבוע עד לתקרה של דקה אחת של מכסה"""
+
+    def __init__(self, per_minute, now):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = now
+
+    def refill(self, now):
+        if self.rate:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount):
+        """מספר השניות עד שיהיו בדלי amount אסימונים (בקשה גדולה מהתקרה ממתינה לדלי מלא)"""
+        if not self.rate:
+            return 0.0
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount):
+        if self.rate:
+            self.level -= amount
+
+    def give_back(self, amount):
+        if self.rate:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Ticket:
+    """מקום בתור של מודל אחד"""
+
+    def __init__(self, priority, seq, model, tokens):
+        self.priority = priority
+        self.seq = seq
+        self.model = model
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _ModelQuota:
+    """המכסות והתור של מודל אחד"""
+
+    def __init__(self, rpm, tpm, now):
+        self.requests = _Bucket(rpm, now)
+        self.tokens = _Bucket(tpm, now)
+        self.queue = []
+        self.blocked_until = 0.0
+
+    def refill(self, now):
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+    def wait_for(self, now, requests, tokens):
+        return max(self.blocked_until - now, self.requests.wait_for(requests), self.tokens.wait_for(tokens))
+
+    def estimate(self, now, tokens, priority):
+        """זמן ההמתנה המשוער לבקשה חדשה, אחרי כל הבקשות בתור שעדיפותן גבוהה או שווה לשלה"""
+        ahead = [ticket for ticket in self.queue if ticket.priority <= priority]
+        return self.wait_for(now, len(ahead) + 1, sum(ticket.tokens for ticket in ahead) + tokens)
+
+
+class Permit:
+    """אישור לשליחת בקשה אחת למודל. settle מעדכן את המכסה לפי מספר הטוקנים בפועל"""
+
+    def __init__(self, limiter, model, tokens, waited):
+        self.limiter = limiter
+        self.model = model
+        self.tokens = tokens
+        self.waited = waited
+
+    def settle(self, used_tokens):
+        if used_tokens != self.tokens:
+            self.limiter._adjust(self.model, used_tokens - self.tokens)
+            self.tokens = used_tokens
+
+
+class RateLimiter:
+    """מגביל קצב משותף לכל הסשנים בתהליך, לפי מכסת בקשות וטוקנים לדקה לכל מודל.
+    בקשות שאין להן מקום ממתינות בתור הוגן (לפי עדיפות ואז לפי סדר הגעה), ובקשות
+    שזמן ההמתנה המשוער שלהן ארוך מדי נדחות מיד במקום להיכשל ב-429 מול Groq"""
+
+    def __init__(self, rpm=RATE_LIMIT_RPM, tpm=RATE_LIMIT_TPM, model_limits=None,
+                 max_queue=RATE_LIMIT_MAX_QUEUE, max_wait=RATE_LIMIT_MAX_WAIT_SECONDS,
+                 background_max_wait=RATE_LIMIT_BACKGROUND_MAX_WAIT_SECONDS):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.model_limits = _parse_model_limits(MODEL_RATE_LIMITS) if model_limits is None else dict(model_limits)
+        self.max_queue = max_queue
+        self.max_wait = {PRIORITY_INTERACTIVE: max_wait, PRIORITY_BACKGROUND: background_max_wait}
+        self.enabled = bool(rpm or tpm or any(rpm or tpm for rpm, tpm in self.model_limits.values()))
+        self._cond = threading.Condition()
+        self._quotas = {}
+        self._seq = itertools.count()
+        self.counters = {"admitted": 0, "queued": 0, "shed": 0, "cancelled": 0}
+        self._total_wait = 0.0
+
+    def _quota(self, model, now):
+        quota = self._quotas.get(model)
+        if quota is None:
+            rpm, tpm = self.model_limits.get(model, (self.rpm, self.tpm))
+            quota = self._quotas[model] = _ModelQuota(rpm, tpm, now)
+        quota.refill(now)
+        return quota
+
+    def _queued(self):
+        return sum(len(quota.queue) for quota in self._quotas.values())
+
+    def _best(self, models, tokens, priority, now):
+        """המודל שאפשר לשלוח אליו הכי מהר, לפי סדר המודלים כששני מודלים זמינים באותו זמן"""
+        best_model, best_wait = None, None
+        for model in models:
+            wait = self._quota(model, now).estimate(now, tokens, priority)
+            if best_wait is None or wait < best_wait:
+                best_model, best_wait = model, wait
+            if wait <= 0:
+                break
+        return best_model, best_wait
+
+    def estimated_wait(self, models, tokens=RATE_LIMIT_COMPLETION_TOKENS, priority=PRIORITY_INTERACTIVE):
+        """זמן ההמתנה המשוער (בשניות) לבקשה חדשה, להצגה למשתמש לפני השליחה"""
+        if not self.enabled or not models:
+            return 0.0
+        with self._cond:
+            return self._best(models, tokens, priority, time.monotonic())[1]
+
+    def _enqueue(self, models, tokens, priority):
+        now = time.monotonic()
+        with self._cond:
+            model, wait = self._best(models, tokens, priority, now)
+            max_wait = self.max_wait.get(priority, self.max_wait[PRIORITY_INTERACTIVE])
+            if wait > 0 and (wait > max_wait or self._queued() >= self.max_queue):
+                self.counters["shed"] += 1
+                raise RateLimitExceeded(wait)
+            ticket = _Ticket(priority, next(self._seq), model, tokens)
+            heapq.heappush(self._quotas[model].queue, ticket)
+            if wait > 0:
+                self.counters["queued"] += 1
+            return ticket
+
+    def _poll(self, ticket):
+        """כניסה לפי התור: 0 אם הבקשה אושרה, אחרת מספר השניות עד לבדיקה הבאה. נקרא תחת המנעול"""
+        now = time.monotonic()
+        quota = self._quota(ticket.model, now)
+        if quota.queue[0] is not ticket:
+            return max(quota.estimate(now, ticket.tokens, ticket.priority), ASYNC_POLL_SECONDS)
+        wait = quota.wait_for(now, 1, ticket.tokens)
+        if wait > 0:
+            return wait
+        heapq.heappop(quota.queue)
+        quota.requests.take(1)
+        quota.tokens.take(ticket.tokens)
+        self.counters["admitted"] += 1
+        self._total_wait += now - ticket.enqueued
+        # הבקשה הבאה בתור יכולה לבדוק אם הגיע תורה
+        self._cond.notify_all()
+        return 0.0
+
+    def _cancel(self, ticket):
+        with self._cond:
+            queue = self._quotas[ticket.model].queue
+            if ticket in queue:
+                queue.remove(ticket)
+                heapq.heapify(queue)
+                self.counters["cancelled"] += 1
+                self._cond.notify_all()
+
+    def _permit(self, ticket):
+        return Permit(self, ticket.model, ticket.tokens, time.monotonic() - ticket.enqueued)
+
+    def acquire(self, models, tokens, priority=PRIORITY_INTERACTIVE):
+        """המתנה לתור ולמכסה של אחד מהמודלים (לפי סדר העדיפות שלהם) והחזרת Permit.
+        זורק RateLimitExceeded אם זמן ההמתנה המשוער ארוך מדי או שהתור מלא"""
+        if not self.enabled:
+            return Permit(self, models[0], tokens, 0.0)
+        ticket = self._enqueue(models, tokens, priority)
+        try:
+            with self._cond:
+                while True:
+                    wait = self._poll(ticket)
+                    if not wait:
+                        return self._permit(ticket)
+                    self._cond.wait(wait)
+        except BaseException:
+            self._cancel(ticket)
+            raise
+
+    async def acquire_async(self, models, tokens, priority=PRIORITY_INTERACTIVE):
+        """גרסה אסינכרונית של acquire, שלא חוסמת את לולאת האירועים בזמן ההמתנה"""
+        if not self.enabled:
+            return Permit(self, models[0], tokens, 0.0)
+        ticket = self._enqueue(models, tokens, priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._poll(ticket)
+                if not wait:
+                    return self._permit(ticket)
+                await asyncio.sleep(min(wait, ASYNC_POLL_SECONDS))
+        except BaseException:
+            # גם בביטול המשימה - המקום בתור מתפנה לבקשות שאחריה
+            self._cancel(ticket)
+            raise
+
+    def _adjust(self, model, extra_tokens):
+        with self._cond:
+            quota = self._quota(model, time.monotonic())
+            if extra_tokens > 0:
+                quota.tokens.take(extra_tokens)
+            else:
+                quota.tokens.give_back(-extra_tokens)
+                self._cond.notify_all()
+
+    def penalize(self, model, seconds):
+        """עצירת השליחה למודל ל-seconds שניות, למשל אחרי 429 עם retry-after מהשרת"""
+        if not self.enabled or seconds <= 0:
+            return
+        with self._cond:
+            quota = self._quota(model, time.monotonic())
+            quota.blocked_until = max(quota.blocked_until, time.monotonic() + seconds)
+
+    def stats(self):
+        """תמונת מצב של התורים והמכסות, לניטור ולדיבאג"""
+        now = time.monotonic()
+        with self._cond:
+            admitted = self.counters["admitted"]
+            return {
+                "enabled": self.enabled,
+                **self.counters,
+                "waiting": self._queued(),
+                "avg_wait_seconds": round(self._total_wait / admitted, 3) if admitted else 0.0,
+                "models": {
+                    model: {
+                        "rpm": quota.requests.capacity,
+                        "tpm": quota.tokens.capacity,
+                        "available_requests": round(quota.requests.level, 1) if quota.requests.rate else None,
+                        "available_tokens": round(quota.tokens.level) if quota.tokens.rate else None,
+                        "waiting": len(quota.queue),
+                        "blocked_for": round(max(0.0, quota.blocked_until - now), 1),
+                    }
+                    for model, quota in self._quotas.items()
+                },
+            }
+
+
+# מופע משותף לכל התהליך
+rate_limiter = RateLimiter()
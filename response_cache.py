@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+from file_utils import DATA_DIR
+
+# מטמון התשובות כבוי כברירת מחדל, ומופעל דרך משתנה סביבה
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# נתיב לקובץ מסד הנתונים של המטמון
+RESPONSE_CACHE_FILE = os.getenv("RESPONSE_CACHE_FILE", os.path.join(DATA_DIR, "response_cache.sqlite3"))
+# משך החיים של תשובה במטמון (בשניות)
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 24 * 60 * 60))
+# הגודל המקסימלי של המטמון (בבתים), מעבר לו נמחקות התשובות שלא נקראו הכי הרבה זמן
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+# זמן ההמתנה המקסימלי (בשניות) לנעילה של המסד בידי תהליך אחר
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+
+_TRAILING_PUNCTUATION = "?!.,;:׃־-\"'״ "
+
+
+def normalize_question(question):
+    """נרמול שאלה למפתח המטמון - אותיות קטנות, רווחים אחידים וללא סימני פיסוק בקצוות"""
+    question = unicodedata.normalize("NFKC", question or "").casefold()
+    return " ".join(question.split()).strip(_TRAILING_PUNCTUATION)
+
+
+def fingerprint(value):
+    """טביעת אצבע קצרה ויציבה לכל ערך שניתן להמיר ל-JSON"""
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """מטמון תשובות מתמיד ב-SQLite, עם משך חיים, מגבלת גודל ופינוי לפי LRU"""
+
+    def __init__(self, path=RESPONSE_CACHE_FILE, ttl=RESPONSE_CACHE_TTL_SECONDS,
+                 max_bytes=RESPONSE_CACHE_MAX_BYTES, enabled=RESPONSE_CACHE_ENABLED):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._connection = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _connect(self):
+        """פתיחת החיבור למסד הנתונים בשימוש הראשון (נקרא כשהמנעול מוחזק)"""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # כמה תהליכים יכולים לחלוק את הקובץ - כתיבה שנתקלת בנעילה של תהליך אחר ממתינה לה
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )"""
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def make_key(self, mode, tools, question, conversation_history, model, temperature, sources=None):
+        """מפתח המטמון: מצב השיחה, קבוצת הכלים, השאלה המנורמלת, ההיסטוריה, המודל, הטמפרטורה
+        וטביעת האצבע של מקורות המידע (רשומות הכלים וההנחיות), כך ששינוי בהם מבטל את התשובה השמורה"""
+        return fingerprint({
+            "mode": mode,
+            "tools": sorted(tools),
+            "question": normalize_question(question),
+            "history": fingerprint(conversation_history or []),
+            "model": model,
+            "temperature": temperature,
+            "sources": fingerprint(sources),
+        })
+
+    def get(self, key):
+        """התשובה השמורה למפתח, או None אם אין או שפג תוקפה"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    connection.commit()
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value):
+        """שמירת תשובה במטמון ופינוי תשובות ישנות אם חרגנו מהגודל המקסימלי"""
+        if not self.enabled or not value:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self.stores += 1
+            self._evict(connection, now)
+            connection.commit()
+
+    def _evict(self, connection, now):
+        """מחיקת תשובות שפג תוקפן, ואז התשובות שלא נקראו הכי הרבה זמן עד לעמידה במגבלת הגודל"""
+        expired = connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+        self.evictions += max(expired, 0)
+
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = connection.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        stale_keys = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale_keys.append((key,))
+            total -= size
+        connection.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+        self.evictions += len(stale_keys)
+
+    def clear(self):
+        """מחיקת כל התשובות השמורות"""
+        if not self.enabled:
+            return
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM responses")
+            connection.commit()
+
+    def stats(self):
+        """מוני המטמון: פגיעות, החטאות, שמירות, פינויים, מספר התשובות והגודל הכולל בבתים"""
+        stats = {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+            "entries": 0,
+            "bytes": 0,
+        }
+        if self.enabled:
+            with self._lock:
+                entries, total = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+            stats["entries"] = entries
+            stats["bytes"] = total
+        return stats
+
+
+# מופע משותף לכל התהליך
+response_cache = ResponseCache()
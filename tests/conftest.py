@@ -0,0 +1,44 @@
+import os
+import sys
+import socket
+import tempfile
+import threading
+
+import pytest
+
+# המודולים קוראים את ההגדרות שלהם בזמן הייבוא - ספריית נתונים זמנית לכל הרצת הבדיקות,
+# כך שהבדיקות לא נוגעות ב-data/ של הפרויקט ולא פונות לרשת
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="tests-data-")
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+os.environ["WARM_UP_ENABLED"] = "false"
+os.environ["PREFETCH_ENABLED"] = "false"
+os.environ["AI_TOOLS_URL"] = "http://127.0.0.1:9/tools.json"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    """השרת המדומה mock_llm_server על פורט פנוי, כשהאפליקציה מחוברת אליו דרך ספק openai.
+    מחזיר את מודול השרת - ההגדרות ב-config והמונים ב-_stats"""
+    import uvicorn
+    import groq_client
+    import mock_llm_server
+    from llm_backend import create_llm_backend
+
+    monkeypatch.setattr(mock_llm_server, "config", mock_llm_server.MockConfig(latency=0.2, jitter=0, answer_tokens=20))
+    monkeypatch.setattr(mock_llm_server, "_stats", dict.fromkeys(mock_llm_server._stats, 0))
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(mock_llm_server.app, log_level="error", lifespan="off"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        threading.Event().wait(0.01)
+    base_url = f"http://127.0.0.1:{sock.getsockname()[1]}/v1"
+    monkeypatch.setattr(groq_client, "llm_backend", create_llm_backend("openai", base_url=base_url))
+    yield mock_llm_server
+    server.should_exit = True
+    thread.join(timeout=5)
+    sock.close()
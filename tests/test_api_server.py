@@ -0,0 +1,124 @@
+import json
+import time
+import asyncio
+
+import httpx
+import pytest
+
+import api_server
+from api_server import ApiState
+
+CALLERS = 6
+
+
+@pytest.fixture
+def api_state(monkeypatch):
+    state = ApiState()
+    monkeypatch.setattr(api_server, "api_state", state)
+    return state
+
+
+def _events(body):
+    """רשימת (event, data) מגוף תשובת SSE"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def _ask_together(bodies, client_ids):
+    transport = httpx.ASGITransport(app=api_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        return await asyncio.gather(*(
+            client.post("/v1/ask", json=body, headers={"X-Client-Id": client_id})
+            for body, client_id in zip(bodies, client_ids)
+        ))
+
+
+def test_identical_streamed_questions_share_one_answer(mock_llm, api_state):
+    body = {"question": "מה אפשר לעשות עם בינה מלאכותית?", "stream": True}
+    responses = asyncio.run(_ask_together([body] * CALLERS, [f"client-{index}" for index in range(CALLERS)]))
+
+    assert [response.status_code for response in responses] == [200] * CALLERS
+    answers = set()
+    for response in responses:
+        events = _events(response.text)
+        assert events[0] == ("tools", {"tools": []})
+        assert events[-1] == ("done", {})
+        answers.add("".join(data["content"] for event, data in events if event == "delta"))
+    assert len(answers) == 1 and answers.pop().strip()
+    assert mock_llm._stats["requests"] == 1
+    assert api_state.stats()["coalesced"] == CALLERS - 1
+    assert api_state.stats()["in_flight_answers"] == 0
+
+
+def test_different_questions_are_answered_separately(mock_llm, api_state):
+    bodies = [{"question": f"שאלה מספר {index}"} for index in range(CALLERS)]
+    responses = asyncio.run(_ask_together(bodies, [f"client-{index}" for index in range(CALLERS)]))
+
+    assert all(response.json()["answer"].strip() for response in responses)
+    assert mock_llm._stats["requests"] == CALLERS
+    assert api_state.stats()["coalesced"] == 0
+
+
+def test_client_over_its_limit_is_rejected(mock_llm, monkeypatch):
+    state = ApiState(max_per_client=1)
+    monkeypatch.setattr(api_server, "api_state", state)
+    bodies = [{"question": f"שאלה מספר {index}"} for index in range(2)]
+    responses = asyncio.run(_ask_together(bodies, ["same-client"] * 2))
+
+    assert sorted(response.status_code for response in responses) == [200, 429]
+    assert state.stats()["open_requests"] == 0
+
+
+class _SlowCache:
+    """מטמון תשובות שכל קריאה וכתיבה אליו איטית, כמו דיסק איטי או מסד נעול"""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def get(self, key):
+        time.sleep(self.delay)
+
+    def put(self, key, value):
+        time.sleep(self.delay)
+
+
+def test_slow_disk_does_not_block_other_streams(mock_llm, api_state, monkeypatch):
+    import groq_client
+
+    monkeypatch.setattr(groq_client, "response_cache", _SlowCache(0.3))
+    monkeypatch.setattr(groq_client, "_response_cache_key", lambda *args: "key")
+    find_tools = api_server.tool_matcher.find_tools
+    monkeypatch.setattr(api_server.tool_matcher, "find_tools", lambda question: time.sleep(0.3) or find_tools(question))
+
+    async def ask_while_ticking():
+        gaps = []
+        task = asyncio.ensure_future(_ask_together([{"question": "שאלה איטית", "stream": True}], ["client"]))
+        while not task.done():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            gaps.append(time.perf_counter() - started)
+        return (await task)[0], max(gaps)
+
+    response, longest_gap = asyncio.run(ask_while_ticking())
+
+    assert response.status_code == 200 and _events(response.text)[-1] == ("done", {})
+    # לולאת האירועים ממשיכה לשרת בקשות אחרות בזמן הקריאות האיטיות
+    assert longest_gap < 0.2
+
+
+def test_startup_warms_the_client_of_the_server_loop(mock_llm, monkeypatch):
+    import groq_client
+    import warm_up
+
+    monkeypatch.setattr(warm_up, "WARM_UP_ENABLED", True)
+    monkeypatch.setattr(api_server, "warm_up_in_background", lambda: False)
+    monkeypatch.setattr(api_server.catalog_refresher, "ensure_catalog", lambda: True)
+
+    async def main():
+        async with api_server.lifespan(api_server.app):
+            return asyncio.get_running_loop() in groq_client.llm_backend._async_clients._clients
+
+    assert asyncio.run(main())
@@ -0,0 +1,95 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from catalog_refresher import CatalogRefresher
+
+TOOLS = [{"name": "Suno", "category": "audio", "description": "כלי ליצירת מוזיקה"}]
+ETAG = '"v1"'
+
+
+class _CatalogHandler(BaseHTTPRequestHandler):
+    """שרת הקטלוג: מחזיר 304 לבקשה עם ה-ETag הנוכחי, ואחרת את הגוף לפי מצב השרת"""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(TOOLS, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Type", "application/json")
+        if server.mode == "truncated":
+            # החיבור נסגר באמצע הגוף - ההורדה חלקית
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        if server.mode == "invalid":
+            body = body[: len(body) // 2]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def catalog_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CatalogHandler)
+    server.requests = []
+    server.mode = "ok"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _refresher(tmp_path, server):
+    return CatalogRefresher(
+        url=f"http://127.0.0.1:{server.server_port}/tools.json", path=str(tmp_path / "tools.json"),
+        config_path=str(tmp_path / "config.json"), interval=0, timeout=5,
+        lock_path=str(tmp_path / "catalog_refresh.lock"),
+    )
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def test_unchanged_catalog_is_not_downloaded_again(tmp_path, catalog_server):
+    refresher = _refresher(tmp_path, catalog_server)
+    assert refresher.refresh()
+    assert _read(tmp_path / "tools.json") == TOOLS
+    assert _read(tmp_path / "config.json")["etag"] == ETAG
+    mtime = (tmp_path / "tools.json").stat().st_mtime_ns
+
+    assert refresher.refresh()
+    assert catalog_server.requests[-1].get("If-None-Match") == ETAG
+    assert (tmp_path / "tools.json").stat().st_mtime_ns == mtime
+    assert refresher.last_error is None
+
+
+@pytest.mark.parametrize("mode", ["truncated", "invalid"])
+def test_partial_download_keeps_the_last_good_catalog(tmp_path, catalog_server, mode):
+    previous = [{"name": "Canva", "category": "design", "description": "עיצוב"}]
+    with open(tmp_path / "tools.json", 'w', encoding='utf-8') as file:
+        json.dump(previous, file, ensure_ascii=False)
+    catalog_server.mode = mode
+
+    refresher = _refresher(tmp_path, catalog_server)
+    assert refresher.refresh()
+
+    assert refresher.last_error is not None
+    assert _read(tmp_path / "tools.json") == previous
+    assert not [path.name for path in tmp_path.iterdir() if path.name.startswith(".tmp-")]
+    # אחרי כישלון לא מנסים שוב מיד
+    assert not refresher.is_due()
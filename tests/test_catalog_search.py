@@ -0,0 +1,56 @@
+import json
+import os
+
+import catalog_search
+from catalog_search import CatalogSearch
+from prompt_store import PromptStore
+from tools_catalog import ToolsCatalog
+
+TOOLS = [
+    {"name": "Suno", "category": "audio", "description": "כלי ליצירת מוזיקה ושירים"},
+    {"name": "Runway", "category": "video", "description": "עריכת וידאו ויצירת סרטונים"},
+    {"name": "Canva", "category": "design", "description": "עיצוב מצגות ופוסטים"},
+]
+
+
+def _search(tmp_path):
+    with open(tmp_path / "tools.json", 'w', encoding='utf-8') as file:
+        json.dump(TOOLS, file, ensure_ascii=False)
+    catalog = ToolsCatalog(str(tmp_path / "tools.json"), check_interval=0)
+    store = PromptStore(str(tmp_path / "tools_prompts.json"))
+    return CatalogSearch(catalog, store, str(tmp_path / "catalog_index.json")), store
+
+
+def _names(results):
+    return [tool["name"] for tool in results]
+
+
+def test_new_prompt_updates_the_index_without_rebuilding(tmp_path, monkeypatch):
+    search, store = _search(tmp_path)
+    assert _names(search.search("מוזיקה")) == ["Suno"]
+
+    builds = []
+    original_build = catalog_search._SearchIndex.build.__func__
+    monkeypatch.setattr(catalog_search._SearchIndex, "build",
+                        classmethod(lambda cls, *args: builds.append(args) or original_build(cls, *args)))
+    index_mtime = os.stat(tmp_path / "catalog_index.json").st_mtime_ns
+
+    store.set("Canva", "מתאים גם ליצירת מוזיקה לסרטונים")
+    assert set(_names(search.search("מוזיקה"))) == {"Suno", "Canva"}
+    assert builds == []
+    assert os.stat(tmp_path / "catalog_index.json").st_mtime_ns == index_mtime
+
+    # אחרי החלפת ההנחיה, המונחים הקודמים שלה כבר לא נמצאים
+    store.set("Canva", "עיצוב גרפי")
+    assert _names(search.search("מוזיקה")) == ["Suno"]
+
+
+def test_incremental_index_matches_a_fresh_build(tmp_path):
+    search, store = _search(tmp_path)
+    search.search("וידאו")
+    store.set("Suno", "יצירת וידאו קליפים למוזיקה")
+    store.set("Runway", "וידאו וידאו וידאו")
+
+    fresh = CatalogSearch(search.catalog, PromptStore(store.path), str(tmp_path / "fresh_index.json"))
+    for query in ("וידאו", "מוזיקה", "עיצוב מצגות"):
+        assert _names(search.search(query)) == _names(fresh.search(query))
@@ -0,0 +1,46 @@
+import groq_client
+from benchmark import StubBackend
+
+TOOLS = [f"Tool {index}" for index in range(groq_client.COMPARISON_MIN_TOOLS)]
+
+
+class RecordingBackend(StubBackend):
+    """מודל מדומה ששומר את ההודעות של כל בקשה"""
+
+    def __init__(self):
+        super().__init__(latency=0, tokens_per_second=0, answer_tokens=3)
+        self.requests = []
+
+    async def complete_async(self, model, messages, temperature, max_tokens):
+        self.requests.append(messages)
+        return await super().complete_async(model, messages, temperature, max_tokens)
+
+
+def test_comparison_mode_needs_comparison_intent():
+    assert not groq_client._use_comparison(TOOLS, "איך מתחילים?")
+    assert groq_client._use_comparison(TOOLS, "מה ההבדל בין הכלים?")
+    assert groq_client._use_comparison(TOOLS, "Which one is better?")
+    assert not groq_client._use_comparison(TOOLS[:2], "מה ההבדל בין הכלים?")
+    # בחירה מפורשת גוברת על הזיהוי מהשאלה
+    assert groq_client._use_comparison(TOOLS[:2], "איך מתחילים?", comparison=True)
+    assert not groq_client._use_comparison(TOOLS, "מה ההבדל בין הכלים?", comparison=False)
+
+
+def test_comparison_map_step_gets_recent_history(monkeypatch):
+    backend = RecordingBackend()
+    monkeypatch.setattr(groq_client, "llm_backend", backend)
+    monkeypatch.setattr(groq_client, "get_or_create_tool_prompt_async", _stored_prompt)
+    history = [
+        {"role": "user", "content": "אני מחפש כלי לעריכת וידאו"},
+        {"role": "assistant", "content": "הנה כמה אפשרויות"},
+    ]
+
+    groq_client.run_async(groq_client._comparison_tool_answer("Tool 0", "ומה לגבי המחיר?", history))
+
+    assert len(backend.requests) == 1
+    contents = [message["content"] for message in backend.requests[0]]
+    assert history[0]["content"] in contents and history[1]["content"] in contents
+
+
+async def _stored_prompt(tool_name, priority=None):
+    return f"הנחיה עבור {tool_name}"
@@ -0,0 +1,53 @@
+import conversation_history
+from conversation_history import (
+    SUMMARY_HEADER,
+    compact_history,
+    estimate_messages_tokens,
+    estimate_tokens,
+    fit_messages,
+)
+
+
+def _history(count, words=30):
+    return [
+        {"role": "user" if index % 2 == 0 else "assistant",
+         "content": f"הודעה מספר {index}. " + " ".join(["מילה"] * words)}
+        for index in range(count)
+    ]
+
+
+def test_short_history_is_sent_as_is():
+    history = _history(4, words=5)
+    messages = fit_messages("הנחיה", history, "שאלה", ["model"])
+    assert messages == [{"role": "system", "content": "הנחיה"}, *history, {"role": "user", "content": "שאלה"}]
+
+
+def test_long_history_fits_the_budget_with_a_summary(monkeypatch):
+    monkeypatch.setattr(conversation_history, "PROMPT_TOKEN_BUDGET", 400)
+    history = _history(40)
+
+    messages = fit_messages("הנחיה", history, "שאלה", ["model"])
+
+    assert estimate_messages_tokens(messages) <= 400
+    assert messages[0]["content"] == "הנחיה" and messages[-1]["content"] == "שאלה"
+    # הודעות אחרונות נשמרות במלואן ובסדר המקורי, והישנות מסוכמות לפניהן
+    summary, recent = messages[1], messages[2:-1]
+    assert summary["role"] == "system" and summary["content"].startswith(SUMMARY_HEADER)
+    assert recent == history[-len(recent):] and recent
+    assert "הודעה מספר 0" not in "".join(message["content"] for message in recent)
+
+
+def test_smallest_model_budget_wins(monkeypatch):
+    monkeypatch.setattr(conversation_history, "_model_budgets", {"small": 200, "large": 8000})
+    history = _history(40)
+
+    assert estimate_messages_tokens(fit_messages("הנחיה", history, "שאלה", ["large", "small"])) <= 200
+    assert estimate_messages_tokens(fit_messages("הנחיה", history, "שאלה", ["large"])) > 200
+
+
+def test_no_room_for_history():
+    assert compact_history(_history(4), 0) == []
+
+
+def test_hebrew_words_cost_more_tokens_than_english():
+    assert estimate_tokens("בינה מלאכותית") > estimate_tokens("ai tools")
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import multiprocessing
+
+import tools_catalog
+from file_utils import FileLock
+from tools_catalog import ToolsCatalog
+
+PROCESSES = 4
+# תהליכים חדשים (ולא fork), כמו כמה עובדים נפרדים שחולקים את ספריית הנתונים
+_context = multiprocessing.get_context("spawn")
+
+
+def _hold_lock(lock_path, log_path, barrier):
+    barrier.wait()
+    with FileLock(lock_path):
+        with open(log_path, 'a', encoding='utf-8') as log:
+            log.write(f"start {os.getpid()}\n")
+            log.flush()
+            time.sleep(0.05)
+            log.write(f"end {os.getpid()}\n")
+
+
+def _crash_while_holding(lock_path):
+    FileLock(lock_path).acquire()
+    os._exit(1)
+
+
+def _load_catalog(path, log_path, barrier, results):
+    compile_catalog = tools_catalog.compile_catalog
+
+    def counting_compile(*args):
+        with open(log_path, 'a', encoding='utf-8') as log:
+            log.write(f"{os.getpid()}\n")
+        return compile_catalog(*args)
+
+    tools_catalog.compile_catalog = counting_compile
+    catalog = ToolsCatalog(path, check_interval=0)
+    barrier.wait()
+    results.put(catalog.names())
+
+
+def _start(target, *args):
+    """הפעלת PROCESSES תהליכים. הקורא שומר הפניה ל-Barrier שהועבר, כי start משחרר את הארגומנטים"""
+    processes = [_context.Process(target=target, args=args) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def _join(processes):
+    for process in processes:
+        process.join(timeout=30)
+    return all(process.exitcode == 0 for process in processes)
+
+
+def test_lock_is_held_by_one_process_at_a_time(tmp_path):
+    log_path = tmp_path / "log.txt"
+    barrier = _context.Barrier(PROCESSES)
+    processes = _start(_hold_lock, str(tmp_path / "test.lock"), str(log_path), barrier)
+
+    assert _join(processes)
+    lines = log_path.read_text(encoding='utf-8').split()
+    pairs = [lines[index:index + 4] for index in range(0, len(lines), 4)]
+    assert len(pairs) == PROCESSES
+    assert all(start == "start" and end == "end" and first == second for start, first, end, second in pairs)
+
+
+def test_lock_is_released_when_the_holder_crashes(tmp_path):
+    lock_path = str(tmp_path / "test.lock")
+    process = _context.Process(target=_crash_while_holding, args=(lock_path,))
+    process.start()
+    process.join(timeout=30)
+
+    assert process.exitcode == 1
+    lock = FileLock(lock_path)
+    assert lock.acquire(timeout=5)
+    lock.release()
+
+
+def test_catalog_is_compiled_once_across_processes(tmp_path):
+    path = tmp_path / "tools.json"
+    tools = [{"name": f"Tool {index}", "category": "misc", "description": "כלי לדוגמה"} for index in range(200)]
+    path.write_text(json.dumps(tools, ensure_ascii=False), encoding='utf-8')
+    log_path = tmp_path / "compiled.txt"
+    results = _context.Queue()
+
+    barrier = _context.Barrier(PROCESSES)
+    processes = _start(_load_catalog, str(path), str(log_path), barrier, results)
+
+    names = [results.get(timeout=30) for _ in range(PROCESSES)]
+    assert _join(processes)
+    assert all(sorted(result) == sorted(tool["name"] for tool in tools) for result in names)
+    assert len(log_path.read_text(encoding='utf-8').split()) == 1
@@ -0,0 +1,66 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import groq_client
+import generate_prompts
+from prompt_store import PromptStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = PromptStore(str(tmp_path / "tools_prompts.json"))
+    monkeypatch.setattr(groq_client, "prompt_store", store)
+    monkeypatch.setattr(generate_prompts, "prompt_store", store)
+    return store
+
+
+def _run_cli(pending):
+    return asyncio.run(generate_prompts.generate_prompts(pending, concurrency=2, requests_per_minute=0))
+
+
+def test_tool_being_generated_by_the_app_is_skipped(mock_llm, store):
+    started = threading.Event()
+    release = threading.Event()
+
+    def app_create():
+        started.set()
+        release.wait(5)
+        return "הנחיה מהאפליקציה"
+
+    with ThreadPoolExecutor(2) as pool:
+        app = pool.submit(store.get_or_create, "Tool A", app_create)
+        assert started.wait(5)
+        cli = pool.submit(_run_cli, [("Tool A", "missing"), ("Tool B", "missing")])
+        # הכלי ממתין למנעול של האפליקציה, ובינתיים ההנחיה לכלי האחר כבר נוצרת
+        time.sleep(0.5)
+        assert mock_llm._stats["requests"] == 1
+        assert not cli.done()
+        release.set()
+        results = cli.result(5)
+
+    assert app.result() == "הנחיה מהאפליקציה"
+    assert [item["tool"] for item in results["skipped"]] == ["Tool A"]
+    assert [item["tool"] for item in results["generated"]] == ["Tool B"]
+    assert store.get("Tool A") == "הנחיה מהאפליקציה"
+    assert mock_llm._stats["requests"] == 1
+
+
+def test_app_waits_for_the_prompt_the_cli_is_generating(mock_llm, store):
+    def app_create():
+        raise AssertionError("האפליקציה לא אמורה ליצור הנחיה שהכלי כבר יוצר")
+
+    with ThreadPoolExecutor(1) as pool:
+        cli = pool.submit(_run_cli, [("Tool A", "missing")])
+        while not mock_llm._stats["requests"]:
+            time.sleep(0.01)
+        # המנעול משתחרר רק אחרי שההנחיה נשמרה, ולכן האפליקציה מוצאת אותה בדיסק
+        prompt = store.get_or_create("Tool A", app_create)
+        results = cli.result(5)
+
+    assert [item["tool"] for item in results["generated"]] == ["Tool A"]
+    assert prompt == store.get("Tool A")
+    assert mock_llm._stats["requests"] == 1
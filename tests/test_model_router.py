@@ -0,0 +1,46 @@
+import pytest
+
+from model_router import (
+    ModelRouter, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_SECONDS, CIRCUIT_MAX_COOLDOWN_SECONDS,
+    MAX_BACKOFF_EXPONENT,
+)
+
+
+class _ServerError(Exception):
+    status_code = 500
+
+
+def test_cooldown_stays_capped_after_many_consecutive_failures():
+    router = ModelRouter(["model-a", "model-b"])
+    for _ in range(5000):
+        router.record_failure("model-a", _ServerError())
+
+    stats = router.stats()["model-a"]
+    assert stats["circuit_open"]
+    assert stats["retry_in"] <= CIRCUIT_MAX_COOLDOWN_SECONDS
+    assert router.candidates() == ["model-b"]
+
+
+def test_success_closes_the_circuit():
+    router = ModelRouter(["model-a"])
+    for _ in range(10):
+        router.record_failure("model-a", _ServerError())
+    router.record_success("model-a", 0.2)
+
+    assert not router.stats()["model-a"]["circuit_open"]
+
+
+def test_cooldown_doubles_after_the_threshold_until_the_cap():
+    router = ModelRouter(["model-a"])
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        router.record_failure("model-a", _ServerError())
+    assert router.stats()["model-a"]["retry_in"] == pytest.approx(CIRCUIT_COOLDOWN_SECONDS, abs=1)
+
+    router.record_failure("model-a", _ServerError())
+    assert router.stats()["model-a"]["retry_in"] == pytest.approx(
+        min(CIRCUIT_MAX_COOLDOWN_SECONDS, 2 * CIRCUIT_COOLDOWN_SECONDS), abs=1)
+
+    # בדיוק בחזקה המקסימלית, ואחריה - זמן ההמתנה נשאר על התקרה
+    for _ in range(MAX_BACKOFF_EXPONENT):
+        router.record_failure("model-a", _ServerError())
+    assert router.stats()["model-a"]["retry_in"] == pytest.approx(CIRCUIT_MAX_COOLDOWN_SECONDS, abs=1)
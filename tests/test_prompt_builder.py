@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+
+import prompt_builder
+from prompt_builder import (
+    GENERAL_SYSTEM_PROMPT,
+    general_user_prompt,
+    multiple_tools_system_prompt,
+    tool_system_prompt,
+)
+from tools_catalog import ToolsCatalog
+
+TOOLS = [
+    {"name": "Canva", "category": "design", "description": "עיצוב   מצגות\n\n\n  ופוסטים"},
+    {"name": "Suno", "category": "audio", "description": "יצירת מוזיקה"},
+]
+
+
+def _write(path, tools):
+    path.write_text(json.dumps(tools, ensure_ascii=False), encoding='utf-8')
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    _write(tmp_path / "tools.json", TOOLS)
+    catalog = ToolsCatalog(str(tmp_path / "tools.json"), check_interval=0)
+    monkeypatch.setattr(prompt_builder, "tools_catalog", catalog)
+    prompt_builder._tool_system_prompt.cache_clear()
+    prompt_builder._multiple_tools_system_prompt.cache_clear()
+    return catalog
+
+
+def test_tool_system_prompt_is_built_once_and_compacted(catalog):
+    prompt = tool_system_prompt("Canva", "  הנחיה\n\n\n\n  ארוכה  ")
+    assert prompt is tool_system_prompt("Canva", "  הנחיה\n\n\n\n  ארוכה  ")
+    assert "עיצוב   מצגות\n\nופוסטים" in prompt
+    assert prompt.endswith("הנחיה\n\nארוכה")
+    assert prompt_builder._tool_system_prompt.cache_info().misses == 1
+
+
+def test_catalog_change_rebuilds_the_prompt(catalog, tmp_path):
+    before = tool_system_prompt("Canva", "הנחיה")
+    _write(tmp_path / "tools.json", [{**TOOLS[0], "description": "כלי עיצוב חדש ומשופר"}, TOOLS[1]])
+    os.utime(tmp_path / "tools.json", ns=(1, 1))
+
+    after = tool_system_prompt("Canva", "הנחיה")
+    assert "כלי עיצוב חדש ומשופר" in after and after != before
+
+
+def test_tool_order_does_not_change_the_multiple_tools_prompt(catalog):
+    prompt = multiple_tools_system_prompt(["Suno", "Canva"])
+    assert prompt == multiple_tools_system_prompt(["Canva", "Suno", "Canva"])
+    assert "יצירת מוזיקה" in prompt
+    assert "יצירת מוזיקה" not in multiple_tools_system_prompt(["Suno", "Canva"], include_details=False)
+
+
+def test_related_tools_go_into_the_question_not_the_prefix():
+    related = [{"name": "Suno", "category": "audio", "description": "מוזיקה", "url": "https://suno.com"}]
+    prompt = general_user_prompt("איך יוצרים שיר?", related)
+    assert prompt.endswith("Question about AI tools: איך יוצרים שיר?")
+    assert "- Suno (audio): מוזיקה https://suno.com" in prompt
+    assert "Suno" not in GENERAL_SYSTEM_PROMPT
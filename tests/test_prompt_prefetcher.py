@@ -0,0 +1,85 @@
+import threading
+from concurrent.futures import Future
+
+import prompt_prefetcher
+from prompt_prefetcher import PromptPrefetcher
+
+
+def _finished_future(coroutine):
+    """כמו run_async_in_background, כשהטעינה מסתיימת עוד לפני שנרשמת פונקציית הסיום"""
+    coroutine.close()
+    future = Future()
+    future.set_result(None)
+    return future
+
+
+def _pending_future(coroutine):
+    """כמו run_async_in_background, כשהטעינה עדיין רצה"""
+    coroutine.close()
+    return Future()
+
+
+def test_prefetch_that_finishes_immediately_does_not_deadlock(monkeypatch):
+    monkeypatch.setattr(prompt_prefetcher, "run_async_in_background", _finished_future)
+    prefetcher = PromptPrefetcher(concurrency=2, enabled=True)
+    monkeypatch.setattr(prefetcher, "_has_capacity", lambda: True)
+
+    worker = threading.Thread(target=prefetcher.update, args=([], ["A", "B", "C", "D"]), daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
+    stats = prefetcher.stats()
+    assert stats["started"] == 4
+    assert stats["pending"] == 0 and stats["running"] == 0
+
+
+def test_deselected_tool_leaves_the_queue(monkeypatch):
+    monkeypatch.setattr(prompt_prefetcher, "run_async_in_background", _pending_future)
+    prefetcher = PromptPrefetcher(concurrency=1, enabled=True)
+    monkeypatch.setattr(prefetcher, "_has_capacity", lambda: True)
+
+    prefetcher.update([], ["A", "B"])
+    assert prefetcher.stats()["started"] == 1
+    assert prefetcher.stats()["pending"] == 1
+
+    prefetcher.update(["A", "B"], ["A"])
+
+    stats = prefetcher.stats()
+    assert stats["started"] == 1
+    assert stats["cancelled"] == 1
+    assert stats["pending"] == 0
+    assert stats["tracked_tools"] == 1
+
+
+def test_tool_selected_by_another_session_stays_queued(monkeypatch):
+    monkeypatch.setattr(prompt_prefetcher, "run_async_in_background", _pending_future)
+    prefetcher = PromptPrefetcher(concurrency=1, enabled=True)
+    monkeypatch.setattr(prefetcher, "_has_capacity", lambda: True)
+
+    prefetcher.update([], ["A", "B"])
+    prefetcher.update([], ["B"])
+    prefetcher.update(["A", "B"], ["A"])
+
+    assert prefetcher.stats()["pending"] == 1
+    assert prefetcher.stats()["cancelled"] == 0
+
+
+def test_finished_and_deselected_tools_are_forgotten(monkeypatch):
+    monkeypatch.setattr(prompt_prefetcher, "run_async_in_background", _finished_future)
+    prefetcher = PromptPrefetcher(concurrency=2, enabled=True)
+    monkeypatch.setattr(prefetcher, "_has_capacity", lambda: True)
+
+    # סשנים שבוחרים כלים ונסגרים בלי לבטל את הבחירה
+    for session in range(50):
+        prefetcher.update([], [f"Tool {session}-{index}" for index in range(3)])
+    assert prefetcher.stats()["tracked_tools"] == 0
+
+    # בחירה ארוכה מהמגבלה - ביטול שלה לא משאיר מונים שליליים או רשומות מיותמות
+    many = [f"Tool {index}" for index in range(prompt_prefetcher.PREFETCH_MAX_TOOLS + 5)]
+    monkeypatch.setattr(prompt_prefetcher, "run_async_in_background", _pending_future)
+    prefetcher.update([], many)
+    prefetcher.update(many, [])
+    stats = prefetcher.stats()
+    assert stats["tracked_tools"] == 0
+    assert stats["pending"] == 0
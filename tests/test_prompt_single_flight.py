@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import groq_client
+from prompt_store import PromptStore
+
+CALLERS = 8
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = PromptStore(str(tmp_path / "tools_prompts.json"))
+    monkeypatch.setattr(groq_client, "prompt_store", store)
+    return store
+
+
+def test_concurrent_callers_generate_one_prompt(mock_llm, store):
+    with ThreadPoolExecutor(CALLERS) as pool:
+        prompts = list(pool.map(groq_client.get_or_create_tool_prompt, ["New Tool"] * CALLERS))
+
+    assert mock_llm._stats["requests"] == 1
+    assert len(set(prompts)) == 1
+    assert store.get("New Tool") == prompts[0]
+
+
+def test_sync_and_async_callers_share_one_generation(mock_llm, store):
+    async def async_callers():
+        import asyncio
+
+        return await asyncio.gather(*(groq_client.get_or_create_tool_prompt_async("New Tool") for _ in range(CALLERS)))
+
+    with ThreadPoolExecutor(CALLERS + 1) as pool:
+        async_prompts = pool.submit(groq_client.run_async, async_callers())
+        sync_prompts = list(pool.map(groq_client.get_or_create_tool_prompt, ["New Tool"] * CALLERS))
+        prompts = sync_prompts + list(async_prompts.result())
+
+    assert mock_llm._stats["requests"] == 1
+    assert len(set(prompts)) == 1
+
+
+def test_failed_generation_is_shared_and_then_retried(tmp_path, monkeypatch):
+    store = PromptStore(str(tmp_path / "tools_prompts.json"))
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    claims = []
+    claim = store._claim
+    monkeypatch.setattr(store, "_claim", lambda tool_name: claims.append(tool_name) or claim(tool_name))
+
+    def failing_create():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise RuntimeError("model failed")
+
+    with ThreadPoolExecutor(CALLERS) as pool:
+        owner = pool.submit(store.get_or_create, "New Tool", failing_create)
+        started.wait(5)
+        waiters = [pool.submit(store.get_or_create, "New Tool", failing_create) for _ in range(CALLERS - 1)]
+        # כל הממתינים נרשמו לפני שהיצירה נכשלת
+        while len(claims) < CALLERS:
+            threading.Event().wait(0.01)
+        release.set()
+        for future in [owner, *waiters]:
+            with pytest.raises(RuntimeError):
+                future.result(timeout=5)
+
+    assert len(calls) == 1
+    assert store.get_or_create("New Tool", lambda: "prompt") == "prompt"
+    assert store.get("New Tool") == "prompt"
+
+
+def test_cancelled_owner_hands_generation_to_a_waiter(tmp_path, monkeypatch):
+    import asyncio
+
+    store = PromptStore(str(tmp_path / "tools_prompts.json"))
+    claims = []
+    claim = store._claim
+    monkeypatch.setattr(store, "_claim", lambda tool_name: claims.append(tool_name) or claim(tool_name))
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    generating = threading.Event()
+
+    async def endless_create():
+        generating.set()
+        await asyncio.sleep(60)
+
+    owner = asyncio.run_coroutine_threadsafe(store.get_or_create_async("New Tool", endless_create), loop)
+    generating.wait(5)
+    with ThreadPoolExecutor(1) as pool:
+        waiter = pool.submit(store.get_or_create, "New Tool", lambda: "prompt")
+        while len(claims) < 2:
+            threading.Event().wait(0.01)
+        # הבעלים בוטל (למשל הלקוח התנתק) - הממתין לא מקבל את הביטול, אלא יוצר את ההנחיה בעצמו
+        owner.cancel()
+        assert waiter.result(timeout=5) == "prompt"
+
+    loop.call_soon_threadsafe(loop.stop)
+    assert store.get("New Tool") == "prompt"
+    assert not store._inflight
+
+
+def test_different_tools_are_generated_concurrently(tmp_path):
+    store = PromptStore(str(tmp_path / "tools_prompts.json"))
+    second_done = threading.Event()
+
+    def slow_create():
+        # היצירה הראשונה מסתיימת רק אחרי שהשנייה הסתיימה - מנעול משותף היה תוקע את שתיהן
+        assert second_done.wait(5)
+        return "first prompt"
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(store.get_or_create, "First Tool", slow_create)
+        # שני שמות שבחלוקה הקודמת ל-64 קבצי נעילה נפלו על אותו קובץ
+        second = pool.submit(store.get_or_create, "Tool 34", lambda: "second prompt")
+        assert second.result(timeout=5) == "second prompt"
+        second_done.set()
+        assert first.result(timeout=5) == "first prompt"
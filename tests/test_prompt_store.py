@@ -0,0 +1,23 @@
+import json
+
+from prompt_store import PromptStore
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def test_set_many_merges_with_prompts_saved_by_another_process(tmp_path):
+    path = str(tmp_path / "tools_prompts.json")
+    store = PromptStore(path)
+    other = PromptStore(path)
+    store.set("A", "prompt A")
+    other.set_many({"B": "prompt B", "C": "prompt C"}, {"B": "source B"})
+
+    store.set_many({"D": "prompt D"})
+
+    assert _read(path) == {"A": "prompt A", "B": "prompt B", "C": "prompt C", "D": "prompt D"}
+    assert store.source("B") == "source B"
+    assert store.source("C") is None
+    assert set(_read(store.meta_path)) == {"B"}
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, RateLimitExceeded, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+
+class _Clock:
+    """שעון מדומה במקום time.monotonic, כדי לבדוק מילוי של הדלי בלי להמתין בפועל"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_refills_at_the_configured_rate(clock):
+    limiter = RateLimiter(rpm=60, tpm=0, model_limits={})
+    for _ in range(60):
+        limiter.acquire(["model-a"], 10)
+
+    # הדלי ריק - בקשה נוספת תצטרך לחכות שנייה אחת (קצב של בקשה לשנייה)
+    assert limiter.estimated_wait(["model-a"]) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert limiter.estimated_wait(["model-a"]) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.estimated_wait(["model-a"]) == 0.0
+    assert limiter.acquire(["model-a"], 10).model == "model-a"
+
+    # המילוי לא עובר את התקרה של דקת מכסה אחת
+    clock.now += 3600
+    limiter.estimated_wait(["model-a"])
+    assert limiter.stats()["models"]["model-a"]["available_requests"] == 60
+
+
+def test_settle_returns_unused_tokens_to_the_bucket(clock):
+    limiter = RateLimiter(rpm=0, tpm=1000, model_limits={})
+    permit = limiter.acquire(["model-a"], 800)
+    assert limiter.stats()["models"]["model-a"]["available_tokens"] == 200
+
+    permit.settle(300)
+    assert limiter.stats()["models"]["model-a"]["available_tokens"] == 700
+
+
+def test_long_wait_is_shed_instead_of_queued(clock):
+    limiter = RateLimiter(rpm=60, tpm=0, model_limits={}, max_wait=5)
+    for _ in range(60):
+        limiter.acquire(["model-a"], 10)
+    # חמש בקשות ממתינות בתור - השישית הייתה ממתינה שש שניות
+    for _ in range(5):
+        limiter._enqueue(["model-a"], 10, PRIORITY_INTERACTIVE)
+
+    with pytest.raises(RateLimitExceeded) as error:
+        limiter.acquire(["model-a"], 10)
+    assert error.value.retry_after > 5
+    assert limiter.stats()["shed"] == 1
+
+
+def test_falls_back_to_the_model_that_is_available_first(clock):
+    limiter = RateLimiter(rpm=60, tpm=0, model_limits={"model-b": (120, 0)})
+    for _ in range(60):
+        limiter.acquire(["model-a"], 10)
+
+    assert limiter.acquire(["model-a", "model-b"], 10).model == "model-b"
+
+
+def test_interactive_request_overtakes_queued_background_work():
+    # עשר בקשות לשנייה - כל בקשה בתור ממתינה עשירית שנייה
+    limiter = RateLimiter(rpm=600, tpm=0, model_limits={})
+    for _ in range(600):
+        limiter.acquire(["model-a"], 10)
+    admitted = []
+
+    async def request(name, priority):
+        await limiter.acquire_async(["model-a"], 10, priority)
+        admitted.append(name)
+
+    async def main():
+        background = [asyncio.create_task(request(f"background-{i}", PRIORITY_BACKGROUND)) for i in range(2)]
+        # הבקשות ברקע כבר ממתינות בתור כשהשאלה של המשתמש מגיעה
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(request("interactive", PRIORITY_INTERACTIVE))
+        await asyncio.gather(*background, interactive)
+
+    asyncio.run(main())
+
+    assert admitted == ["interactive", "background-0", "background-1"]
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_cancelled_waiter_frees_its_place_in_the_queue():
+    limiter = RateLimiter(rpm=600, tpm=0, model_limits={})
+    for _ in range(600):
+        limiter.acquire(["model-a"], 10)
+
+    async def main():
+        waiter = asyncio.create_task(limiter.acquire_async(["model-a"], 10))
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["waiting"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+
+    stats = limiter.stats()
+    assert stats["waiting"] == 0
+    assert stats["cancelled"] == 1
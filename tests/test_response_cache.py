@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, normalize_question
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """שעון שהבדיקה מזיזה בעצמה, במקום להמתין לפקיעת התוקף"""
+    now = [1000.0]
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def _cache(tmp_path, **kwargs):
+    return ResponseCache(str(tmp_path / "cache.sqlite3"), enabled=True, **kwargs)
+
+
+def test_answers_expire_after_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, ttl=60)
+    cache.put("key", "תשובה")
+    clock[0] += 59
+    assert cache.get("key") == "תשובה"
+    clock[0] += 2
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_read_answer_is_evicted_first(tmp_path, clock):
+    answer = "x" * 100
+    cache = _cache(tmp_path, max_bytes=250)
+    cache.put("old", answer)
+    clock[0] += 1
+    cache.put("read", answer)
+    clock[0] += 1
+    # קריאה מרעננת את התשובה, כך שהיא לא הראשונה בתור לפינוי
+    assert cache.get("old") == answer
+    clock[0] += 1
+    cache.put("new", answer)
+
+    assert cache.get("read") is None
+    assert cache.get("old") == answer and cache.get("new") == answer
+    assert cache.stats()["bytes"] <= 250
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), enabled=False)
+    cache.put("key", "תשובה")
+    assert cache.get("key") is None
+    assert not (tmp_path / "cache.sqlite3").exists()
+
+
+@pytest.mark.parametrize("question", ["מה זה Canva?", "  מה   זה canva ", "מה זה CANVA!?", "מה זה Ｃａｎｖａ."])
+def test_equivalent_questions_share_a_key(question):
+    assert normalize_question(question) == normalize_question("מה זה canva")
+
+
+def test_key_changes_with_history_and_sources(tmp_path):
+    cache = _cache(tmp_path)
+    key = cache.make_key("tool", ["Canva"], "מה זה?", [], ["model"], 0.7, {"prompts": "a"})
+
+    assert key == cache.make_key("tool", ["Canva"], "מה זה", None, ["model"], 0.7, {"prompts": "a"})
+    assert key != cache.make_key("tool", ["Canva"], "מה זה?", [{"role": "user", "content": "היי"}], ["model"], 0.7, {"prompts": "a"})
+    assert key != cache.make_key("tool", ["Canva"], "מה זה?", [], ["model"], 0.7, {"prompts": "b"})
+    assert key != cache.make_key("tool", ["Canva"], "מה זה?", [], ["model"], 0.1, {"prompts": "a"})
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+import groq_client
+from benchmark import StubBackend
+from model_router import ModelRouter, CIRCUIT_FAILURE_THRESHOLD
+
+MESSAGES = [{"role": "user", "content": "מה זה Canva?"}]
+
+
+class _ConnectionDropped(Exception):
+    """שגיאת רשת בלי קוד HTTP, כמו חיבור שנסגר באמצע ההזרמה"""
+
+
+class DroppingBackend(StubBackend):
+    """מודל מדומה שמתחיל להזרים ונופל אחרי מספר טוקנים"""
+
+    def __init__(self, tokens_before_failure=2):
+        super().__init__(latency=0, tokens_per_second=0, answer_tokens=10)
+        self.tokens_before_failure = tokens_before_failure
+
+    def stream(self, model, messages, temperature, max_tokens):
+        for index, token in enumerate(super().stream(model, messages, temperature, max_tokens)):
+            if index == self.tokens_before_failure:
+                raise _ConnectionDropped("connection reset")
+            yield token
+
+    async def stream_async(self, model, messages, temperature, max_tokens):
+        index = 0
+        async for token in super().stream_async(model, messages, temperature, max_tokens):
+            if index == self.tokens_before_failure:
+                raise _ConnectionDropped("connection reset")
+            index += 1
+            yield token
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = ModelRouter(["model-a", "model-b"])
+    monkeypatch.setattr(groq_client, "model_router", router)
+    return router
+
+
+def _stream(messages):
+    """הרצת ההזרמה הסינכרונית עד סופה. מחזיר את הקטעים ואת ערך ההחזרה של המחולל"""
+    chunks = []
+    stream = groq_client._chat_completion_stream(messages, 0.5)
+    while True:
+        try:
+            chunks.append(next(stream))
+        except StopIteration as stop:
+            return chunks, stop.value
+
+
+def _stream_async(messages):
+    async def consume():
+        result = {}
+        chunks = [chunk async for chunk in groq_client._chat_completion_stream_async(messages, 0.5, result)]
+        return chunks, result["completed"]
+
+    return asyncio.run(consume())
+
+
+@pytest.mark.parametrize("stream", [_stream, _stream_async], ids=["sync", "async"])
+def test_stream_that_drops_midway_counts_as_a_failure(monkeypatch, router, stream):
+    monkeypatch.setattr(groq_client, "llm_backend", DroppingBackend())
+
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        chunks, completed = stream(MESSAGES)
+        # החלק שכבר הוזרם נשאר אצל המשתמש, ואין מעבר למודל אחר באמצע התשובה
+        assert len(chunks) == 2
+        assert not completed
+
+    stats = router.stats()["model-a"]
+    assert stats["successes"] == 0
+    assert stats["failures"] == CIRCUIT_FAILURE_THRESHOLD
+    assert stats["circuit_open"]
+    assert router.candidates() == ["model-b"]
+
+
+@pytest.mark.parametrize("stream", [_stream, _stream_async], ids=["sync", "async"])
+def test_completed_stream_counts_as_a_success(monkeypatch, router, stream):
+    monkeypatch.setattr(groq_client, "llm_backend", DroppingBackend(tokens_before_failure=100))
+
+    chunks, completed = stream(MESSAGES)
+
+    assert len(chunks) == 10
+    assert completed
+    stats = router.stats()["model-a"]
+    assert stats["successes"] == 1
+    assert stats["failures"] == 0
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from tool_matcher import ToolMatcher, _Automaton
+from tools_catalog import ToolsCatalog
+
+TOOLS = [
+    {"name": "GitHub Copilot", "category": "code", "description": "השלמת קוד"},
+    {"name": "Copilot", "category": "assistant", "description": "עוזר של מיקרוסופט"},
+    {"name": "Canva", "category": "design", "description": "עיצוב"},
+    {"name": "ChatGPT", "category": "chat", "description": "צ'אט"},
+    {"name": "Runway", "category": "video", "description": "וידאו"},
+]
+
+
+@pytest.fixture
+def matcher(tmp_path):
+    (tmp_path / "tools.json").write_text(json.dumps(TOOLS, ensure_ascii=False), encoding='utf-8')
+    (tmp_path / "aliases.json").write_text(json.dumps({"Canva": ["קנבה"]}, ensure_ascii=False), encoding='utf-8')
+    catalog = ToolsCatalog(str(tmp_path / "tools.json"), check_interval=0)
+    return ToolMatcher(catalog, str(tmp_path / "aliases.json"))
+
+
+def test_automaton_reports_overlapping_matches():
+    automaton = _Automaton({"he": "A", "she": "B", "hers": "C"})
+    assert sorted(automaton.find("ushers")) == [(1, 4, "B"), (2, 4, "A"), (2, 6, "C")]
+
+
+def test_longest_match_wins_over_a_nested_name(matcher):
+    assert matcher.find_tools("איך עובד GitHub Copilot?") == ["GitHub Copilot"]
+    assert matcher.find_tools("ומה עם Copilot לבד") == ["Copilot"]
+
+
+def test_hebrew_prefix_and_alias(matcher):
+    assert matcher.find_tools("איך מעצבים בקנבה ושולחים לChatGPT?") == ["Canva", "ChatGPT"]
+    # אותיות גדולות וסימני פיסוק לא משנים את הזיהוי, ויותר מאות שימוש אחת לא מזוהה כשם
+    assert matcher.find_tools("CHATGPT!") == ["ChatGPT"]
+    assert matcher.find_tools("ולקנבה") == []
+
+
+def test_partial_words_and_ambiguous_names(matcher):
+    assert matcher.find_tools("Canvas is not a tool here") == []
+    assert matcher.find_tools("the runway was long") == []
+    assert matcher.find_tools("השוואה ל-Runway") == ["Runway"]
+
+
+def test_aliases_file_change_rebuilds_the_automaton(matcher, tmp_path):
+    assert matcher.find_tools("מה זה צ'אטי?") == []
+    (tmp_path / "aliases.json").write_text(json.dumps({"ChatGPT": ["צאטי"]}, ensure_ascii=False), encoding='utf-8')
+    assert matcher.find_tools("מה זה צאטי?") == ["ChatGPT"]
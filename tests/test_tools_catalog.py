@@ -0,0 +1,83 @@
+import os
+import json
+
+import pytest
+
+import tools_catalog
+from tools_catalog import ToolsCatalog, compiled_catalog_path
+
+
+def _write_tools(path, tools):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(tools, file, ensure_ascii=False)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = str(tmp_path / "tools.json")
+    _write_tools(path, [
+        {"name": "ChatGPT", "category": "צ'אט", "description": "הראשון", "logo": "chatgpt.png"},
+        {"name": "Canva", "category": "עיצוב", "description": "עיצוב גרפי"},
+        {"name": "ChatGPT", "category": "צ'אט", "description": "כפילות"},
+        {"name": "Claude AI", "category": "צ'אט", "description": "עוזר"},
+    ])
+    return ToolsCatalog(path, check_interval=0)
+
+
+@pytest.fixture
+def compilations(monkeypatch):
+    """מונה ההידורים של הקטלוג, דרך עטיפה של compile_catalog"""
+    calls = []
+    compile_catalog = tools_catalog.compile_catalog
+
+    def counting_compile(*args):
+        calls.append(args)
+        return compile_catalog(*args)
+
+    monkeypatch.setattr(tools_catalog, "compile_catalog", counting_compile)
+    return calls
+
+
+def test_catalog_is_recompiled_only_when_the_file_changes(catalog, compilations):
+    assert catalog.names() == ["ChatGPT", "Canva", "Claude AI"]
+    catalog.get("Canva")
+    catalog.categories()
+    assert len(compilations) == 1
+
+    # מופע חדש (למשל אחרי הפעלה מחדש) פותח את הקטלוג שכבר הודר בלי להדר שוב
+    assert ToolsCatalog(catalog.path, check_interval=0).names() == ["ChatGPT", "Canva", "Claude AI"]
+    assert len(compilations) == 1
+
+    _write_tools(catalog.path, [{"name": "Midjourney", "category": "תמונות"}])
+    os.utime(catalog.path, ns=(1, 1))
+    assert catalog.names() == ["Midjourney"]
+    assert len(compilations) == 2
+
+
+def test_duplicate_names_resolve_to_the_first_tool(catalog):
+    assert catalog.get("ChatGPT")["description"] == "הראשון"
+    assert [tool["description"] for tool in catalog.by_category("צ'אט")] == ["הראשון", "כפילות", "עוזר"]
+    # כל הרשומות נשמרות לפי הסדר בקובץ, בלי שדות התצוגה
+    assert len(catalog.tools()) == 4
+    assert "logo" not in catalog.get("ChatGPT")
+
+
+@pytest.mark.parametrize("name", ["chatgpt", "Chat GPT", "CHAT-GPT", "ＣｈａｔＧＰＴ"])
+def test_lookup_falls_back_to_the_normalized_name(catalog, name):
+    assert catalog.get(name)["description"] == "הראשון"
+
+
+def test_get_many_keeps_the_requested_order_and_skips_unknown_tools(catalog):
+    tools = catalog.get_many(["claude-ai", "לא קיים", "Canva"])
+    assert [tool["name"] for tool in tools] == ["Claude AI", "Canva"]
+
+
+def test_broken_file_keeps_serving_the_last_good_catalog(catalog):
+    assert catalog.get("Canva") is not None
+
+    with open(catalog.path, "w", encoding="utf-8") as file:
+        file.write('[{"name": "Canva"')
+    os.utime(catalog.path, ns=(1, 1))
+
+    assert catalog.names() == ["ChatGPT", "Canva", "Claude AI"]
+    assert os.path.exists(compiled_catalog_path(catalog.path))
@@ -0,0 +1,55 @@
+import os
+
+from transcript_store import Transcript
+
+
+def _messages(count, start=0):
+    return [{"role": "user" if index % 2 else "assistant", "content": f"הודעה {index}"} for index in range(start, start + count)]
+
+
+def _transcript(tmp_path, messages, max_messages=3):
+    transcript = Transcript("session", max_messages=max_messages, directory=str(tmp_path))
+    for message in messages:
+        transcript.append(message)
+    return transcript
+
+
+def test_spilled_messages_are_paged_back_in_order(tmp_path):
+    messages = _messages(10)
+    transcript = _transcript(tmp_path, messages)
+
+    assert len(transcript) == 10
+    assert transcript.recent() == messages[-3:]
+    assert transcript.window(2) == messages[-2:]
+    assert transcript.window(5) == messages[-5:]
+    assert transcript.window(100) == messages
+    # הודעות עם תווים מיוחדים ושורות חדשות נשמרות כמו שהן
+    tricky = {"role": "assistant", "content": "שורה 1\nשורה 2 \"ציטוט\" 👋"}
+    transcript.append(tricky)
+    for message in _messages(3, start=10):
+        transcript.append(message)
+    assert transcript.window(100) == messages + [tricky] + _messages(3, start=10)
+
+
+def test_deleted_file_starts_a_new_spill_file(tmp_path):
+    messages = _messages(6)
+    transcript = _transcript(tmp_path, messages)
+    os.remove(transcript.path)
+
+    later = _messages(4, start=6)
+    for message in later:
+        transcript.append(message)
+
+    # ההודעות שנמחקו עם הקובץ לא מוצגות, וכל השאר נקראות מהמיקומים הנכונים
+    assert transcript.window(100) == messages[-3:] + later
+    assert len(transcript) == 7
+
+
+def test_replaced_file_is_not_parsed_at_wrong_offsets(tmp_path):
+    messages = _messages(8)
+    transcript = _transcript(tmp_path, messages)
+    with open(transcript.path, 'wb') as file:
+        file.write(b'["user", "\xd7\x90"]\n{not json')
+
+    assert transcript.window(100) == messages[-3:]
+    assert len(transcript) == 3
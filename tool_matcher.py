@@ -0,0 +1,177 @@
+import os
+import json
+import threading
+import unicodedata
+from collections import deque
+
+from tools_catalog import tools_catalog
+
+# קובץ אופציונלי של כינויים לכלים (למשל איות בעברית), בפורמט {"Canva": ["קנבה"]}
+TOOL_ALIASES_FILE = os.path.join("data", "tool_aliases.json")
+# שמות כלים שהם גם מילים נפוצות באנגלית - מזוהים רק כשהם כתובים באות גדולה, כשם פרטי
+AMBIGUOUS_NAMES = {
+    "play", "make", "together", "vibe", "kits", "replay", "weights", "captions", "notion",
+    "bubble", "glitch", "gamma", "napkin", "runway", "fal", "luma", "hume", "krea",
+}
+
+_FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+# אותיות שימוש שיכולות להופיע צמודות לשם כלי ("בקנבה", "לChatGPT")
+_HEBREW_PREFIXES = "והבלמשכ"
+
+
+def _normalize(text):
+    """נרמול טקסט לזיהוי: אותיות קטנות, אותיות סופיות אחידות וכל תו שאינו אות או ספרה כרווח יחיד.
+    מחזיר את הטקסט המנורמל ואת המיקום המקורי של כל תו בו"""
+    text = unicodedata.normalize("NFKC", text or "")
+    chars = []
+    positions = []
+    for index, ch in enumerate(text):
+        if ch.isalnum():
+            lower = ch.lower()
+            chars.append(lower if len(lower) == 1 else ch)
+            positions.append(index)
+        elif chars and chars[-1] != " ":
+            chars.append(" ")
+            positions.append(index)
+    normalized = "".join(chars).translate(_FINAL_LETTERS)
+    return normalized, positions, text
+
+
+def _normalize_pattern(name):
+    return _normalize(name)[0].strip()
+
+
+class _Automaton:
+    """אוטומט Aho-Corasick מעל כל השמות והכינויים - סריקה אחת של הטקסט בזמן ליניארי באורכו"""
+
+    def __init__(self, patterns):
+        # patterns: מיפוי מתבנית מנורמלת לשם הכלי
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for pattern, tool_name in patterns.items():
+            state = 0
+            for ch in pattern:
+                next_state = self.goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][ch] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                state = next_state
+            self.outputs[state].append((len(pattern), tool_name))
+
+        # קישורי הכישלון נבנים לפי רמות (BFS), כך שהקישור של כל מצב כבר מוכן כשמגיעים לילדיו
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                if state:
+                    self.fail[next_state] = self.goto[fallback].get(ch, 0)
+                self.outputs[next_state].extend(self.outputs[self.fail[next_state]])
+
+    def find(self, text):
+        """כל ההתאמות בטקסט, כזוגות (התחלה, סוף, שם הכלי)"""
+        matches = []
+        state = 0
+        for end, ch in enumerate(text, 1):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, tool_name in self.outputs[state]:
+                matches.append((end - length, end, tool_name))
+        return matches
+
+
+class ToolMatcher:
+    """זיהוי שמות כלים מהקטלוג שמוזכרים בשאלת המשתמש, עם אוטומט שנבנה מחדש רק כשהקטלוג
+    או קובץ הכינויים משתנים"""
+
+    def __init__(self, catalog=tools_catalog, aliases_path=TOOL_ALIASES_FILE):
+        self.catalog = catalog
+        self.aliases_path = aliases_path
+        self._lock = threading.Lock()
+        self._version = None
+        self._automaton = None
+
+    def _aliases_version(self):
+        try:
+            stat = os.stat(self.aliases_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load_aliases(self):
+        try:
+            with open(self.aliases_path, 'r', encoding='utf-8') as file:
+                aliases = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return aliases if isinstance(aliases, dict) else {}
+
+    def _build(self):
+        """בניית האוטומט מכל שמות הכלים, הכינויים שלהם (בקטלוג ובקובץ הכינויים) ושמות בלי רווחים"""
+        file_aliases = self._load_aliases()
+        patterns = {}
+        for tool in self.catalog.iter_tools():
+            name = tool.get("name")
+            if not name:
+                continue
+            names = [name] + list(tool.get("aliases") or []) + list(file_aliases.get(name) or [])
+            for alias in names:
+                pattern = _normalize_pattern(alias)
+                if len(pattern) < 2:
+                    continue
+                variants = {pattern, pattern.replace(" ", "")}
+                for variant in variants:
+                    # במקרה של כפילות, הכלי הראשון בקטלוג הוא הקובע
+                    patterns.setdefault(variant, name)
+        return _Automaton(patterns)
+
+    def _load(self):
+        version = (self.catalog.version, self._aliases_version())
+        if version == self._version:
+            return self._automaton
+        with self._lock:
+            if version != self._version:
+                self._automaton = self._build()
+                self._version = version
+            return self._automaton
+
+    def find_tools(self, text):
+        """שמות הכלים שמוזכרים בטקסט, לפי סדר ההופעה וללא כפילויות"""
+        automaton = self._load()
+        normalized, positions, original = _normalize(text)
+        matches = automaton.find(normalized)
+        # ההתאמה הארוכה ביותר מנצחת ("GitHub Copilot" ולא "Copilot"), והתאמות לא חופפות
+        matches.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+
+        found = []
+        covered_until = 0
+        for start, end, tool_name in matches:
+            if start < covered_until or not self._at_word_boundary(normalized, start, end):
+                continue
+            if normalized[start:end] in AMBIGUOUS_NAMES and not original[positions[start]].isupper():
+                continue
+            covered_until = end
+            if tool_name not in found:
+                found.append(tool_name)
+        return found
+
+    @staticmethod
+    def _at_word_boundary(text, start, end):
+        """ההתאמה היא מילה שלמה - מותרת אות שימוש אחת צמודה לפניה"""
+        if end < len(text) and text[end] != " ":
+            return False
+        if start == 0 or text[start - 1] == " ":
+            return True
+        return text[start - 1] in _HEBREW_PREFIXES and (start == 1 or text[start - 2] == " ")
+
+
+# מופע משותף לכל התהליך
+tool_matcher = ToolMatcher()
@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import logging
+import threading
+import unicodedata
+
+from tracing import tracer, get_logger, log_event
+from file_utils import DATA_DIR, FileLock
+
+# נתיב לקובץ רשימת הכלים
+TOOLS_FILE = os.path.join(DATA_DIR, "tools.json")
+# כל כמה זמן (בשניות) לכל היותר בודקים בדיסק אם הקובץ השתנה
+CATALOG_CHECK_INTERVAL_SECONDS = float(os.getenv("CATALOG_CHECK_INTERVAL_SECONDS", 2))
+# שדות תצוגה של אתר הכלים שהצ'אטבוט לא משתמש בהם, ולכן לא נשמרים בקטלוג המהודר
+DROPPED_FIELDS = ("logo", "icon", "isNew", "isFeatured")
+# גרסת המבנה של הקטלוג המהודר - שינוי שלה גורם להידור מחדש
+CATALOG_SCHEMA_VERSION = 1
+
+logger = get_logger("tools_catalog")
+
+
+def normalize_tool_name(name):
+    """נרמול שם כלי להשוואה - אותיות קטנות וללא רווחים או סימני פיסוק"""
+    name = unicodedata.normalize("NFKC", name or "").casefold()
+    return "".join(ch for ch in name if ch.isalnum())
+
+
+def compiled_catalog_path(path):
+    """נתיב הקטלוג המהודר (SQLite) שליד קובץ ה-JSON, למשל data/tools.sqlite3"""
+    return os.path.splitext(path)[0] + ".sqlite3"
+
+
+def _read_tools(path):
+    """קריאת רשימת הכלים מקובץ ה-JSON (רשימה, או אובייקט עם המפתח tools)"""
+    with open(path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        data = data.get("tools", [])
+    if not isinstance(data, list):
+        data = []
+    return [tool for tool in data if isinstance(tool, dict)]
+
+
+def compile_catalog(path, db_path, version):
+    """הידור קובץ ה-JSON לקטלוג SQLite: שורה לכל כלי עם עמודות מאונדקסות לשם, לשם המנורמל
+    ולקטגוריה, ושאר השדות כ-JSON שמפוענח רק כשהכלי עצמו נדרש. נכתב לקובץ זמני ומוחלף
+    באטומיות, כך שתהליכים שקוראים את הגרסה הקודמת לא רואים קובץ חלקי"""
+    tools = _read_tools(path)
+    directory = os.path.dirname(db_path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".sqlite3")
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(temp_path)
+        try:
+            connection.executescript(
+                """CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                CREATE TABLE tools (
+                    position INTEGER PRIMARY KEY,
+                    name TEXT,
+                    normalized TEXT,
+                    category TEXT NOT NULL,
+                    is_first INTEGER NOT NULL,
+                    data TEXT NOT NULL
+                );"""
+            )
+            seen = set()
+            rows = []
+            for position, tool in enumerate(tools):
+                name = tool.get("name")
+                # במקרה של שמות כפולים, הכלי הראשון בקובץ הוא הקובע (כמו בחיפוש הליניארי הקודם)
+                is_first = bool(name) and name not in seen
+                if name:
+                    seen.add(name)
+                record = {key: value for key, value in tool.items() if key not in DROPPED_FIELDS}
+                rows.append((
+                    position, name, normalize_tool_name(name) if name else None,
+                    str(tool.get("category", "") or ""), int(is_first),
+                    json.dumps(record, ensure_ascii=False),
+                ))
+            connection.executemany("INSERT INTO tools VALUES (?, ?, ?, ?, ?, ?)", rows)
+            connection.executescript(
+                """CREATE INDEX tools_name ON tools (name);
+                CREATE INDEX tools_normalized ON tools (normalized);
+                CREATE INDEX tools_category ON tools (category, position);"""
+            )
+            connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("schema", str(CATALOG_SCHEMA_VERSION)),
+                ("source_version", json.dumps(list(version))),
+                ("tools", str(len(rows))),
+            ])
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(temp_path, db_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return len(tools)
+
+
+def _compiled_version(db_path):
+    """גרסת קובץ ה-JSON שממנה הודר הקטלוג, או None אם אין קטלוג מהודר תקין"""
+    try:
+        connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        meta = dict(connection.execute("SELECT key, value FROM meta").fetchall())
+    except sqlite3.Error:
+        return None
+    finally:
+        connection.close()
+    if meta.get("schema") != str(CATALOG_SCHEMA_VERSION):
+        return None
+    return tuple(json.loads(meta.get("source_version", "null")) or ()) or None
+
+
+class _CatalogSnapshot:
+    """תמונת מצב של גרסה אחת של הקטלוג המהודר. רק הרשומות שנדרשות נקראות מהדיסק ומפוענחות,
+    כך שהזיכרון לא תלוי בגודל הקטלוג"""
+
+    def __init__(self, version, db_path=None):
+        self.version = version
+        self._lock = threading.Lock()
+        self._connection = None
+        self._names = None
+        if db_path is not None:
+            # הקובץ לא משתנה במקום (הידור חדש מחליף אותו), ולכן החיבור ממשיך לקרוא את הגרסה הזו
+            self._connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+    def query(self, sql, parameters=()):
+        if self._connection is None:
+            return []
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def records(self, sql, parameters=()):
+        return [json.loads(row[0]) for row in self.query(sql, parameters)]
+
+    def names(self):
+        """שמות הכלים - נקראים פעם אחת לכל גרסה, ורק כשמבקשים אותם (למשל לרשימת הבחירה)"""
+        if self._names is None:
+            self._names = [row[0] for row in self.query("SELECT name FROM tools WHERE is_first ORDER BY position")]
+        return self._names
+
+
+class ToolsCatalog:
+    """קטלוג הכלים, מהודר מקובץ ה-JSON לקובץ SQLite שנקרא לפי הצורך. ההידור מתבצע מחדש
+    רק כשקובץ ה-JSON משתנה בדיסק, וקטלוג שכבר הודר נפתח בלי לפענח את ה-JSON כלל"""
+
+    def __init__(self, path=TOOLS_FILE, check_interval=CATALOG_CHECK_INTERVAL_SECONDS, db_path=None):
+        self.path = path
+        self.db_path = db_path or compiled_catalog_path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = _CatalogSnapshot(None)
+        self._checked_at = None
+
+    def _file_version(self):
+        """גרסת הקובץ לפי זמן שינוי וגודל, או None אם הקובץ לא קיים"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def invalidate(self):
+        """בדיקה מחדש של הקובץ בגישה הבאה, למשל מיד אחרי שהקטלוג הורד מחדש"""
+        self._checked_at = None
+
+    def _load(self):
+        """החזרת תמונת המצב העדכנית, עם הידור מחדש רק אם הקובץ השתנה"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        checked_at = self._checked_at
+        if checked_at is not None and now - checked_at < self.check_interval:
+            # נבדק לאחרונה - גישה לקטלוג לא נוגעת בדיסק כלל
+            return snapshot
+        self._checked_at = now
+
+        version = self._file_version()
+        if version == snapshot.version:
+            return snapshot
+
+        with self._lock:
+            # ייתכן שתהליכון אחר כבר טען את הגרסה החדשה בזמן שחיכינו למנעול
+            snapshot = self._snapshot
+            if version == snapshot.version:
+                return snapshot
+
+            if version is None:
+                self._snapshot = _CatalogSnapshot(None)
+                return self._snapshot
+
+            with tracer.span("catalog.load", path=self.path) as span:
+                try:
+                    # כמה תהליכים שחולקים את ספריית הנתונים מהדרים כל גרסה פעם אחת בלבד -
+                    # מי שממתין למנעול מוצא אחר כך את הקטלוג שכבר הודר
+                    with FileLock(self.db_path + ".lock"):
+                        recompile = _compiled_version(self.db_path) != version
+                        span.set(recompiled=recompile)
+                        if recompile:
+                            span.set(tools=compile_catalog(self.path, self.db_path, version))
+                    new_snapshot = _CatalogSnapshot(version, self.db_path)
+                except (OSError, ValueError, sqlite3.Error) as e:
+                    # קובץ חלקי (למשל באמצע הורדה) - ממשיכים להגיש את הגרסה האחרונה התקינה
+                    span.record_error(e)
+                    log_event(logger, logging.WARNING, f"שגיאה בטעינת קובץ הכלים {self.path}", path=self.path, error=str(e))
+                    return snapshot
+
+                self._snapshot = new_snapshot
+                return new_snapshot
+
+    @property
+    def version(self):
+        """גרסת הקובץ שנטענה כעת (זמן שינוי וגודל)"""
+        return self._load().version
+
+    def iter_tools(self):
+        """מעבר על כל הכלים בקטלוג לפי הסדר בקובץ, בלי להחזיק את כולם בזיכרון בבת אחת"""
+        snapshot = self._load()
+        last_position = -1
+        while True:
+            rows = snapshot.query(
+                "SELECT position, data FROM tools WHERE position > ? ORDER BY position LIMIT 1000", (last_position,)
+            )
+            if not rows:
+                return
+            for position, data in rows:
+                yield json.loads(data)
+            last_position = rows[-1][0]
+
+    def tools(self):
+        """כל הכלים בקטלוג, לפי הסדר בקובץ"""
+        return list(self.iter_tools())
+
+    def names(self):
+        """שמות כל הכלים בקטלוג"""
+        return list(self._load().names())
+
+    def categories(self):
+        """רשימת הקטגוריות בקטלוג"""
+        return [row[0] for row in self._load().query(
+            "SELECT category FROM tools WHERE name IS NOT NULL AND category != '' GROUP BY category ORDER BY MIN(position)"
+        )]
+
+    def get(self, tool_name):
+        """חיפוש כלי לפי שם מדויק, ואם לא נמצא - לפי שם מנורמל"""
+        snapshot = self._load()
+        records = snapshot.records("SELECT data FROM tools WHERE name = ? AND is_first", (tool_name,))
+        if not records:
+            records = snapshot.records(
+                "SELECT data FROM tools WHERE normalized = ? ORDER BY position LIMIT 1", (normalize_tool_name(tool_name),)
+            )
+        return records[0] if records else None
+
+    def get_many(self, tool_names):
+        """חיפוש מספר כלים, לפי סדר השמות שהתקבלו ותוך דילוג על כלים שלא נמצאו"""
+        found_tools = []
+        for tool_name in tool_names:
+            tool = self.get(tool_name)
+            if tool is not None:
+                found_tools.append(tool)
+        return found_tools
+
+    def by_category(self, category):
+        """כל הכלים בקטגוריה מסוימת"""
+        return self._load().records(
+            "SELECT data FROM tools WHERE category = ? AND name IS NOT NULL ORDER BY position", (category,)
+        )
+
+
+# מופע משותף לכל התהליך
+tools_catalog = ToolsCatalog()
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import secrets
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# כתיבת כל span שהסתיים כשורת JSON ללוג (stderr, או לקובץ ב-TRACE_LOG_FILE)
+TRACE_LOG_ENABLED = os.getenv("TRACE_LOG_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACE_LOG_FILE = os.getenv("TRACE_LOG_FILE", "")
+# כתובת אוסף OpenTelemetry (OTLP/HTTP), למשל http://localhost:4318 - ה-spans נשלחים ל-/v1/traces
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "sagi-ai-tools-chatbot")
+# מספר הבקשות האחרונות שה-spans שלהן נשמרים בזיכרון, לחלונית הדיבאג
+TRACE_HISTORY_SIZE = 100
+# מספר ה-spans המקסימלי בכל שליחה לאוסף
+OTLP_BATCH_SIZE = 256
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _json_formatter():
+    class JsonFormatter(logging.Formatter):
+        def format(self, record):
+            entry = {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+            }
+            entry.update(getattr(record, "fields", {}))
+            span = _current_span.get()
+            if span is not None:
+                entry.setdefault("trace_id", span.trace_id)
+                entry.setdefault("span_id", span.span_id)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+    return JsonFormatter()
+
+
+def get_logger(name):
+    """לוגר שכותב שורות JSON, עם מזהה הבקשה (trace_id) הנוכחי בכל שורה"""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.FileHandler(TRACE_LOG_FILE, encoding="utf-8") if TRACE_LOG_FILE else logging.StreamHandler(sys.stderr)
+        handler.setFormatter(_json_formatter())
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def log_event(logger, level, message, **fields):
+    """כתיבת אירוע ללוג כ-JSON, והוספתו כאירוע ל-span הנוכחי"""
+    logger.log(level, message, extra={"fields": fields})
+    span = _current_span.get()
+    if span is not None:
+        span.add_event(message, **fields)
+
+
+class Span:
+    """שלב אחד בטיפול בבקשה, במבנה שתואם ל-span של OpenTelemetry"""
+
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = "OK"
+        self.status_message = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def add_event(self, name, **attributes):
+        self.events.append({"name": name, "time_unix_nano": time.time_ns(), "attributes": attributes})
+
+    def record_error(self, error):
+        self.status = "ERROR"
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+        self.tracer._finish(self)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "status_message": self.status_message,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def _otlp_span(span):
+    data = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        "events": [
+            {"name": event["name"], "timeUnixNano": str(event["time_unix_nano"]),
+             "attributes": _otlp_attributes(event["attributes"])}
+            for event in span.events
+        ],
+        "status": {"code": 2 if span.status == "ERROR" else 1, "message": span.status_message or ""},
+    }
+    if span.parent_span_id:
+        data["parentSpanId"] = span.parent_span_id
+    return data
+
+
+class _OtlpExporter:
+    """שליחת spans לאוסף OpenTelemetry ב-OTLP/HTTP עם JSON, במנות מתהליכון רקע - בלי תלות בספריות OTel"""
+
+    def __init__(self, endpoint, service_name):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self._queue = queue.Queue(maxsize=10000)
+        threading.Thread(target=self._run, name="otlp-exporter", daemon=True).start()
+
+    def export(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        import httpx
+
+        with httpx.Client(timeout=5.0) as client:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < OTLP_BATCH_SIZE:
+                    try:
+                        batch.append(self._queue.get(timeout=1.0))
+                    except queue.Empty:
+                        break
+                payload = {"resourceSpans": [{
+                    "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                    "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [_otlp_span(span) for span in batch]}],
+                }]}
+                try:
+                    client.post(self.url, json=payload)
+                except httpx.HTTPError:
+                    # האוסף לא זמין - ה-spans של המנה הזו לא נשלחים, והבקשות לא מושפעות
+                    pass
+
+
+class Tracer:
+    """יצירת spans לכל שלב בבקשה, שמירת הבקשות האחרונות בזיכרון וייצוא ללוג JSON ול-OpenTelemetry"""
+
+    def __init__(self, history_size=TRACE_HISTORY_SIZE, log_enabled=TRACE_LOG_ENABLED,
+                 otlp_endpoint=OTEL_EXPORTER_OTLP_ENDPOINT):
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()
+        self._logger = get_logger("tracing") if log_enabled else None
+        self._exporter = _OtlpExporter(otlp_endpoint, OTEL_SERVICE_NAME) if otlp_endpoint else None
+
+    def current_span(self):
+        return _current_span.get()
+
+    def start_span(self, name, parent=None, **attributes):
+        """span שלא הופך לנוכחי - לשלבים שכוללים yield (הזרמה), שבהם אי אפשר לשנות את ההקשר.
+        ברירת המחדל להורה היא ה-span הנוכחי"""
+        return Span(self, name, parent if parent is not None else _current_span.get(), attributes)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """span שהופך לנוכחי בתוך הבלוק, כך ש-spans שנפתחים בתוכו הם ילדיו"""
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    async def run_with_parent(self, parent, coroutine):
+        """הרצת קורוטינה כש-parent הוא ה-span הנוכחי - להעברת ההקשר ללולאת אירועים בתהליכון אחר"""
+        token = _current_span.set(parent)
+        try:
+            return await coroutine
+        finally:
+            _current_span.reset(token)
+
+    def _finish(self, span):
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.history_size:
+                    self._traces.popitem(last=False)
+            spans.append(span)
+        if self._logger is not None:
+            self._logger.info("span", extra={"fields": {"span": span.to_dict()}})
+        if self._exporter is not None:
+            self._exporter.export(span)
+
+    def get_trace(self, trace_id):
+        """כל ה-spans שהסתיימו בבקשה, לפי זמן ההתחלה"""
+        with self._lock:
+            spans = list(self._traces.get(trace_id, []))
+        return sorted(spans, key=lambda span: span.start_ns)
+
+
+# מופע משותף לכל התהליך
+tracer = Tracer()
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from array import array
+
+from file_utils import DATA_DIR
+from conversation_history import MAX_HISTORY_MESSAGES
+from tracing import get_logger, log_event
+
+# ספרייה לקבצי ההודעות הישנות של כל סשן
+TRANSCRIPTS_DIR = os.path.join(DATA_DIR, "transcripts")
+# מספר ההודעות המקסימלי שנשמר בזיכרון לכל סשן. ברירת המחדל מכסה את ההיסטוריה שנשלחת למודל,
+# כך שבניית הבקשה לא קוראת מהדיסק לעולם
+TRANSCRIPT_MAX_MESSAGES = int(os.getenv("TRANSCRIPT_MAX_MESSAGES", MAX_HISTORY_MESSAGES * 2 + 2))
+# מספר ההודעות שמוצגות בדף, ומספר ההודעות שנוספות בכל לחיצה על "הצגת הודעות קודמות"
+TRANSCRIPT_PAGE_SIZE = int(os.getenv("TRANSCRIPT_PAGE_SIZE", 20))
+# זמן (בשניות) שאחריו נמחקים קבצי הודעות של סשנים שלא נכתב אליהם דבר
+TRANSCRIPT_RETENTION_SECONDS = int(os.getenv("TRANSCRIPT_RETENTION_SECONDS", 24 * 60 * 60))
+# כל כמה זמן (בשניות) לכל היותר מחפשים קבצים ישנים למחיקה
+TRANSCRIPT_CLEANUP_INTERVAL_SECONDS = 60 * 60
+
+logger = get_logger("transcript_store")
+
+_cleanup_lock = threading.Lock()
+_last_cleanup = 0.0
+
+
+def cleanup_old_transcripts(directory=TRANSCRIPTS_DIR, retention=TRANSCRIPT_RETENTION_SECONDS):
+    """מחיקת קבצי ההודעות של סשנים שהסתיימו. ל-Streamlit אין אירוע של סיום סשן, ולכן סשן
+    שלא נכתב אליו זמן רב נחשב כסגור. רץ לכל היותר פעם בשעה"""
+    global _last_cleanup
+    now = time.time()
+    with _cleanup_lock:
+        if now - _last_cleanup < TRANSCRIPT_CLEANUP_INTERVAL_SECONDS:
+            return
+        _last_cleanup = now
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.endswith(".jsonl") and now - entry.stat().st_mtime > retention:
+                os.remove(entry.path)
+        except OSError:
+            continue
+
+
+class Transcript:
+    """היסטוריית ההודעות של סשן אחד: ההודעות האחרונות בזיכרון, והישנות יותר בקובץ JSON Lines
+    בדיסק, כך שהזיכרון של כל סשן חסום גם בשיחות ארוכות מאוד"""
+
+    def __init__(self, session_id=None, max_messages=TRANSCRIPT_MAX_MESSAGES, directory=TRANSCRIPTS_DIR):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.max_messages = max(1, max_messages)
+        self.path = os.path.join(directory, f"{self.session_id}.jsonl")
+        self._recent = []
+        # המיקום בקובץ של כל הודעה שנשמרה בדיסק, לקריאה של טווח הודעות בלי לסרוק את הקובץ
+        self._offsets = array("q")
+        self._end_offset = 0
+        # טווח ההודעות הישנות שנקרא לאחרונה מהדיסק - הרצות חוזרות של הדף לא קוראות אותו שוב
+        self._earlier = (None, [])
+        cleanup_old_transcripts(directory)
+
+    def __len__(self):
+        return len(self._offsets) + len(self._recent)
+
+    def append(self, message):
+        """הוספת הודעה, והעברת ההודעות הישנות ביותר לדיסק אם עברנו את המגבלה"""
+        self._recent.append({"role": message["role"], "content": message["content"]})
+        overflow = len(self._recent) - self.max_messages
+        if overflow > 0:
+            self._spill(self._recent[:overflow])
+            del self._recent[:overflow]
+
+    def _reset_spilled(self):
+        """שכחת ההודעות שבדיסק, כשהקובץ נמחק או השתנה (למשל בניקוי של סשנים ישנים)"""
+        self._offsets = array("q")
+        self._end_offset = 0
+        self._earlier = (None, [])
+
+    def _spill(self, messages):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size != self._end_offset:
+            # הקובץ נמחק או הוחלף מאז הכתיבה הקודמת - המיקומים השמורים כבר לא מצביעים עליו,
+            # ולכן מתחילים קובץ חדש במקום להוסיף לקובץ שהמיקומים בו לא ידועים
+            log_event(logger, logging.WARNING, f"קובץ היסטוריית השיחה {self.path} השתנה, מתחילים קובץ חדש",
+                      path=self.path, expected_size=self._end_offset, size=size)
+            self._reset_spilled()
+        with open(self.path, 'ab' if self._end_offset else 'wb') as file:
+            for message in messages:
+                line = json.dumps([message["role"], message["content"]], ensure_ascii=False).encode("utf-8") + b"\n"
+                self._offsets.append(self._end_offset)
+                file.write(line)
+                self._end_offset += len(line)
+
+    def _read_spilled(self, start, end):
+        """ההודעות start עד end (לא כולל) מתוך אלו שנשמרו בדיסק"""
+        if start >= end:
+            return []
+        if self._earlier[0] == (start, end):
+            return self._earlier[1]
+        stop = self._offsets[end] if end < len(self._offsets) else self._end_offset
+        try:
+            with open(self.path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size != self._end_offset:
+                    raise ValueError(f"גודל הקובץ אינו {self._end_offset} בתים")
+                file.seek(self._offsets[start])
+                data = file.read(stop - self._offsets[start])
+            messages = [{"role": role, "content": content} for role, content in map(json.loads, data.splitlines())]
+        except (OSError, ValueError, TypeError) as e:
+            # הקובץ נמחק או הוחלף (למשל בניקוי של סשנים ישנים) - ההודעות הישנות פשוט לא מוצגות
+            log_event(logger, logging.WARNING, f"שגיאה בקריאת היסטוריית השיחה {self.path}", path=self.path, error=str(e))
+            self._reset_spilled()
+            return []
+        self._earlier = ((start, end), messages)
+        return messages
+
+    def recent(self):
+        """ההודעות שבזיכרון, מהישנה לחדשה - לבניית ההיסטוריה שנשלחת למודל"""
+        return list(self._recent)
+
+    def window(self, count):
+        """count ההודעות האחרונות להצגה, כולל הודעות ישנות מהדיסק אם צריך"""
+        if count <= len(self._recent):
+            return self._recent[len(self._recent) - count:]
+        spilled = len(self._offsets)
+        return self._read_spilled(max(0, len(self) - count), spilled) + self._recent
+
+    def delete(self):
+        """מחיקת קובץ ההודעות הישנות של הסשן"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,95 @@
+import os
+import time
+import logging
+import threading
+
+from tracing import tracer, get_logger, log_event
+
+# חימום ברקע עם עליית התהליך: יצירת הלקוחות של המודל ובניית האינדקסים לפני הבקשה הראשונה
+WARM_UP_ENABLED = os.getenv("WARM_UP_ENABLED", "true").lower() in ("1", "true", "yes")
+
+logger = get_logger("warm_up")
+
+_started = False
+_started_lock = threading.Lock()
+
+
+# המודולים הכבדים נטענים בתוך השלבים, בתהליכון הרקע - כך שייבוא warm_up עצמו לא מעכב את הצגת הדף
+def _warm_up_llm_client():
+    import groq_client
+    groq_client.llm_backend.warm_up()
+
+
+def _warm_up_llm_async_client():
+    # הלולאה הפרטית של run_async, שבה רצות ההשוואות והטעינה המוקדמת של ההנחיות
+    import groq_client
+    groq_client.run_async(groq_client.llm_backend.warm_up_async())
+
+
+def _warm_up_catalog():
+    from tools_catalog import tools_catalog
+    tools_catalog.names()
+
+
+def _warm_up_catalog_search():
+    from catalog_search import catalog_search
+    catalog_search.search("AI")
+
+
+def _warm_up_tool_matcher():
+    from tool_matcher import tool_matcher
+    tool_matcher.find_tools("AI")
+
+
+# השלבים לפי הסדר: קודם הלקוחות (ייבוא groq ו-httpx ומאגר החיבורים), ואחריהם הקטלוג והאינדקסים
+WARM_UP_STEPS = (
+    ("llm_client", _warm_up_llm_client),
+    ("llm_async_client", _warm_up_llm_async_client),
+    ("catalog", _warm_up_catalog),
+    ("catalog_search", _warm_up_catalog_search),
+    ("tool_matcher", _warm_up_tool_matcher),
+)
+
+
+def warm_up():
+    """הרצת כל שלבי החימום. שלב שנכשל (למשל בלי מפתח API) נרשם בלוג ולא עוצר את השאר -
+    הבקשה הראשונה פשוט תבצע אותו בעצמה. מחזיר את זמן כל שלב בשניות"""
+    timings = {}
+    with tracer.span("startup.warm_up") as span:
+        for name, step in WARM_UP_STEPS:
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                log_event(logger, logging.WARNING, f"שלב החימום {name} נכשל", step=name, error=str(e))
+            timings[name] = time.perf_counter() - started
+        span.set(**{f"{name}_ms": round(seconds * 1000, 3) for name, seconds in timings.items()})
+    return timings
+
+
+async def warm_up_event_loop():
+    """יצירת הלקוח האסינכרוני של לולאת האירועים הנוכחית (למשל הלולאה של uvicorn בשרת ה-API).
+    לכל לולאה יש מאגר חיבורים משלה, ולכן החימום ברקע לא מכין את הלקוח שהבקשות שלה ישתמשו בו"""
+    if not WARM_UP_ENABLED:
+        return False
+    import groq_client
+    with tracer.span("startup.warm_up_event_loop"):
+        try:
+            await groq_client.llm_backend.warm_up_async()
+        except Exception as e:
+            log_event(logger, logging.WARNING, "חימום הלקוח האסינכרוני נכשל", step="llm_event_loop_client", error=str(e))
+            return False
+    return True
+
+
+def warm_up_in_background():
+    """הפעלת החימום בתהליכון רקע, פעם אחת לכל תהליך. לא חוסם את הצגת הדף"""
+    global _started
+    if not WARM_UP_ENABLED:
+        return False
+    with _started_lock:
+        if _started:
+            return False
+        _started = True
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    return True